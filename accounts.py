@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+from config import load_env
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE", "accounts.json")
+DEFAULT_ACCOUNT = "default"
+
+CREDENTIAL_ENV_VARS = {
+    "bearer_token": "BEARER_TOKEN",
+    "consumer_key": "TWITTER_API_KEY",
+    "consumer_secret": "TWITTER_API_SECRET",
+    "access_token": "TWITTER_ACCESS_TOKEN",
+    "access_token_secret": "TWITTER_ACCESS_SECRET",
+}
+
+def load_accounts(path=None):
+    """Load account profiles.
+
+    The file holds a list of profiles such as
+    {"name": "brand_a", "env_prefix": "BRAND_A_"} (credentials read from
+    BRAND_A_BEARER_TOKEN, BRAND_A_TWITTER_API_KEY, ...) or
+    {"name": "brand_b", "credentials": {"bearer_token": "...", ...}}.
+    Without a file, the single account configured in .env is used.
+    """
+    path = path or ACCOUNTS_FILE
+    if not os.path.exists(path):
+        return [{"name": DEFAULT_ACCOUNT}]
+    with open(path) as f:
+        accounts = json.load(f)
+    names = [account["name"] for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate account names in {path}")
+    return accounts
+
+# Profiles handed over in code (e.g. to multi_account.run_all_accounts) rather than read from the file
+_registered = {}
+
+def register_accounts(profiles):
+    """Make profiles resolvable by name without writing them to accounts.json"""
+    for profile in profiles:
+        _registered[profile["name"]] = profile
+
+def get_account(name):
+    """Return the profile for an account name, or None"""
+    if name in _registered:
+        return _registered[name]
+    for account in load_accounts():
+        if account["name"] == name:
+            return account
+    return None
+
+def get_credentials(account):
+    """Resolve a profile or account name to tweepy credentials; None means the .env account"""
+    if account is None or account == DEFAULT_ACCOUNT:
+        return None
+    profile = get_account(account) if isinstance(account, str) else account
+    if profile is None:
+        raise ValueError(f"Unknown account: {account}")
+    if profile.get("credentials"):
+        return profile["credentials"]
+    if profile.get("env_prefix"):
+        load_env()
+        prefix = profile["env_prefix"]
+        return {key: os.getenv(prefix + env_var) for key, env_var in CREDENTIAL_ENV_VARS.items()}
+    return None
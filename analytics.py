@@ -0,0 +1,99 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+from store import get_connection, METRIC_COLUMNS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ENGAGEMENT_COLUMNS = ["likes", "retweets", "replies", "quotes"]
+
+def load_tweets(days=None):
+    """Load posted tweets from the store into a DataFrame"""
+    query = "SELECT tweet_id, run_id, account, type, text, posted_at FROM tweets"
+    params = []
+    if days is not None:
+        query += " WHERE posted_at >= ?"
+        params.append(time.time() - days * 24 * 60 * 60)
+    return pd.read_sql_query(query, get_connection(), params=params)
+
+def load_snapshots(days=None):
+    """Load metric snapshots from the store into a DataFrame"""
+    query = f"SELECT tweet_id, polled_at, age_minutes, {', '.join(METRIC_COLUMNS)} FROM metric_snapshots"
+    params = []
+    if days is not None:
+        query += " WHERE polled_at >= ?"
+        params.append(time.time() - days * 24 * 60 * 60)
+    return pd.read_sql_query(query, get_connection(), params=params)
+
+def engagement_rates(frame):
+    """Vectorized calculate_engagement_rate over a frame of metrics"""
+    engagements = frame[ENGAGEMENT_COLUMNS].to_numpy(dtype=np.float64).sum(axis=1)
+    impressions = frame["impressions"].to_numpy(dtype=np.float64)
+    rates = np.divide(engagements * 100, impressions, out=np.zeros_like(engagements), where=impressions > 0)
+    return np.round(rates, 2)
+
+def latest_metrics(snapshots):
+    """Keep only the most recent snapshot of each tweet"""
+    ordered = snapshots.sort_values(["tweet_id", "polled_at"], kind="stable")
+    return ordered.drop_duplicates("tweet_id", keep="last").reset_index(drop=True)
+
+def local_hours(timestamps):
+    """Local-time hour of each Unix timestamp, as datetime.fromtimestamp gives it elsewhere"""
+    seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+    # The UTC offset only changes on hour boundaries, so look it up once per distinct hour
+    utc_hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+    offsets = np.array([time.localtime(hour * 3600).tm_gmtoff for hour in utc_hours.tolist()], dtype=np.int64)
+    return ((seconds + offsets[inverse]) // 3600) % 24
+
+def history_frame(tweets, snapshots):
+    """One row per tweet with its latest metrics, engagement rate, posting hour and hashtags"""
+    frame = tweets.merge(latest_metrics(snapshots), on="tweet_id", how="inner")
+    frame["engagement_rate"] = engagement_rates(frame)
+    frame["score"] = frame["likes"] + frame["retweets"] * 2
+    frame["hour"] = local_hours(frame["posted_at"])
+    frame["hashtags"] = frame["text"].str.lower().str.findall(r"#\w+")
+    return frame
+
+def load_history(days=None):
+    """Load the stored history and build the per-tweet analytics frame"""
+    return history_frame(load_tweets(days), load_snapshots(days))
+
+def breakdown(frame, by):
+    """Per-group engagement summary; `by` is 'type', 'hour', 'account' or 'hashtag'"""
+    if by == "hashtag":
+        frame = frame.explode("hashtags").dropna(subset=["hashtags"]).rename(columns={"hashtags": "hashtag"})
+    grouped = frame.groupby(by, sort=False)
+    summary = grouped.agg(
+        tweets=("likes", "size"),
+        avg_likes=("likes", "mean"),
+        median_likes=("likes", "median"),
+        avg_engagement_rate=("engagement_rate", "mean"),
+        total_impressions=("impressions", "sum"),
+    )
+    summary["p90_likes"] = grouped["likes"].quantile(0.9)
+    return summary.sort_values("avg_likes", ascending=False)
+
+def percentiles(frame, column="likes", q=(50, 90, 99)):
+    """Percentiles of one metric column"""
+    values = np.percentile(frame[column].to_numpy(dtype=np.float64), q) if len(frame) else [0] * len(q)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(q, values)}
+
+def best_tweets(frame, n=5):
+    """Top tweets by the optimizer's score (likes + 2 * retweets)"""
+    return frame.nlargest(n, "score")
+
+def summarize(frame):
+    """Headline numbers matching the optimize_strategy insights"""
+    if frame.empty:
+        return None
+    by_type = breakdown(frame, "type")
+    return {
+        "avg_likes": round(float(frame["likes"].mean()), 2),
+        "avg_engagement_rate": round(float(frame["engagement_rate"].mean()), 2),
+        "best_performing_type": by_type.index[0],
+        "best_tweet": best_tweets(frame, 1).iloc[0].to_dict(),
+        "likes_percentiles": percentiles(frame),
+        "total_tweets_analyzed": int(len(frame)),
+    }
@@ -0,0 +1,67 @@
+# bench_analytics.py - Time the vectorized analytics over a synthetic metric history
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import history_frame, breakdown, percentiles, best_tweets
+
+TYPES = np.array(["hook", "list", "question"])
+HASHTAGS = np.array(["#ai", "#growth", "#startuplife", "#remotework", "#success", "#techtips"])
+
+def synthetic_history(rows, snapshots_per_tweet=4, seed=42):
+    """Build tweets and snapshot frames shaped like the store tables"""
+    rng = np.random.default_rng(seed)
+    n_tweets = rows // snapshots_per_tweet
+    tweet_ids = np.arange(n_tweets).astype(str)
+    posted_at = time.time() - rng.uniform(0, 90 * 24 * 60 * 60, n_tweets)
+    tweets = pd.DataFrame({
+        "tweet_id": tweet_ids,
+        "account": "default",
+        "type": TYPES[rng.integers(0, len(TYPES), n_tweets)],
+        "text": np.char.add("Synthetic tweet ", HASHTAGS[rng.integers(0, len(HASHTAGS), n_tweets)]),
+        "posted_at": posted_at,
+    })
+    snapshot_tweet = np.repeat(np.arange(n_tweets), snapshots_per_tweet)
+    offsets = np.tile([5, 60, 360, 1440], snapshots_per_tweet // 4 + 1)[:snapshots_per_tweet]
+    snapshots = pd.DataFrame({
+        "tweet_id": tweet_ids[snapshot_tweet],
+        "polled_at": posted_at[snapshot_tweet] + np.tile(offsets, n_tweets) * 60,
+        "likes": rng.poisson(12, len(snapshot_tweet)),
+        "retweets": rng.poisson(3, len(snapshot_tweet)),
+        "replies": rng.poisson(2, len(snapshot_tweet)),
+        "quotes": rng.poisson(1, len(snapshot_tweet)),
+        "bookmarks": rng.poisson(2, len(snapshot_tweet)),
+        "impressions": rng.integers(100, 5000, len(snapshot_tweet)),
+    })
+    return tweets, snapshots
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"  {label:<28} {time.perf_counter() - start:8.3f}s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized analytics")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of metric snapshot rows")
+    args = parser.parse_args()
+
+    tweets, snapshots = synthetic_history(args.rows)
+    print(f"Analytics benchmark: {len(snapshots):,} snapshots over {len(tweets):,} tweets")
+    start = time.perf_counter()
+    frame = timed("history_frame", history_frame, tweets, snapshots)
+    timed("breakdown by type", breakdown, frame, "type")
+    timed("breakdown by hour", breakdown, frame, "hour")
+    timed("breakdown by hashtag", breakdown, frame, "hashtag")
+    timed("percentiles", percentiles, frame)
+    timed("best tweets", best_tweets, frame, 10)
+    print(f"  {'total':<28} {time.perf_counter() - start:8.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# bench_checkpoints.py - Measure what per-stage run checkpoints cost
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline checkpoint writes and resumes")
+    parser.add_argument("--runs", type=int, default=500, help="number of pipeline runs to checkpoint")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BOT_DB_FILE"] = os.path.join(tmp, "bench_store.db")
+        from checkpoints import RunCheckpoints, STAGES, idempotency_key, get_checkpoint_stats
+
+        tweets = [{"type": t, "text": f"A {t} tweet about building habits that stick #Growth " * 3} for t in ("hook", "list", "question")]
+        payloads = {
+            "discover": {"patterns": ["Hook tweets", "List-style tweets", "Question tweets"], "hashtags": ["#Growth", "#Tech"]},
+            "generate": tweets,
+            "post": {"posted": [dict(t, id=str(i), posted_at=time.time()) for i, t in enumerate(tweets)], "queued": []},
+            "metrics": [dict(t, id=str(i), likes=12, retweets=3, impressions=900) for i, t in enumerate(tweets)],
+            "optimize": [{"avg_likes": 12.0, "best_performing_type": "hook"}, "Hook tweets are doing best"],
+        }
+
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            run = RunCheckpoints.start(resume=False)
+            for position, tweet in enumerate(tweets):
+                tweet["idempotency_key"] = idempotency_key(run.run_id, position, tweet["text"])
+            for stage in STAGES:
+                run.save(stage, payloads[stage])
+        elapsed = time.perf_counter() - start
+        writes = args.runs * len(STAGES)
+        print(f"Checkpointed {args.runs:,} runs ({writes:,} stage writes) in {elapsed:.2f}s "
+              f"({elapsed / writes * 1000:.3f} ms per write, {elapsed / args.runs * 1000:.2f} ms per run)")
+
+        # A crashed run: only the first two stages completed
+        from store import finish_run
+        crashed = RunCheckpoints.start(resume=False)
+        for stage in STAGES[:2]:
+            crashed.save(stage, payloads[stage])
+        start = time.perf_counter()
+        resumed = RunCheckpoints.start()
+        print(f"Resumed run {resumed.run_id} after '{resumed.last_stage}' in {(time.perf_counter() - start) * 1000:.2f} ms")
+        finish_run(resumed.run_id, {})
+        print(f"Stats: {get_checkpoint_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# bench_dedup.py - Time near-duplicate checks against a large posted history
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_index import DedupIndex
+
+WORDS = ("growth habits focus startup remote work life lessons success mindset career tools "
+         "ship build learn teach write read morning evening team product market users data").split()
+
+def synthetic_tweets(count, seed=7):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(WORDS), (count, 18))
+    return [" ".join(WORDS[i] for i in row) + f" #tag{n % 50}" for n, row in enumerate(picks)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the near-duplicate index")
+    parser.add_argument("--history", type=int, default=100_000, help="number of posted tweets to index")
+    parser.add_argument("--queries", type=int, default=1_000, help="number of candidates to check")
+    args = parser.parse_args()
+
+    history = synthetic_tweets(args.history)
+    index = DedupIndex()
+    start = time.perf_counter()
+    index.add(history, range(len(history)))
+    print(f"Indexed {len(history):,} tweets in {time.perf_counter() - start:.2f}s")
+
+    # Half the queries are light edits of posted tweets, half are new text
+    rng = np.random.default_rng(11)
+    near = [history[i].replace(WORDS[0], WORDS[1]) + " today" for i in rng.integers(0, len(history), args.queries // 2)]
+    fresh = synthetic_tweets(args.queries - len(near), seed=99)
+    queries = near + fresh
+
+    index.query(queries[:10])  # warm up the signature matrix
+    start = time.perf_counter()
+    results = index.query(queries)
+    elapsed = time.perf_counter() - start
+    flagged_near = sum(1 for match, _ in results[:len(near)] if match is not None)
+    flagged_fresh = sum(1 for match, _ in results[len(near):] if match is not None)
+    print(f"Checked {len(queries):,} candidates in {elapsed:.3f}s ({elapsed / len(queries) * 1000:.3f} ms each)")
+    print(f"Flagged {flagged_near}/{len(near)} edited repeats and {flagged_fresh}/{len(fresh)} new tweets")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench_engagement_model.py - Training cost, batch scoring cost and ranking quality of the engagement model
+#
+# Tweets are drawn from a synthetic world where type, posting hour, hashtags and a few words
+# drive engagement. The model learns online from a history of such tweets, then picks the
+# best of each batch of unseen candidates; its picks are compared with random and ideal picks.
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engagement_model import EngagementModel, get_model_stats
+
+TYPES = {"hook": 0.3, "list": 0.0, "question": -0.2}
+HASHTAGS = {"#ai": 0.4, "#growth": 0.1, "#startuplife": 0.0, "#remotework": -0.1, "#success": -0.3, "#techtips": 0.2}
+HOT_WORDS = {"free": 0.5, "secret": 0.4, "mistake": 0.3, "today": -0.2, "update": -0.3}
+FILLER = ("how we built our product in public and what the team learned from launch week "
+          "the simple habit that changed my mornings and why most advice misses it").split()
+
+def _hour_effect(hour):
+    return 0.4 * math.cos((hour - 18) / 24 * 2 * math.pi)
+
+def true_engagement(tweet, posted_at):
+    """Expected log engagement of a tweet in the synthetic world"""
+    words = tweet["text"].lower().split()
+    return (2.5 + TYPES[tweet["type"]] + _hour_effect(time.localtime(posted_at).tm_hour)
+            + sum(HASHTAGS.get(word, 0) + HOT_WORDS.get(word, 0) for word in words))
+
+def synthetic_tweet(rng):
+    words = rng.sample(FILLER, rng.randint(8, 20)) + rng.sample(list(HOT_WORDS), rng.randint(0, 2))
+    rng.shuffle(words)
+    tags = rng.sample(list(HASHTAGS), rng.randint(0, 2))
+    return {"type": rng.choice(list(TYPES)), "text": " ".join(words + tags).capitalize()}
+
+def spearman(a, b):
+    ranks_a, ranks_b = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the online engagement model")
+    parser.add_argument("--history", type=int, default=2000, help="tweets to train on")
+    parser.add_argument("--batches", type=int, default=300, help="held-out candidate batches to rank")
+    parser.add_argument("--batch-size", type=int, default=12, help="candidates per batch")
+    parser.add_argument("--noise", type=float, default=0.5, help="std dev of log-engagement noise")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    np_rng = np.random.default_rng(args.seed)
+    now = time.time()
+    model = EngagementModel()
+
+    history = [(synthetic_tweet(rng), now - rng.uniform(0, 30 * 24 * 60 * 60)) for _ in range(args.history)]
+    observed = [max(0, round(math.expm1(true_engagement(tweet, posted_at) + np_rng.normal(0, args.noise))))
+                for tweet, posted_at in history]
+    start = time.perf_counter()
+    for (tweet, posted_at), engagement in zip(history, observed):
+        model.learn(tweet, engagement, "bench", posted_at)
+    train_seconds = time.perf_counter() - start
+    print(f"Training: {train_seconds / args.history * 1e6:8.1f} us/example over {args.history} tweets "
+          f"(mean abs error {model.mean_abs_error:.3f} in log space)")
+
+    for size in (1, 12, 100, 1000):
+        batch = [synthetic_tweet(rng) for _ in range(size)]
+        repeats = max(1, 2000 // size)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model.predict(batch, "bench", now)
+        print(f"Scoring:  {(time.perf_counter() - start) / (repeats * size) * 1e6:8.1f} us/tweet in batches of {size}")
+
+    start = time.perf_counter()
+    state = json.dumps(model.to_dict())
+    restored = EngagementModel.from_dict(json.loads(state))
+    print(f"Persist:  {(time.perf_counter() - start) * 1000:8.1f} ms round trip, {len(state) / 1024:.0f} KiB, "
+          f"{len(model.to_dict()['indices'])} non-zero weights")
+
+    truths, predictions, picks = [], [], {"random": [], "model": [], "ideal": []}
+    for _ in range(args.batches):
+        # All candidates of a batch go out in the same slot, as in one posting run
+        batch = [synthetic_tweet(rng) for _ in range(args.batch_size)]
+        posted_at = now + rng.uniform(0, 7 * 24 * 60 * 60)
+        scores = restored.predict(batch, "bench", posted_at)
+        truth = np.array([true_engagement(tweet, posted_at) for tweet in batch])
+        truths += truth.tolist()
+        predictions += scores.tolist()
+        picks["random"].append(math.expm1(truth[rng.randrange(len(batch))]))
+        picks["model"].append(math.expm1(truth[int(np.argmax(scores))]))
+        picks["ideal"].append(math.expm1(truth.max()))
+
+    print(f"Ranking:  Spearman {spearman(np.array(truths), np.array(predictions)):.3f} against true engagement")
+    for name, values in picks.items():
+        print(f"  best-of-{args.batch_size} pick, {name:<6}: {np.mean(values):7.1f} expected engagement")
+    print(f"Stats: {get_model_stats()}")
+
+if __name__ == "__main__":
+    main()
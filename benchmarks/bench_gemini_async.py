@@ -0,0 +1,83 @@
+# bench_gemini_async.py - Sequential versus concurrent tweet generation against a local fake Gemini server
+#
+# Generates the same batches one at a time with generate_tweets and all at once with
+# generate_tweet_batches. The async client is given more concurrency than the process-wide
+# Gemini cap (GEMINI_CONCURRENCY), so its speedup should stop at the cap, and every slot
+# should be free again when it is done. Injected 503s exercise the retries.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_gemini import start_fake_gemini
+
+PATTERNS = ["Hook tweets that open with a bold claim", "List-style tweets with 3 tips", "Questions that invite replies",
+            "Contrarian takes on common advice", "Short stories with a lesson"]
+
+def _batches(count):
+    return [([PATTERNS[i % len(PATTERNS)], PATTERNS[(i + 1) % len(PATTERNS)]], {"avg_likes": i})
+            for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Gemini generation against sequential calls")
+    parser.add_argument("--batches", type=int, default=24, help="tweet batches to generate")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean fake Gemini latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="fraction of requests answered with 503")
+    parser.add_argument("--concurrency", type=int, default=16, help="async client concurrency")
+    parser.add_argument("--hedge", action="store_true", help="send hedged requests past the observed p95")
+    args = parser.parse_args()
+
+    gemini = start_fake_gemini(latency=args.latency, error_rate=args.error_rate, varied=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ.update({
+            "GEMINI_KEY": "bench",
+            "GEMINI_BASE_URL": gemini.base_url,
+            "GEMINI_REQUESTS_PER_MINUTE": "100000",
+            "GEMINI_CACHE_BYPASS": "1",
+            "METRICS_FILE": "",
+            "BOT_DB_FILE": os.path.join(tmp, "bench_store.db"),
+        })
+        import logging
+        logging.disable(logging.WARNING)
+        from generate_tweets import generate_tweets, generate_tweet_batches, is_fallback
+        from utils.gemini_client import AsyncGeminiClient
+        from utils.limits import gemini_slots, GEMINI_CONCURRENCY
+
+        batches = _batches(args.batches)
+        print(f"{args.batches} batches, {args.latency * 1000:.0f} ms mean latency, {args.error_rate:.0%} errors, "
+              f"Gemini cap {GEMINI_CONCURRENCY}, client concurrency {args.concurrency}")
+
+        requests_before = gemini.requests
+        start = time.perf_counter()
+        results = [generate_tweets(patterns, performance, bypass_cache=True, use_pool=False)
+                   for patterns, performance in batches]
+        sequential = time.perf_counter() - start
+        print(f"Sequential: {sequential:6.2f} s, {gemini.requests - requests_before} requests, "
+              f"{sum(map(is_fallback, results))} fallback batches")
+
+        client = AsyncGeminiClient(concurrency=args.concurrency, hedge=args.hedge)
+        requests_before = gemini.requests
+        gemini.peak_in_flight = 0
+        start = time.perf_counter()
+        results = generate_tweet_batches(batches, client)
+        concurrent = time.perf_counter() - start
+        ideal = args.batches * args.latency / min(args.concurrency, GEMINI_CONCURRENCY)
+        print(f"Concurrent: {concurrent:6.2f} s (x{sequential / concurrent:4.1f}, ideal at the cap {ideal:.2f} s), "
+              f"{gemini.requests - requests_before} requests, {sum(map(is_fallback, results))} fallback batches")
+        print(f"  client stats {client.stats}, latency {client.latency_percentiles()}")
+        # Hedges that lose are cancelled, but their requests still hold a slot until they return
+        print(f"  Peak requests in flight: {gemini.peak_in_flight} (cap {GEMINI_CONCURRENCY})")
+        # A slot still taken after the run means a call (or a cancelled hedge) leaked it
+        free = sum(gemini_slots.acquire(blocking=False) for _ in range(GEMINI_CONCURRENCY))
+        print(f"  Gemini slots free afterwards: {free}/{GEMINI_CONCURRENCY}")
+        os.chdir(ROOT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# bench_job_queue.py - Job throughput as worker processes are added, on the SQLite and HTTP queue backends
+#
+# By default each job stands in for an I/O-bound pipeline stage by sleeping, so throughput
+# should grow roughly linearly with workers until the queue itself becomes the bottleneck.
+# With --pipeline the workers run real pipeline runs (one per account, five stage jobs each)
+# against local fake Twitter and Gemini servers, and each round reports how many tweets were
+# queued, posted and recorded, so lost or doubled posts show up. The HTTP backend talks to a job queue server run by this script,
+# as a remote host would.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TRENDS = {
+    "patterns": ["Hook tweets that open with a bold claim", "List-style tweets with 3 tips", "Questions that invite replies"],
+    "hashtags": ["#Growth", "#Productivity", "#Tech"],
+}
+
+def worker_main(io_seconds, pipeline):
+    """Worker process: run jobs until the queue is empty"""
+    import logging
+    import workers
+
+    logging.disable(logging.WARNING if pipeline else logging.INFO)
+
+    @workers.handler("bench")
+    def bench_job(payload, queue):
+        time.sleep(io_seconds)
+        return {"n": payload["n"]}
+
+    # Connect (and, for HTTP, import requests) before the go signal, as a long-running worker would have
+    queue = workers.get_queue()
+    queue.stats()
+    if pipeline:
+        import main  # noqa: F401 - stage jobs import it lazily; count that as startup, not job time
+    print("ready", flush=True)
+    sys.stdin.readline()
+    workers.run_workers(threads=1, queue=queue, kinds=[workers.STAGE_JOB if pipeline else "bench"],
+                        exit_when_idle=True)
+
+def _accounts(round_id, jobs):
+    return [{"name": f"bench{round_id}_{i}", "credentials": {
+        "bearer_token": f"bearer-{round_id}-{i}", "consumer_key": "bench", "consumer_secret": "bench",
+        "access_token": f"token-{round_id}-{i}", "access_token_secret": "bench",
+    }} for i in range(jobs)]
+
+def _pipeline_outcome(round_id, twitter, tweets_before):
+    """Runs finished and tweets queued or posted by one pipeline round, read back from the store"""
+    from store import get_connection
+
+    conn = get_connection()
+    prefix = f"bench{round_id}_%"
+    finished = conn.execute("SELECT COUNT(*) AS n FROM runs WHERE account LIKE ? AND finished_at IS NOT NULL",
+                            (prefix,)).fetchone()["n"]
+    queued = conn.execute("SELECT status, COUNT(*) AS n FROM publish_queue WHERE account LIKE ? GROUP BY status",
+                          (prefix,)).fetchall()
+    stored = conn.execute("SELECT COUNT(*) AS n FROM tweets WHERE account LIKE ?", (prefix,)).fetchone()["n"]
+    # Every post the fake received should be recorded once; more means a tweet went out twice
+    return {"finished_runs": finished, "queue": {row["status"]: row["n"] for row in queued},
+            "posted": len(twitter.tweets) - tweets_before, "recorded": stored}
+
+def run_round(round_id, processes, jobs, args, env, twitter=None):
+    from job_queue import SQLiteJobQueue
+
+    queue = SQLiteJobQueue()
+    tweets_before = len(twitter.tweets) if twitter else 0
+    if args.pipeline:
+        from workers import enqueue_run
+        for account in _accounts(round_id, jobs):
+            enqueue_run(account["name"], trends=TRENDS, queue=queue)
+    else:
+        for n in range(jobs):
+            queue.enqueue("bench", {"n": n})
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--io", str(args.io)]
+    if args.pipeline:
+        command.append("--pipeline")
+    procs = [subprocess.Popen(command, env=env, cwd=os.getcwd(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL)
+             for _ in range(processes)]
+    for proc in procs:
+        proc.stdout.readline()
+    start = time.perf_counter()
+    for proc in procs:
+        proc.stdin.write(b"go\n")
+        proc.stdin.close()
+    for proc in procs:
+        proc.wait()
+    elapsed = time.perf_counter() - start
+    stats = queue.stats()
+    queue.purge(max_age_seconds=0)
+    outcome = _pipeline_outcome(round_id, twitter, tweets_before) if args.pipeline else None
+    return elapsed, stats, outcome
+
+def _start_fakes(args):
+    from fake_gemini import start_fake_gemini
+    from fake_twitter import start_fake_twitter
+
+    twitter = start_fake_twitter(latency=args.twitter_latency)
+    gemini = start_fake_gemini(latency=args.gemini_latency, varied=True)
+    os.environ.update({
+        "GEMINI_KEY": "bench", "BEARER_TOKEN": "bench", "TWITTER_API_KEY": "bench",
+        "TWITTER_API_SECRET": "bench", "TWITTER_ACCESS_TOKEN": "bench", "TWITTER_ACCESS_SECRET": "bench",
+        "GEMINI_BASE_URL": gemini.base_url,
+        "TWITTER_BASE_URL": twitter.base_url,
+        "GEMINI_REQUESTS_PER_MINUTE": "100000",
+        "GEMINI_CACHE_BYPASS": "1",
+        "METRICS_FILE": "",
+    })
+    return twitter
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark job queue throughput against worker count")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker process counts")
+    parser.add_argument("--jobs", type=int, default=400, help="jobs per round (pipeline runs with --pipeline)")
+    parser.add_argument("--io", type=float, default=0.02, help="simulated I/O per job in seconds")
+    parser.add_argument("--backends", default="sqlite,http", help="comma-separated backends to measure")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run real pipeline stage jobs against fake Twitter and Gemini servers")
+    parser.add_argument("--twitter-latency", type=float, default=0.03, help="mean fake Twitter latency in seconds")
+    parser.add_argument("--gemini-latency", type=float, default=0.2, help="mean fake Gemini latency in seconds")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker_main(args.io, args.pipeline)
+        return
+
+    import logging
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Store, caches and indexes all default to paths under the working directory
+        os.chdir(tmp)
+        os.environ["BOT_DB_FILE"] = os.path.join(tmp, "bench_store.db")
+        twitter = None
+        if args.pipeline:
+            twitter = _start_fakes(args)
+            round_ids = [f"{backend}{count}" for backend in args.backends.split(",") for count in args.workers.split(",")]
+            with open("accounts.json", "w") as f:
+                json.dump([account for round_id in round_ids for account in _accounts(round_id, args.jobs)], f)
+        from job_queue import start_job_queue_server
+
+        server = start_job_queue_server(port=0, host="127.0.0.1")
+        base_env = {key: value for key, value in os.environ.items() if key != "JOB_QUEUE_URL"}
+        if args.pipeline:
+            from checkpoints import STAGES
+            print(f"{args.jobs} pipeline runs of {len(STAGES)} stage jobs each against fake APIs, {os.cpu_count()} CPUs")
+        else:
+            ideal = 1 / args.io
+            print(f"{args.jobs} jobs of {args.io * 1000:.0f} ms simulated I/O (ideal {ideal:.0f} jobs/s per worker), "
+                  f"{os.cpu_count()} CPUs")
+        for backend in args.backends.split(","):
+            env = dict(base_env)
+            if backend == "http":
+                env["JOB_QUEUE_URL"] = f"http://127.0.0.1:{server.server_port}"
+            baseline = None
+            for processes in (int(count) for count in args.workers.split(",")):
+                elapsed, stats, outcome = run_round(f"{backend}{processes}", processes, args.jobs, args, env, twitter)
+                throughput = args.jobs / elapsed
+                baseline = baseline or throughput / processes
+                if args.pipeline:
+                    print(f"{backend:<6} {processes:>2} workers: {elapsed:6.2f} s, {throughput:7.2f} runs/s "
+                          f"(x{throughput / baseline:4.1f} scaling) {stats} {outcome}")
+                else:
+                    print(f"{backend:<6} {processes:>2} workers: {elapsed:6.2f} s, {throughput:7.1f} jobs/s "
+                          f"(x{throughput / baseline:4.1f} scaling, {throughput / processes / ideal:4.0%} of ideal) "
+                          f"{stats}")
+        server.shutdown()
+        os.chdir(ROOT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# bench_pipeline.py - End-to-end pipeline throughput against local fake Twitter and Gemini servers
+#
+# Runs main() for 1, 10 and 100 accounts (by default) with no network access or real
+# credentials, then drains the publish queue and the metrics poller. Results are saved
+# per commit under benchmarks/results/ so runs can be compared with --compare.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_gemini import start_fake_gemini
+from fake_twitter import start_fake_twitter
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+TRENDS = {
+    "patterns": ["Hook tweets that open with a bold claim", "List-style tweets with 3 tips", "Questions that invite replies"],
+    "hashtags": ["#Growth", "#Productivity", "#Tech"],
+}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def _configure_environment(args, gemini, twitter):
+    """Point every bot module at the fake servers; must run before the bot is imported"""
+    os.environ.update({
+        "GEMINI_KEY": "bench", "BEARER_TOKEN": "bench", "TWITTER_API_KEY": "bench",
+        "TWITTER_API_SECRET": "bench", "TWITTER_ACCESS_TOKEN": "bench", "TWITTER_ACCESS_SECRET": "bench",
+        "GEMINI_BASE_URL": gemini.base_url,
+        "TWITTER_BASE_URL": twitter.base_url,
+        "GEMINI_REQUESTS_PER_MINUTE": str(args.gemini_rpm),
+        "GEMINI_CACHE_BYPASS": "1",
+        "METRICS_FILE": "",
+    })
+
+def _accounts(size):
+    return [{"name": f"bench{size}_{i}", "credentials": {
+        "bearer_token": f"bearer-{size}-{i}", "consumer_key": "bench", "consumer_secret": "bench",
+        "access_token": f"token-{size}-{i}", "access_token_secret": "bench",
+    }} for i in range(size)]
+
+def run_size(size, args, twitter, gemini):
+    import multi_account
+    from config import TWEET_COOLDOWN_MINUTES
+    from publish_queue import dispatch_due, pending_tweets
+    from metrics_poller import poll_due
+    from utils import telemetry
+
+    telemetry.reset()
+    twitter_before, limited_before, gemini_before = twitter.requests, twitter.rate_limited, gemini.requests
+    tweets_before = len(twitter.tweets)
+    accounts = _accounts(size)
+
+    start = time.perf_counter()
+    outcomes = multi_account.run_all_accounts(accounts, max_workers=args.workers)
+    pipeline_seconds = time.perf_counter() - start
+
+    # Post what the cooldown queued (one post per account per dispatch, as the scheduler
+    # would over the next hours), then take every metrics poll as if a day had passed
+    drain_start = time.perf_counter()
+    later = time.time()
+    while pending_tweets() and later < time.time() + 24 * 60 * 60:
+        later += TWEET_COOLDOWN_MINUTES * 60
+        dispatch_due(now=later)
+    snapshots = len(poll_due(now=later + 24 * 60 * 60))
+    drain_seconds = time.perf_counter() - drain_start
+
+    latencies = [outcome["seconds"] for outcome in outcomes]
+    # Counted on the server, where every accepted post lands
+    posted = len(twitter.tweets) - tweets_before
+    stages = {label: summary for label, summary in telemetry.get_span_summary().items()
+              if label.startswith(("span=stage", "endpoint=", "mode="))}
+    return {
+        "accounts": size,
+        "failed_accounts": sum(1 for outcome in outcomes if outcome["error"]),
+        "pipeline_seconds": round(pipeline_seconds, 3),
+        "runs_per_second": round(size / pipeline_seconds, 3),
+        "tweets_posted": posted,
+        "tweets_per_second": round(posted / (pipeline_seconds + drain_seconds), 3),
+        "account_p50_seconds": round(statistics.median(latencies), 3),
+        "account_p95_seconds": round(_percentile(latencies, 0.95), 3),
+        "drain_seconds": round(drain_seconds, 3),
+        "metric_snapshots": snapshots,
+        "twitter_requests": twitter.requests - twitter_before,
+        "twitter_rate_limited": twitter.rate_limited - limited_before,
+        "gemini_requests": gemini.requests - gemini_before,
+        "spans": stages,
+    }
+
+def print_result(result):
+    print(f"{result['accounts']:>4} accounts: {result['runs_per_second']:.2f} runs/s, "
+          f"{result['tweets_per_second']:.2f} tweets/s, account p50 {result['account_p50_seconds']:.2f}s "
+          f"p95 {result['account_p95_seconds']:.2f}s, {result['failed_accounts']} failed, "
+          f"{result['twitter_requests']} Twitter / {result['gemini_requests']} Gemini requests "
+          f"({result['twitter_rate_limited']} rate-limited)")
+    for label, summary in result["spans"].items():
+        print(f"       {label:<40} {summary['calls']:>6} calls  mean {summary['mean_seconds'] * 1000:8.1f} ms")
+
+def compare(previous_path, results):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous['commit']} ({previous_path}):")
+    before = {str(r["accounts"]): r for r in previous["sizes"]}
+    for result in results["sizes"]:
+        old = before.get(str(result["accounts"]))
+        if old is None:
+            continue
+        for metric in ("runs_per_second", "tweets_per_second", "account_p95_seconds"):
+            change = (result[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            print(f"  {result['accounts']:>4} accounts {metric:<22} {old[metric]:>9.3f} -> {result[metric]:>9.3f} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full pipeline against local fake APIs")
+    parser.add_argument("--accounts", default="1,10,100", help="comma-separated account counts to run")
+    parser.add_argument("--workers", type=int, default=4, help="accounts run concurrently")
+    parser.add_argument("--twitter-latency", type=float, default=0.03, help="mean fake Twitter latency in seconds")
+    parser.add_argument("--gemini-latency", type=float, default=0.2, help="mean fake Gemini latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests both fakes answer with 503")
+    parser.add_argument("--rate-limit", type=int, default=300, help="fake Twitter requests per caller and endpoint per window")
+    parser.add_argument("--gemini-rpm", type=int, default=100000, help="Gemini requests per minute the bot may spend")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's INFO logging")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.accounts.split(",")]
+
+    twitter = start_fake_twitter(latency=args.twitter_latency, error_rate=args.error_rate, rate_limit=args.rate_limit)
+    gemini = start_fake_gemini(latency=args.gemini_latency, error_rate=args.error_rate, varied=True)
+    _configure_environment(args, gemini, twitter)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Queue, store, caches and indexes all default to paths under the working directory
+        os.chdir(tmp)
+        with open("accounts.json", "w") as f:
+            json.dump([account for size in sizes for account in _accounts(size)], f)
+        import logging
+        if not args.verbose:
+            logging.disable(logging.WARNING)
+        from trend_provider import set_trend_source
+        set_trend_source(lambda: TRENDS)
+
+        results = {"commit": _git_commit(), "timestamp": time.time(), "options": vars(args), "sizes": []}
+        for size in sizes:
+            result = run_size(size, args, twitter, gemini)
+            results["sizes"].append(result)
+            print_result(result)
+        os.chdir(ROOT)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {output}")
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    main()
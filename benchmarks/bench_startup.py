@@ -0,0 +1,72 @@
+# bench_startup.py - Measure how long importing each entry point takes in a fresh interpreter
+#
+# Each import runs in its own subprocess with no credentials set, so the numbers include
+# everything a cold CLI start pays. Exits non-zero if an entry point pulls in one of the
+# heavy client libraries at import time or goes over --max-ms.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ["config", "test_bot", "scheduler", "main", "multi_account", "metrics_poller", "analytics"]
+# Only a stage that talks to the API should load these
+HEAVY_MODULES = ["tweepy", "google.generativeai", "requests", "bs4", "dotenv"]
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(module, runs, cwd):
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("GEMINI_KEY", "BEARER_TOKEN", "TWITTER_API_KEY", "TWITTER_API_SECRET",
+                          "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_SECRET")}
+    samples, loaded = [], set()
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT, module=module, heavy=HEAVY_MODULES)],
+                                cwd=cwd, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1:]
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        samples.append(probe["seconds"])
+        loaded.update(probe["loaded"])
+    return statistics.median(samples), sorted(loaded)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of the bot's entry points")
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS), help="comma-separated modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module (median is reported)")
+    parser.add_argument("--max-ms", type=float, help="fail if any entry point (other than analytics) takes longer")
+    args = parser.parse_args()
+
+    failed = False
+    # An empty working directory, so no .env or local state is picked up
+    with tempfile.TemporaryDirectory() as tmp:
+        # Warm the bytecode cache so the first module isn't charged for compiling
+        subprocess.run([sys.executable, "-m", "compileall", "-q", ROOT], capture_output=True)
+        for module in args.modules.split(","):
+            seconds, loaded = measure(module, args.runs, tmp)
+            if seconds is None:
+                print(f"{module:<16} import failed: {' '.join(loaded)}")
+                failed = True
+                continue
+            # analytics is pandas-based by design; only check it for the client libraries
+            over = args.max_ms is not None and module != "analytics" and seconds * 1000 > args.max_ms
+            failed = failed or over or bool(loaded)
+            print(f"{module:<16} {seconds * 1000:8.1f} ms"
+                  f"{'  OVER BUDGET' if over else ''}"
+                  f"{'  loads ' + ', '.join(loaded) if loaded else ''}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
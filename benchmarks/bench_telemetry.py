@@ -0,0 +1,36 @@
+# bench_telemetry.py - Per-call overhead of telemetry spans
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.telemetry import span, render_prometheus, reset
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark telemetry span overhead")
+    parser.add_argument("--calls", type=int, default=200_000, help="number of spans to record")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        pass
+    baseline = time.perf_counter() - start
+
+    reset()
+    endpoints = ["POST /2/tweets", "GET /2/tweets", "GET /2/users/me"]
+    start = time.perf_counter()
+    for i in range(args.calls):
+        with span("twitter", endpoint=endpoints[i % 3]):
+            pass
+    elapsed = time.perf_counter() - start - baseline
+    print(f"Recorded {args.calls:,} spans in {elapsed:.3f}s ({elapsed / args.calls * 1e6:.2f} us per span)")
+
+    start = time.perf_counter()
+    text = render_prometheus()
+    print(f"Rendered {len(text.splitlines())} exposition lines in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
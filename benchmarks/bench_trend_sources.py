@@ -0,0 +1,148 @@
+# bench_trend_sources.py - Measure trend ingestion: cold fetches, conditional refetches and local fixtures
+#
+# Serves generated RSS, JSON and HTML feeds from a local server that honours ETag and
+# If-Modified-Since, so repeat fetches should cost a 304 and no parsing.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("open source model launch chips funding startup security breach rust python release "
+         "cloud outage browser update robotics climate battery satellite privacy law").split()
+# Headlines draw on a realistic vocabulary size, not just the handful of topic words above
+VOCABULARY = WORDS + [f"{a}{b}" for a in ("data", "quantum", "solar", "mobile", "retail", "health", "space", "crypto")
+                      for b in ("labs", "grid", "apps", "chain", "ops", "care", "deals", "rules", "tools", "wars")]
+
+def _title(rng):
+    return " ".join(rng.sample(VOCABULARY, 6)).capitalize()
+
+def make_feeds(count, items, seed=0):
+    """{path: (content type, body)} for `count` feeds cycling through RSS, JSON and HTML"""
+    rng = random.Random(seed)
+    shared = [_title(rng) for _ in range(items // 2)]
+    feeds = {}
+    for i in range(count):
+        titles = shared[:items // 2] + [_title(rng) for _ in range(items - items // 2)]
+        rng.shuffle(titles)
+        kind = ("rss", "json", "html")[i % 3]
+        if kind == "rss":
+            body = "<?xml version='1.0'?><rss><channel><title>Feed</title>" + "".join(
+                f"<item><title>{t}</title><category>{rng.choice(WORDS)} news</category><description>{'x' * 400}</description></item>"
+                for t in titles) + "</channel></rss>"
+            feeds[f"/feed{i}.xml"] = ("application/rss+xml", body.encode())
+        elif kind == "json":
+            body = json.dumps({"data": {"children": [{"data": {"title": t, "selftext": "x" * 400}} for t in titles]}})
+            feeds[f"/feed{i}.json"] = ("application/json", body.encode())
+        else:
+            body = "<html><body>" + "".join(f"<article><h2>{t}</h2><p>{'x' * 400}</p></article>" for t in titles) + "</body></html>"
+            feeds[f"/feed{i}.html"] = ("text/html", body.encode())
+    return feeds
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The client hangs up mid-body once it has read enough items; that is expected
+        pass
+
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.latency)
+        if self.path not in server.feeds:
+            self.send_error(404)
+            return
+        content_type, body = server.feeds[self.path]
+        etag = f'"{hash(body) & 0xffffffff:x}"'
+        if self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == server.last_modified:
+            server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", server.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_feed_server(feeds, latency):
+    server = FeedServer(("127.0.0.1", 0), FeedHandler)
+    server.feeds, server.latency = feeds, latency
+    server.requests = server.not_modified = 0
+    server.last_modified = formatdate(time.time() - 3600, usegmt=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trend source ingestion")
+    parser.add_argument("--sources", type=int, default=12, help="number of feeds")
+    parser.add_argument("--items", type=int, default=100, help="items per feed")
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency per request in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BOT_DB_FILE"] = os.path.join(tmp, "bench_store.db")
+        import trend_sources
+        from store import save_state
+
+        feeds = make_feeds(args.sources, args.items)
+        server = start_feed_server(feeds, args.latency)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        sources = [{"name": path.strip("/"), "url": base + path, "format": path.rsplit(".", 1)[1].replace("xml", "rss"),
+                    "items_path": "data.children", "title_field": "data.title", "tags": ["h2"]}
+                   for path in feeds]
+        total_bytes = sum(len(body) for _, body in feeds.values())
+
+        for label, workers in (("sequential", 1), ("concurrent", trend_sources.FETCH_WORKERS)):
+            save_state(trend_sources.STATE_KEY, {})
+            start = time.perf_counter()
+            trends = trend_sources.fetch_trends(sources, workers=workers)
+            print(f"Cold fetch, {label:<10} ({workers} workers): {(time.perf_counter() - start) * 1000:7.1f} ms "
+                  f"for {args.sources} feeds / {total_bytes / 1024:.0f} KiB")
+
+        stats_before = trend_sources.get_source_stats()
+        start = time.perf_counter()
+        trend_sources.fetch_trends(sources)
+        stats = trend_sources.get_source_stats()
+        print(f"Conditional refetch:                    {(time.perf_counter() - start) * 1000:7.1f} ms "
+              f"({stats['not_modified'] - stats_before['not_modified']} not modified, "
+              f"{stats['bytes'] - stats_before['bytes']} bytes downloaded)")
+
+        # The same feeds as local fixtures: parsed once, then skipped while unchanged
+        fixtures = []
+        for source, (path, (_, body)) in zip(sources, feeds.items()):
+            fixture = os.path.join(tmp, path.strip("/"))
+            with open(fixture, "wb") as f:
+                f.write(body)
+            fixtures.append(dict(source, name="file-" + source["name"], url=fixture))
+        for label in ("Fixtures, first read:", "Fixtures, unchanged:"):
+            start = time.perf_counter()
+            trends = trend_sources.fetch_trends(fixtures)
+            print(f"{label:<40}{(time.perf_counter() - start) * 1000:7.1f} ms")
+
+        print(f"Top topics: {trends['topics'][:3]}")
+        print(f"Hashtags: {trends['hashtags']}")
+        print(f"Stats: {trend_sources.get_source_stats()}")
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# fake_gemini.py - Local stand-in for the Gemini generateContent REST endpoint
+#
+# Run it and point the bot at it with GEMINI_BASE_URL=http://127.0.0.1:<port>. For load
+# tests also raise GEMINI_REQUESTS_PER_MINUTE so the rate budget does not pace requests.
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# One tweet per line, as the prompt asks for
+SAMPLE_TWEETS = [
+    "Most people overestimate what they can do in a day and underestimate what they can do in a year. #Growth",
+    "3 habits that changed my mornings: 1) no phone first hour 2) water before coffee 3) plan the top task #Habits",
+    "What's one tool you can't work without anymore, and why? #Productivity",
+    "Shipping beats polishing. Your first version is supposed to be embarrassing. #StartupLife",
+    "5 ways to protect deep work: block mornings, batch email, mute chat, keep one tab, use timers #Focus",
+    "If you had to start your career over today, what would you do differently? #CareerAdvice",
+]
+# Words for varied tweets, so near-duplicate filtering does not reject load-test posts
+VOCABULARY = (
+    "focus habits shipping teams writing mornings feedback launches hiring pricing notes reviews "
+    "coffee deadlines mentors sprints roadmaps users metrics onboarding meetings email calendars "
+    "prototypes demos budgets sleep walks reading journaling refactors docs interviews pitches "
+    "newsletters podcasts templates checklists retros goals experiments dashboards support growth"
+).split()
+HASHTAGS = ["#Growth", "#Habits", "#Productivity", "#StartupLife", "#Focus", "#CareerAdvice"]
+
+def varied_tweet(rng):
+    """A tweet assembled from random vocabulary, distinct across requests"""
+    words = rng.sample(VOCABULARY, 6)
+    return rng.choice([
+        f"Unpopular opinion: {words[0]} and {words[1]} matter more than {words[2]} or {words[3]}. {rng.choice(HASHTAGS)}",
+        f"3 things that fixed my {words[0]}: 1) {words[1]} 2) {words[2]} 3) {words[3]} {rng.choice(HASHTAGS)}",
+        f"What's your take on {words[0]} versus {words[1]} when {words[2]} and {words[3]} pile up? {rng.choice(HASHTAGS)}",
+    ]) + f" ({words[4]}, {words[5]})"
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, text, chunk_size=40):
+        """Send the text as server-sent events, pausing between chunks like a real stream"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for start in range(0, len(text), chunk_size):
+            chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[start:start + chunk_size]}]}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.latency / 10)
+        self.close_connection = True
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server.record_request()
+        try:
+            self._respond(server, request)
+        finally:
+            server.finish_request_count()
+
+    def _respond(self, server, request):
+
+        method = re.search(r"/models/[^/:]+:(generateContent|streamGenerateContent)$", self.path.split("?")[0])
+        if not method:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+
+        time.sleep(max(0, random.gauss(server.latency, server.latency_jitter)))
+        if random.random() < server.error_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "The model is overloaded"}})
+            return
+
+        prompt = request["contents"][0]["parts"][0]["text"]
+        if m := re.search(r"Create (\d+) different tweets of EACH", prompt):
+            # Candidate pool request: labelled lines, suffixed so every candidate is distinct
+            if server.varied:
+                with server._lock:
+                    lines = [f"{label}: {varied_tweet(server.rng)}"
+                             for _ in range(int(m.group(1))) for label in ("HOOK", "LIST", "QUESTION")]
+            else:
+                lines = [f"{label}: {SAMPLE_TWEETS[(server.requests * 7 + i * 3 + j) % len(SAMPLE_TWEETS)]} ({server.requests}.{i}.{j})"
+                         for i in range(int(m.group(1))) for j, label in enumerate(("HOOK", "LIST", "QUESTION"))]
+            self._send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": "\n".join(lines)}]}}]
+            })
+            return
+        count = int(m.group(1)) if (m := re.search(r"exactly (\d+) tweets", prompt)) else 3
+        if server.varied:
+            with server._lock:
+                tweets = [varied_tweet(server.rng) for _ in range(count)]
+        else:
+            tweets = [SAMPLE_TWEETS[(server.requests + i) % len(SAMPLE_TWEETS)] for i in range(count)]
+        if method.group(1) == "streamGenerateContent":
+            self._send_stream("\n".join(tweets))
+            return
+        self._send_json(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": "\n".join(tweets)}]}}]
+        })
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.05, latency_jitter=0.01, error_rate=0.0, varied=False):
+        super().__init__(address, FakeGeminiHandler)
+        self.varied = varied
+        self.rng = random.Random(0)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finish_request_count(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_fake_gemini(**options):
+    """Start a fake Gemini server on a background thread and return it"""
+    server = FakeGeminiServer(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--varied", action="store_true", help="answer with random tweets instead of the fixed samples")
+    args = parser.parse_args()
+    server = FakeGeminiServer(("127.0.0.1", args.port), latency=args.latency, error_rate=args.error_rate,
+                              varied=args.varied)
+    print(f"Fake Gemini listening on {server.base_url}")
+    server.serve_forever()
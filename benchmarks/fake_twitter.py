@@ -0,0 +1,173 @@
+# fake_twitter.py - Local stand-in for the Twitter API v2 endpoints the bot uses
+#
+# Run it and point the bot at it with TWITTER_BASE_URL=http://127.0.0.1:<port>.
+# Serves GET /2/users/me, POST /2/tweets, GET /2/tweets and GET /2/tweets/:id with
+# x-rate-limit-* headers, per-caller rate limits, latency and injected 503s.
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+def fake_metrics(tweet_id):
+    """Deterministic public metrics for a tweet ID, stable across runs and processes"""
+    digest = hashlib.sha256(str(tweet_id).encode()).digest()
+    impressions = 100 + int.from_bytes(digest[0:2], "big") % 1000
+    return {
+        "like_count": 1 + digest[2] % 50,
+        "retweet_count": digest[3] % 15,
+        "reply_count": digest[4] % 8,
+        "quote_count": digest[5] % 5,
+        "bookmark_count": digest[6] % 12,
+        "impression_count": impressions,
+    }
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _caller(self):
+        auth = self.headers.get("Authorization", "")
+        token = re.search(r'oauth_token="([^"]+)"', auth)
+        return token.group(1) if token else auth
+
+    def _handle(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        route = re.sub(r"/\d+$", "/:id", url.path)
+        endpoint = f"{method} {route}"
+        body = b""
+        if method == "POST":
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        allowed, headers = server.spend(self._caller(), endpoint)
+        time.sleep(max(0, random.gauss(server.latency, server.latency_jitter)))
+        if not allowed:
+            self._send_json(429, {"title": "Too Many Requests", "status": 429}, headers)
+            return
+        if random.random() < server.error_rate:
+            self._send_json(503, {"title": "Service Unavailable", "status": 503}, headers)
+            return
+
+        if endpoint == "GET /2/users/me":
+            caller_id = int(hashlib.sha256(self._caller().encode()).hexdigest()[:12], 16)
+            self._send_json(200, {"data": {"id": str(caller_id), "name": "Fake User", "username": f"fake_{caller_id % 10000}"}}, headers)
+        elif endpoint == "POST /2/tweets":
+            text = json.loads(body or b"{}").get("text", "")
+            tweet_id = server.create_tweet(text)
+            self._send_json(201, {"data": {"id": tweet_id, "text": text, "edit_history_tweet_ids": [tweet_id]}}, headers)
+        elif endpoint == "GET /2/tweets":
+            ids = parse_qs(url.query).get("ids", [""])[0].split(",")
+            data = [server.tweet(tweet_id) for tweet_id in ids if tweet_id in server.tweets]
+            errors = [{"value": tweet_id, "detail": f"Could not find tweet with ids: [{tweet_id}].",
+                       "title": "Not Found Error", "resource_type": "tweet", "parameter": "ids",
+                       "resource_id": tweet_id, "type": "https://api.twitter.com/2/problems/resource-not-found"}
+                      for tweet_id in ids if tweet_id not in server.tweets]
+            payload = {"data": data} if data else {}
+            if errors:
+                payload["errors"] = errors
+            self._send_json(200, payload, headers)
+        elif endpoint == "GET /2/tweets/:id":
+            tweet_id = url.path.rsplit("/", 1)[1]
+            if tweet_id in server.tweets:
+                self._send_json(200, {"data": server.tweet(tweet_id)}, headers)
+            else:
+                self._send_json(404, {"title": "Not Found Error", "status": 404}, headers)
+        else:
+            self._send_json(404, {"title": "Not Found", "status": 404})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+class FakeTwitterServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.03, latency_jitter=0.01, error_rate=0.0,
+                 rate_limit=300, window_seconds=900):
+        super().__init__(address, FakeTwitterHandler)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.window_seconds = window_seconds
+        self.tweets = {}
+        self.requests = 0
+        self.rate_limited = 0
+        self._windows = {}
+        self._next_id = 1_800_000_000_000_000_000
+        self._lock = threading.Lock()
+
+    def spend(self, caller, endpoint):
+        """Count a request against its caller's window; returns (allowed, rate-limit headers)"""
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            reset_at, used = self._windows.get((caller, endpoint), (now + self.window_seconds, 0))
+            if now >= reset_at:
+                reset_at, used = now + self.window_seconds, 0
+            allowed = used < self.rate_limit
+            used += allowed
+            self._windows[(caller, endpoint)] = (reset_at, used)
+            if not allowed:
+                self.rate_limited += 1
+        return allowed, {
+            "x-rate-limit-limit": self.rate_limit,
+            "x-rate-limit-remaining": self.rate_limit - used,
+            "x-rate-limit-reset": int(reset_at),
+        }
+
+    def create_tweet(self, text):
+        with self._lock:
+            self._next_id += 1
+            tweet_id = str(self._next_id)
+            self.tweets[tweet_id] = {"text": text, "created_at": time.time()}
+        return tweet_id
+
+    def tweet(self, tweet_id):
+        stored = self.tweets[tweet_id]
+        created = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(stored["created_at"]))
+        return {"id": tweet_id, "text": stored["text"], "created_at": created,
+                "edit_history_tweet_ids": [tweet_id], "public_metrics": fake_metrics(tweet_id)}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_fake_twitter(**options):
+    """Start a fake Twitter server on a background thread and return it"""
+    server = FakeTwitterServer(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Twitter API v2")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.03, help="mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rate-limit", type=int, default=300, help="requests per caller and endpoint per window")
+    args = parser.parse_args()
+    server = FakeTwitterServer(("127.0.0.1", args.port), latency=args.latency, error_rate=args.error_rate,
+                               rate_limit=args.rate_limit)
+    print(f"Fake Twitter listening on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,140 @@
+import logging
+import re
+import time
+import numpy as np
+from config import ENGAGEMENT_THRESHOLD
+from accounts import DEFAULT_ACCOUNT
+from store import (add_candidates, get_unused_candidates, mark_candidates_used, claim_candidates,
+                   get_recent_tweets, extract_hashtags)
+from strategy_aggregates import load_aggregates
+from dedup_index import find_near_duplicates
+from tweet_text import validate_batch
+from engagement_model import load_model
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TWEET_TYPES = ["hook", "list", "question"]
+# Candidates asked for per type in one pool refill
+CANDIDATES_PER_TYPE = 12
+# Unused candidates per type the pool must hold to skip a model call
+MIN_STOCK_PER_TYPE = 2
+MIN_SCORE = 0.35
+POOL_MAX_AGE_SECONDS = 3 * 24 * 60 * 60
+WINNER_HISTORY_DAYS = 30
+MAX_WINNERS = 20
+
+SCORE_WEIGHTS = {"length": 0.25, "hashtags": 0.2, "similarity": 0.25, "predicted": 0.3}
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+def _tokens(text):
+    return set(_WORD_PATTERN.findall(text.lower()))
+
+def past_winners(days=WINNER_HISTORY_DAYS, limit=MAX_WINNERS, account=None):
+    """Recent tweets (of one account, if given) that cleared the engagement threshold, best first"""
+    tweets = [t for t in get_recent_tweets(days=days, account=account, with_metrics=True)
+              if t.get("likes", 0) >= ENGAGEMENT_THRESHOLD]
+    tweets.sort(key=lambda t: t.get("likes", 0) + t.get("retweets", 0) * 2, reverse=True)
+    return tweets[:limit]
+
+def score_candidates(candidates, aggregates=None, winners=None, model=None, posted_at=None, account=None):
+    """Score candidates in one pass; returns a NumPy array of scores in [0, 1]
+
+    The predicted part comes from the engagement model once it has enough
+    training data, and from the type/hashtag aggregates until then.
+    """
+    if not candidates:
+        return np.zeros(0)
+    aggregates = aggregates if aggregates is not None else load_aggregates(account)
+    winners = winners if winners is not None else past_winners(account=account)
+    model = model if model is not None else load_model()
+
+    texts = [c["text"] for c in candidates]
+    lengths = np.array(validate_batch(texts)[0], dtype=np.float64)
+    # Mid-length tweets do best; very short or maxed-out ones less so
+    length_score = np.clip(1 - np.abs(lengths - 140) / 140, 0, 1)
+
+    hashtags = [extract_hashtags(text) for text in texts]
+    hashtag_counts = np.fromiter((len(tags) for tags in hashtags), dtype=np.int64, count=len(texts))
+    hashtag_score = np.choose(np.minimum(hashtag_counts, 3), [0.3, 1.0, 0.8, 0.2])
+
+    similarity = np.zeros(len(texts))
+    winner_tokens = [_tokens(w["text"]) for w in winners]
+    if winner_tokens:
+        for i, text in enumerate(texts):
+            tokens = _tokens(text)
+            if tokens:
+                similarity[i] = max(len(tokens & w) / len(tokens | w) for w in winner_tokens if w)
+
+    if model.ready:
+        predicted = np.minimum(model.relative(candidates, account, posted_at or time.time()), 2) / 2
+    else:
+        baseline = max(aggregates.decayed_mean(aggregates.totals), 1.0)
+        type_buckets = aggregates.buckets["type"]
+        hashtag_buckets = aggregates.buckets["hashtag"]
+        predicted = np.zeros(len(texts))
+        for i, candidate in enumerate(candidates):
+            means = []
+            if candidate["type"] in type_buckets:
+                means.append(aggregates.decayed_mean(type_buckets[candidate["type"]]))
+            means += [aggregates.decayed_mean(hashtag_buckets[tag]) for tag in hashtags[i] if tag in hashtag_buckets]
+            # Without history every candidate gets the neutral score
+            predicted[i] = min(np.mean(means) / baseline, 2) / 2 if means else 0.5
+
+    return (SCORE_WEIGHTS["length"] * length_score
+            + SCORE_WEIGHTS["hashtags"] * hashtag_score
+            + SCORE_WEIGHTS["similarity"] * similarity
+            + SCORE_WEIGHTS["predicted"] * predicted)
+
+def stock_candidates(candidates, account=None):
+    """Add freshly generated candidates to the account's pool"""
+    added = add_candidates(candidates, account or DEFAULT_ACCOUNT)
+    logger.info(f"Added {added} new candidates to the pool ({len(candidates) - added} duplicates)")
+    return added
+
+def select_tweets(tweet_types=TWEET_TYPES, min_stock=MIN_STOCK_PER_TYPE, account=None):
+    """Pick the best candidate of the account's pool for each slot.
+
+    Candidates that repeat a posted tweet are removed from the pool. Returns
+    None, without using any candidate, when some type has fewer than
+    `min_stock` candidates scoring at least MIN_SCORE. Each pick is claimed
+    atomically, so concurrent runs never get the same candidate.
+    """
+    account = account or DEFAULT_ACCOUNT
+    pool = get_unused_candidates(max_age_seconds=POOL_MAX_AGE_SECONDS, account=account)
+    if not pool:
+        return None
+
+    # Drop repeats of posted tweets for good; near-misses are ranked down
+    matches = find_near_duplicates([c["text"] for c in pool])
+    repeats = [c["candidate_id"] for c, (matched_id, _) in zip(pool, matches) if matched_id is not None]
+    if repeats:
+        mark_candidates_used(repeats)
+        logger.info(f"Removed {len(repeats)} near-duplicate candidates from the pool")
+    pool = [c for c, (matched_id, _) in zip(pool, matches) if matched_id is None]
+    similarity = np.array([score for matched_id, score in matches if matched_id is None])
+    scores = score_candidates(pool, account=account) * (1 - similarity / 2) if pool else np.zeros(0)
+
+    rankings = []
+    for tweet_type in tweet_types:
+        ranked = sorted(
+            (i for i, c in enumerate(pool) if c["type"] == tweet_type and scores[i] >= MIN_SCORE),
+            key=lambda i: scores[i], reverse=True
+        )
+        if len(ranked) < min_stock:
+            logger.info(f"Candidate pool has only {len(ranked)} good {tweet_type} tweets")
+            return None
+        rankings.append(ranked)
+
+    picks = []
+    for tweet_type, ranked in zip(tweet_types, rankings):
+        # A candidate claimed by another run since the read falls through to the next best
+        pick = next((i for i in ranked if claim_candidates([pool[i]["candidate_id"]])), None)
+        if pick is None:
+            logger.info(f"Every good {tweet_type} candidate was taken by another run")
+            continue
+        picks.append(pick)
+    logger.info(f"Selected {len(picks)} tweets from a pool of {len(pool)} candidates")
+    return [{"type": pool[i]["type"], "text": pool[i]["text"], "score": round(float(scores[i]), 3)}
+            for i in picks]
@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from store import start_run, save_checkpoint, load_checkpoints, find_unfinished_run
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGES = ["discover", "generate", "post", "metrics", "optimize"]
+# Unfinished runs older than this are abandoned rather than resumed
+RESUME_MAX_AGE_SECONDS = int(os.getenv("RESUME_MAX_AGE_SECONDS", str(6 * 60 * 60)))
+
+_stats_lock = threading.Lock()
+_stats = {"writes": 0, "reads": 0, "seconds": 0.0, "resumed_runs": 0}
+
+def idempotency_key(run_id, position, text):
+    """Stable key for one tweet of a run; the publish queue accepts each key only once"""
+    return hashlib.sha256(f"{run_id}:{position}:{text}".encode()).hexdigest()[:24]
+
+def _timed(counter, start):
+    with _stats_lock:
+        _stats[counter] += 1
+        _stats["seconds"] += time.perf_counter() - start
+
+class RunCheckpoints:
+    """Durable per-stage outputs of one pipeline run.
+
+    start() resumes the account's latest unfinished run if it is recent
+    enough, so completed stages are skipped on the next attempt.
+    """
+
+    def __init__(self, run_id, completed=None):
+        self.run_id = run_id
+        self.completed = completed or {}
+
+    @classmethod
+    def start(cls, account=None, resume=True):
+        run_id = find_unfinished_run(account, RESUME_MAX_AGE_SECONDS) if resume else None
+        if run_id is None:
+            return cls(start_run(account))
+
+        start = time.perf_counter()
+        completed = load_checkpoints(run_id)
+        _timed("reads", start)
+        with _stats_lock:
+            _stats["resumed_runs"] += 1
+        logger.info(f"Resuming run {run_id} after stage '{cls(run_id, completed).last_stage}'")
+        return cls(run_id, completed)
+
+    @classmethod
+    def load(cls, run_id, completed=None):
+        """Checkpoints of a known run, e.g. one whose stages are spread across job workers
+
+        `completed` holds stage outputs carried in from elsewhere (a job's
+        payload); they are merged over what this host's store has.
+        """
+        start = time.perf_counter()
+        stored = load_checkpoints(run_id)
+        _timed("reads", start)
+        stored.update(completed or {})
+        return cls(run_id, stored)
+
+    @property
+    def last_stage(self):
+        done = [stage for stage in STAGES if stage in self.completed]
+        return done[-1] if done else None
+
+    def done(self, stage):
+        return stage in self.completed
+
+    def get(self, stage):
+        return self.completed.get(stage)
+
+    def save(self, stage, data):
+        start = time.perf_counter()
+        save_checkpoint(self.run_id, stage, data)
+        self.completed[stage] = data
+        _timed("writes", start)
+
+def get_checkpoint_stats():
+    """Checkpoint reads/writes so far and the total time spent on them"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["seconds"] = round(stats["seconds"], 4)
+    return stats
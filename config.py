@@ -1,28 +1,50 @@
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# API Keys
-GEMINI_KEY = os.getenv("GEMINI_KEY")
-TWITTER_API_KEY = os.getenv("TWITTER_API_KEY")
-TWITTER_API_SECRET = os.getenv("TWITTER_API_SECRET")
-TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
-TWITTER_ACCESS_SECRET = os.getenv("TWITTER_ACCESS_SECRET")
-BEARER_TOKEN = os.getenv("BEARER_TOKEN")
-CLIENT_ID = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
+import threading
 
 # Bot Configuration
 MAX_TWEETS_PER_DAY = 10
 TWEET_COOLDOWN_MINUTES = 30
 ENGAGEMENT_THRESHOLD = 5  # Minimum likes before considering a tweet successful
 
-# Validation
-required_vars = [
-    GEMINI_KEY, TWITTER_API_KEY, TWITTER_API_SECRET, 
-    TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_SECRET, BEARER_TOKEN
-]
+# API Keys, read from the environment (and .env) on first use, e.g. config.GEMINI_KEY
+ENV_VARS = (
+    "GEMINI_KEY", "TWITTER_API_KEY", "TWITTER_API_SECRET", "TWITTER_ACCESS_TOKEN",
+    "TWITTER_ACCESS_SECRET", "BEARER_TOKEN", "CLIENT_ID", "CLIENT_SECRET",
+    # Shared secret between a job queue server on a non-local address and its workers
+    "JOB_QUEUE_TOKEN",
+)
+REQUIRED_VARS = ENV_VARS[:6]
+
+_env_loaded = False
+_env_lock = threading.Lock()
+
+def load_env():
+    """Load .env into os.environ once per process; later calls are free"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+def require(*names):
+    """Return the values of the named settings, raising if any is missing"""
+    load_env()
+    values = [os.getenv(name) for name in names]
+    missing = [name for name, value in zip(names, values) if not value]
+    if missing:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing)}. Check your .env file.")
+    return values
+
+def validate():
+    """Check every credential up front, for entry points that want to fail fast"""
+    require(*REQUIRED_VARS)
 
-if not all(required_vars):
-    raise ValueError("Missing required environment variables. Check your .env file.")
+def __getattr__(name):
+    # Deferred so importing config (or anything that imports it) costs nothing
+    if name in ENV_VARS:
+        load_env()
+        return os.getenv(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
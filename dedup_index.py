@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import struct
+import threading
+import zlib
+import numpy as np
+from store import get_connection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = os.getenv("DEDUP_INDEX_FILE", os.path.join(".cache", "dedup_index.bin"))
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 3
+# Estimated Jaccard similarity of word 3-grams above which a tweet counts as a repeat
+DUPLICATE_THRESHOLD = 0.6
+
+_WORD_PATTERN = re.compile(r"[a-z0-9#']+")
+_URL_PATTERN = re.compile(r"https?://\S+")
+
+_rng = np.random.default_rng(20240601)
+# Multiply-shift hash family: odd 64-bit multipliers, arithmetic wraps mod 2**64
+_HASH_A = _rng.integers(1, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_HASH_B = _rng.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+# Mixes the rows of an LSH band into one 64-bit bucket key
+_BAND_MIX = _rng.integers(1, 2 ** 63, ROWS_PER_BAND, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+# The index file is a log of appended blocks: this header (marker, store rowid watermark,
+# tweet count), then each ID as a length-prefixed UTF-8 string, then the signatures
+_BLOCK_MARKER = b"DDX1"
+_BLOCK_HEADER = struct.Struct("<4sqI")
+_ID_LENGTH = struct.Struct("<H")
+
+def _shingle_hashes(text):
+    words = _WORD_PATTERN.findall(_URL_PATTERN.sub(" ", text.lower()))
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return [zlib.crc32(shingle.encode()) for shingle in shingles]
+
+def minhash_signatures(texts, chunk_size=2048):
+    """MinHash signatures for a batch of texts, shape (len(texts), NUM_PERMUTATIONS)"""
+    if len(texts) > chunk_size:
+        # Bound the (permutations x shingles) scratch matrix
+        return np.vstack([minhash_signatures(texts[i:i + chunk_size], chunk_size)
+                          for i in range(0, len(texts), chunk_size)])
+    if not texts:
+        return np.zeros((0, NUM_PERMUTATIONS), dtype=np.uint32)
+    per_text = [_shingle_hashes(text) for text in texts]
+    counts = np.fromiter((len(h) for h in per_text), dtype=np.int64, count=len(per_text))
+    flat = np.fromiter((h for hashes in per_text for h in hashes), dtype=np.uint64, count=int(counts.sum()))
+    with np.errstate(over="ignore"):
+        hashed = (_HASH_A[:, None] * flat[None, :] + _HASH_B[:, None]) >> np.uint64(32)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return np.minimum.reduceat(hashed, starts, axis=1).T.astype(np.uint32)
+
+def band_keys(signatures):
+    """LSH bucket keys, shape (len(signatures), BANDS)"""
+    bands = signatures.reshape(len(signatures), BANDS, ROWS_PER_BAND).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        return (bands * _BAND_MIX).sum(axis=2, dtype=np.uint64)
+
+class DedupIndex:
+    """MinHash/LSH index over posted tweet text.
+
+    Adding is incremental; a query only compares against tweets sharing at
+    least one LSH band, so lookups stay fast as history grows. Each process
+    holds its own copy, built from the file and the store's tweets table and
+    topped up from that table before each lookup. Saving appends only what
+    was added since the last save.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self._known = set()
+        # Highest tweets-table rowid already read from the store
+        self.synced_rowid = 0
+        self.signatures = np.zeros((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        self.buckets = [{} for _ in range(BANDS)]
+        self._pending = []
+        # (ids, signatures) added since the last save, and the watermark that save recorded
+        self._unsaved = []
+        self._saved_rowid = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, texts, ids):
+        """Index new texts under the given IDs, skipping IDs that are already indexed; returns how many were added"""
+        new = {}
+        for text, tweet_id in zip(texts, ids):
+            tweet_id = str(tweet_id)
+            if tweet_id not in self._known:
+                new.setdefault(tweet_id, text)
+        if not new:
+            return 0
+        signatures = minhash_signatures(list(new.values()))
+        self._append(list(new), signatures)
+        self._unsaved.append((list(new), signatures))
+        return len(new)
+
+    def _append(self, ids, signatures):
+        offset = len(self.ids)
+        self.ids.extend(ids)
+        self._known.update(ids)
+        self._pending.append(signatures)
+        self._add_to_buckets(signatures, offset)
+
+    def _add_to_buckets(self, signatures, offset):
+        for band, keys in enumerate(band_keys(signatures).T.tolist()):
+            buckets = self.buckets[band]
+            for row, key in enumerate(keys, offset):
+                buckets.setdefault(key, []).append(row)
+
+    def _all_signatures(self):
+        if self._pending:
+            self.signatures = np.vstack([self.signatures] + self._pending)
+            self._pending = []
+        return self.signatures
+
+    def query(self, texts, threshold=DUPLICATE_THRESHOLD):
+        """For each text return (matched_id, similarity); matched_id is None below the threshold"""
+        signatures = minhash_signatures(list(texts))
+        indexed = self._all_signatures()
+        results = []
+        for signature, keys in zip(signatures, band_keys(signatures).tolist()):
+            candidates = set()
+            for band, key in enumerate(keys):
+                candidates.update(self.buckets[band].get(key, ()))
+            if not candidates:
+                results.append((None, 0.0))
+                continue
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarity = (indexed[rows] == signature).mean(axis=1)
+            best = int(similarity.argmax())
+            score = float(similarity[best])
+            results.append((self.ids[rows[best]] if score >= threshold else None, score))
+        return results
+
+    def save(self, path=INDEX_FILE):
+        """Append the tweets added since the last save, and the store watermark, to the index file"""
+        if not self._unsaved and self.synced_rowid <= self._saved_rowid:
+            return
+        ids = [tweet_id for batch, _ in self._unsaved for tweet_id in batch]
+        signatures = [signatures for _, signatures in self._unsaved]
+        parts = [_BLOCK_HEADER.pack(_BLOCK_MARKER, self.synced_rowid, len(ids))]
+        for tweet_id in ids:
+            encoded = tweet_id.encode()
+            parts += [_ID_LENGTH.pack(len(encoded)), encoded]
+        parts += [np.ascontiguousarray(batch, dtype="<u4").tobytes() for batch in signatures]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One O_APPEND write per block, so blocks from processes sharing the file never interleave
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, b"".join(parts))
+        finally:
+            os.close(fd)
+        self._unsaved = []
+        self._saved_rowid = self.synced_rowid
+
+    def _rewrite(self, path):
+        """Replace the file with one block of everything indexed, dropping a damaged tail"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._unsaved = [(list(self.ids), self._all_signatures())]
+        self._saved_rowid = -1
+        self.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        """Rebuild the index from the file's blocks; a block cut short by a crash ends the read"""
+        index = cls()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return index
+        position = 0
+        while position + _BLOCK_HEADER.size <= len(data):
+            marker, rowid, count = _BLOCK_HEADER.unpack_from(data, position)
+            if marker != _BLOCK_MARKER:
+                logger.warning(f"Near-duplicate index file {path} is damaged at byte {position}; rewriting it")
+                index._rewrite(path)
+                break
+            cursor = position + _BLOCK_HEADER.size
+            ids = []
+            for _ in range(count):
+                if cursor + _ID_LENGTH.size > len(data):
+                    break
+                length, = _ID_LENGTH.unpack_from(data, cursor)
+                cursor += _ID_LENGTH.size
+                ids.append(data[cursor:cursor + length].decode())
+                cursor += length
+            end = cursor + count * NUM_PERMUTATIONS * 4
+            if len(ids) < count or end > len(data):
+                break
+            signatures = np.frombuffer(data, dtype="<u4", count=count * NUM_PERMUTATIONS, offset=cursor)
+            signatures = signatures.reshape(count, NUM_PERMUTATIONS).astype(np.uint32)
+            # Processes sharing the file may each have appended the same tweet
+            keep = [i for i, tweet_id in enumerate(ids) if tweet_id not in index._known]
+            if keep:
+                index._append([ids[i] for i in keep], signatures[keep])
+            index.synced_rowid = max(index.synced_rowid, rowid)
+            position = end
+        index._saved_rowid = index.synced_rowid
+        return index
+
+_index = None
+_index_lock = threading.Lock()
+
+def _sync(index):
+    """Index tweets stored since the last sync, including those posted by other processes"""
+    rows = get_connection().execute("SELECT rowid, tweet_id, text FROM tweets WHERE rowid > ? ORDER BY rowid",
+                                    (index.synced_rowid,)).fetchall()
+    if not rows:
+        return
+    index.synced_rowid = rows[-1]["rowid"]
+    index.add([row["text"] for row in rows], [row["tweet_id"] for row in rows])
+    index.save()
+
+def get_index():
+    """Load the persisted index and catch up with any posted tweets it has not seen"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DedupIndex.load()
+            _sync(_index)
+            logger.info(f"Near-duplicate index ready with {len(_index)} tweets")
+        return _index
+
+def index_posted(posted_tweets):
+    """Add freshly posted tweets to the index"""
+    if not posted_tweets:
+        return
+    index = get_index()
+    with _index_lock:
+        # Tweets already saved to the store come in through the sync with their rowids
+        _sync(index)
+        if index.add([t["text"] for t in posted_tweets], [t["id"] for t in posted_tweets]):
+            index.save()
+
+def find_near_duplicates(texts, threshold=DUPLICATE_THRESHOLD):
+    """Check a batch of texts against posted history; returns (matched_id, similarity) per text"""
+    index = get_index()
+    with _index_lock:
+        _sync(index)
+        return index.query(texts, threshold)
@@ -0,0 +1,243 @@
+import logging
+import math
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+import numpy as np
+from store import extract_hashtags, get_recent_tweets, load_state, save_state, write_transaction
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "engagement_model"
+# Bump when the features change; a stored model of another version is retrained from history
+MODEL_VERSION = 1
+N_FEATURES = 2 ** 16
+LEARNING_RATE = 0.1
+# Engagement is learned at the metrics poller's last poll, so each tweet is one example
+LABEL_AGE_MINUTES = 24 * 60
+# Below this many training examples callers fall back to their own heuristics
+MIN_EXAMPLES = 20
+ERROR_SMOOTHING = 0.05
+BOOTSTRAP_DAYS = 30
+LENGTH_BUCKET = 20
+INDEX_CACHE_SIZE = 1 << 17
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+_state_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"scored": 0, "score_seconds": 0.0, "trained": 0}
+
+def _engagement_score(tweet):
+    return tweet.get('likes', 0) + tweet.get('retweets', 0) * 2
+
+_index_cache = {}
+
+def _index(name):
+    """Feature index of a name; memoized because the same words and tags recur constantly"""
+    index = _index_cache.get(name)
+    if index is None:
+        if len(_index_cache) >= INDEX_CACHE_SIZE:
+            _index_cache.clear()
+        index = _index_cache[name] = zlib.crc32(name.encode()) & (N_FEATURES - 1)
+    return index
+
+def _context(account=None, posted_at=None):
+    """Feature indices shared by every tweet posted by an account at a given time, plus the hour"""
+    indices = [_index("bias")]
+    hour = None
+    if posted_at:
+        moment = datetime.fromtimestamp(posted_at)
+        hour = moment.hour
+        indices += [_index(f"hour={hour}"), _index(f"dow={moment.weekday()}")]
+    if account:
+        indices.append(_index(f"account={account}"))
+    return indices, hour
+
+def features(tweet, account=None, posted_at=None, context=None):
+    """Hashed features of one tweet (type, hashtags, length, posting time, account, n-grams) as (indices, values)
+
+    An index may repeat; its values add up.
+    """
+    text = tweet["text"]
+    tweet_type = tweet.get("type")
+    context_indices, hour = context or _context(account, posted_at)
+    hashtags = extract_hashtags(text)
+    indices = context_indices + [_index(f"type={tweet_type}"), _index(f"len={min(len(text) // LENGTH_BUCKET, 14)}"),
+                                 _index(f"tags={min(len(hashtags), 3)}")]
+    indices += [_index("tag=" + tag) for tag in hashtags]
+    if hour is not None:
+        indices.append(_index(f"type={tweet_type}*hour={hour}"))
+    values = [1.0] * len(indices)
+
+    words = _WORD_PATTERN.findall(text.lower())
+    if words:
+        grams = [_index("w=" + word) for word in words]
+        grams += [_index("b=" + a + " " + b) for a, b in zip(words, words[1:])]
+        # Long tweets shouldn't outweigh the structural features just by having more words
+        indices += grams
+        values += [1 / math.sqrt(len(grams))] * len(grams)
+    return indices, values
+
+class EngagementModel:
+    """Linear regression on log(1 + engagement) over hashed features, trained online.
+
+    Each example is one AdaGrad step, so the model keeps learning as metric
+    snapshots arrive without revisiting old tweets. Only the non-zero
+    weights are persisted.
+    """
+
+    def __init__(self, n_features=N_FEATURES):
+        self.weights = np.zeros(n_features)
+        self.grad_squares = np.zeros(n_features)
+        self.examples = 0
+        self.revision = 0
+        # Running mean of the training targets, the baseline for relative scores
+        self.mean_target = 0.0
+        self.mean_abs_error = None
+        self.trained_at = None
+
+    @property
+    def ready(self):
+        return self.examples >= MIN_EXAMPLES
+
+    def learn(self, tweet, engagement, account=None, posted_at=None):
+        """One online update from a tweet and its observed engagement"""
+        indices, values = features(tweet, account, posted_at)
+        # Fold repeated indices together so each weight gets a single update
+        indices, inverse = np.unique(indices, return_inverse=True)
+        values = np.bincount(inverse, weights=values)
+        target = math.log1p(max(engagement, 0))
+        error = float(self.weights[indices] @ values) - target
+
+        gradient = error * values
+        self.grad_squares[indices] += gradient ** 2
+        self.weights[indices] -= LEARNING_RATE * gradient / (np.sqrt(self.grad_squares[indices]) + 1e-8)
+
+        self.examples += 1
+        self.mean_target += (target - self.mean_target) / self.examples
+        self.mean_abs_error = abs(error) if self.mean_abs_error is None else (
+            (1 - ERROR_SMOOTHING) * self.mean_abs_error + ERROR_SMOOTHING * abs(error))
+        self.trained_at = time.time()
+        return error
+
+    def predict_log(self, tweets, account=None, posted_at=None):
+        """Predicted log(1 + engagement) for a batch of tweets, in one vectorized pass"""
+        if not tweets:
+            return np.zeros(0)
+        start = time.perf_counter()
+        context = _context(account, posted_at)
+        indices, values, lengths = [], [], []
+        for tweet in tweets:
+            tweet_indices, tweet_values = features(tweet, context=context)
+            indices += tweet_indices
+            values += tweet_values
+            lengths.append(len(tweet_indices))
+        # Every tweet has the bias feature, so no row is empty
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        indices = np.array(indices, dtype=np.int64)
+        values = np.array(values)
+        predictions = np.add.reduceat(self.weights[indices] * values, offsets)
+        with _stats_lock:
+            _stats["scored"] += len(tweets)
+            _stats["score_seconds"] += time.perf_counter() - start
+        return predictions
+
+    def predict(self, tweets, account=None, posted_at=None):
+        """Expected engagement (likes + 2 x retweets) for a batch of tweets"""
+        return np.maximum(np.expm1(self.predict_log(tweets, account, posted_at)), 0)
+
+    def relative(self, tweets, account=None, posted_at=None):
+        """Predicted engagement relative to the typical tweet (1.0 = average)"""
+        return np.exp(self.predict_log(tweets, account, posted_at) - self.mean_target)
+
+    def to_dict(self):
+        nonzero = np.flatnonzero(self.grad_squares)
+        return {
+            "version": MODEL_VERSION,
+            "n_features": len(self.weights),
+            "revision": self.revision,
+            "examples": self.examples,
+            "mean_target": self.mean_target,
+            "mean_abs_error": self.mean_abs_error,
+            "trained_at": self.trained_at,
+            "indices": nonzero.tolist(),
+            "weights": self.weights[nonzero].tolist(),
+            "grad_squares": self.grad_squares[nonzero].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data["n_features"])
+        indices = np.array(data["indices"], dtype=np.int64)
+        model.weights[indices] = data["weights"]
+        model.grad_squares[indices] = data["grad_squares"]
+        model.revision = data["revision"]
+        model.examples = data["examples"]
+        model.mean_target = data["mean_target"]
+        model.mean_abs_error = data["mean_abs_error"]
+        model.trained_at = data["trained_at"]
+        return model
+
+def load_model():
+    """Restore the persisted model, training and saving a new one from stored metrics if none matches MODEL_VERSION"""
+    data = load_state(STATE_KEY)
+    if data and data.get("version") == MODEL_VERSION and data.get("n_features") == N_FEATURES:
+        return EngagementModel.from_dict(data)
+    if data:
+        logger.info(f"Stored engagement model is version {data.get('version')}, retraining version {MODEL_VERSION}")
+    model = EngagementModel()
+    # Younger tweets are learned from by record_snapshots once they reach the label age
+    history = [tweet for tweet in get_recent_tweets(days=BOOTSTRAP_DAYS, with_metrics=True)
+               if tweet.get("polled_at") and tweet["polled_at"] - tweet["posted_at"] >= LABEL_AGE_MINUTES * 60]
+    history.sort(key=lambda tweet: tweet["posted_at"])
+    for tweet in history:
+        model.learn(tweet, _engagement_score(tweet), tweet.get("account"), tweet["posted_at"])
+    if history:
+        logger.info(f"Trained engagement model on {len(history)} stored tweets")
+    save_model(model)
+    return model
+
+def save_model(model):
+    """Persist the model as a new revision"""
+    model.revision += 1
+    save_state(STATE_KEY, model.to_dict())
+
+def record_snapshots(snapshots):
+    """Train the persisted model on snapshots taken at the label age; earlier ones are skipped"""
+    usable = [s for s in snapshots if (s.get("age_minutes") or 0) >= LABEL_AGE_MINUTES and s.get("text")]
+    if not usable:
+        return
+    with _state_lock, write_transaction():
+        model = load_model()
+        for snapshot in usable:
+            model.learn(snapshot, _engagement_score(snapshot), snapshot.get("account"), snapshot.get("posted_at"))
+        save_model(model)
+    with _stats_lock:
+        _stats["trained"] += len(usable)
+
+def rank_tweets(tweets, account=None, posted_at=None, model=None):
+    """Order tweets by predicted engagement, best first, adding `predicted_engagement` to each.
+
+    The order is left alone while the model has too little history to be trusted.
+    """
+    if not tweets or not all(isinstance(tweet, dict) for tweet in tweets):
+        return tweets
+    model = model if model is not None else load_model()
+    if not model.ready:
+        return tweets
+    predictions = model.predict(tweets, account, posted_at or time.time())
+    for tweet, prediction in zip(tweets, predictions):
+        tweet["predicted_engagement"] = round(float(prediction), 2)
+    return [tweets[i] for i in np.argsort(-predictions, kind="stable")]
+
+def get_model_stats():
+    """Tweets scored and trained on by this process, and the time spent scoring"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["us_per_tweet"] = round(stats["score_seconds"] / stats["scored"] * 1e6, 2) if stats["scored"] else None
+    stats["score_seconds"] = round(stats["score_seconds"], 4)
+    return stats
@@ -1,29 +1,58 @@
-import google.generativeai as genai
-import os
+import asyncio
 import logging
-import json
-from dotenv import load_dotenv
-from config import GEMINI_KEY
+import time
+from contextlib import closing
+from utils.gemini_client import generate_text, stream_text, AsyncGeminiClient, MODEL_NAME
+from response_cache import cache_key, get_cached, put_cached
+from candidate_pool import select_tweets, stock_candidates, TWEET_TYPES, CANDIDATES_PER_TYPE
+from tweet_text import truncate, validate_batch, weighted_length
+from dedup_index import find_near_duplicates
 
-load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
-genai.configure(api_key=GEMINI_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
+# Fill-ins when Gemini returns fewer than 3 usable lines
+FILL_FALLBACK_TWEETS = [
+    {"type": "hook", "text": "The most underrated skill in 2025? Learning to say no to good opportunities so you can say yes to great ones. #Success"},
+    {"type": "list", "text": "3 things that changed my mindset:\n1. Progress > Perfection\n2. Consistency > Intensity\n3. Systems > Goals #Growth"},
+    {"type": "question", "text": "What's one belief you held 5 years ago that you've completely changed your mind about? #PersonalGrowth"}
+]
 
-def generate_tweets(trend_patterns, previous_performance=None):
-    """Generate tweets based on trending patterns and previous performance"""
-    
-    performance_context = ""
-    if previous_performance:
-        performance_context = f"""
+# Used when the generated tweets fail validation
+INVALID_FALLBACK_TWEETS = [
+    {"type": "hook", "text": "Everyone talks about work-life balance, but what you really need is work-life harmony. Here's the difference... #WorkLife"},
+    {"type": "list", "text": "5 micro-habits that compound:\n1. Read 10 pages daily\n2. Walk after meals\n3. Write 3 gratitudes\n4. Drink water first\n5. No phone for 1st hour #Habits"},
+    {"type": "question", "text": "If you could master one skill instantly, what would it be and why? Drop your answer below! 👇 #Skills"}
+]
+
+# Used when the Gemini call itself fails
+ERROR_FALLBACK_TWEETS = [
+    {"type": "hook", "text": "The biggest lie we tell ourselves: 'I'll start tomorrow.' Tomorrow never comes. Start today, even if it's imperfect. #Motivation"},
+    {"type": "list", "text": "4 rules for better decisions:\n1. Sleep on big choices\n2. Ask 'What would I regret not trying?'\n3. Consider the 10-10-10 rule\n4. Trust your gut #DecisionMaking"},
+    {"type": "question", "text": "What's one small change you made that had a surprisingly big impact on your life? #LifeHacks"}
+]
+
+FALLBACK_TEXTS = {
+    tweet["text"] for tweet in FILL_FALLBACK_TWEETS + INVALID_FALLBACK_TWEETS + ERROR_FALLBACK_TWEETS
+}
+
+def is_fallback(tweets):
+    """True when any tweet in the list is a hardcoded fallback rather than generated text"""
+    return any(tweet["text"] in FALLBACK_TEXTS for tweet in tweets)
+
+def _performance_context(previous_performance):
+    if not previous_performance:
+        return ""
+    return f"""
         Previous performance insights:
         - Best performing tweet style: {previous_performance.get('best_style', 'Unknown')}
         - Average engagement: {previous_performance.get('avg_engagement', 0)} likes
         - Top keywords: {', '.join(previous_performance.get('top_keywords', []))}
         """
+
+def build_prompt(trend_patterns, previous_performance=None):
+    """Build the Gemini prompt for one batch of tweets"""
+    performance_context = _performance_context(previous_performance)
     
     prompt = f"""
     You are a viral tweet creator. Based on these trending patterns: {', '.join(trend_patterns)}
@@ -44,72 +73,255 @@ def generate_tweets(trend_patterns, previous_performance=None):
     
     Just return the 3 tweets, one per line.
     """
+    return prompt
+
+def parse_tweets(response_text):
+    """Turn a raw Gemini response into 3 validated tweets, falling back when it is unusable"""
+    # Clean the response text
+    text = response_text.strip()
+        
+    # Remove code blocks if present
+    if "```" in text:
+        # Extract content between code blocks
+        parts = text.split("```")
+        for part in parts:
+            if not part.strip().startswith(('json', 'python', 'javascript', '{')):
+                text = part.strip()
+                break
+    
+    # Split into lines and clean
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    
+    # Remove any JSON-like content or formatting
+    clean_lines = []
+    for line in lines:
+        if not line.startswith(('{', '}', '"', '[', ']', 'TWEET', 'Tweet')):
+            if len(line) > 10 and not line.startswith('```'):  # Skip very short lines
+                clean_lines.append(line)
+    
+    # Create tweet objects
+    tweets = []
+    tweet_types = ["hook", "list", "question"]
+    
+    for i in range(min(3, len(clean_lines))):
+        tweets.append({
+            "type": tweet_types[i],
+            "text": truncate(clean_lines[i])  # Ensure weighted character limit
+        })
+    
+    # Ensure we have exactly 3 tweets
+    while len(tweets) < 3:
+        tweets.append(dict(FILL_FALLBACK_TWEETS[len(tweets)]))
+    
+    # Validate tweet lengths and content
+    _, valid = validate_batch([tweet['text'] for tweet in tweets[:3]], min_length=20)
+    valid_tweets = [tweet for tweet, ok in zip(tweets, valid) if ok]
+    
+    if len(valid_tweets) < 3:
+        logger.warning("Generated tweets were invalid, using high-quality fallbacks")
+        return [dict(tweet) for tweet in INVALID_FALLBACK_TWEETS]
+    
+    return valid_tweets
+
+def build_candidates_prompt(trend_patterns, previous_performance=None, per_type=CANDIDATES_PER_TYPE):
+    """Build the Gemini prompt asking for a pool of candidates of every type"""
+    performance_context = _performance_context(previous_performance)
+    
+    prompt = f"""
+    You are a viral tweet creator. Based on these trending patterns: {', '.join(trend_patterns)}
+    {performance_context}
+    
+    Create {per_type} different tweets of EACH of these types, each under 280 characters:
+    HOOK: A hook-style tweet that grabs attention immediately
+    LIST: A list-style tweet with numbered tips or points, written on one line
+    QUESTION: A question-style tweet that encourages engagement
+    
+    Requirements:
+    - Modern, conversational tone
+    - Include 1 relevant hashtag per tweet
+    - Each tweet should be complete and ready to post
+    - No markdown, no code blocks, no JSON
+    - One tweet per line, starting with its type label, e.g. "HOOK: ..."
+    """
+    return prompt
+
+def parse_candidates(response_text):
+    """Parse "TYPE: text" lines from a candidates response, keeping valid ones"""
+    candidates = []
+    for line in response_text.split('\n'):
+        label, sep, text = line.strip().partition(':')
+        tweet_type = label.strip(' *-').lower()
+        text = text.strip().strip('"')
+        if sep and tweet_type in TWEET_TYPES:
+            candidates.append({"type": tweet_type, "text": text})
+    # Validate the whole batch in one call
+    _, valid = validate_batch([c["text"] for c in candidates], min_length=20)
+    return [c for c, ok in zip(candidates, valid) if ok]
+
+class StreamingTweetParser:
+    """Single-pass line parser that emits tweets as soon as their line is complete.
+
+    Applies the same rules as parse_tweets: code blocks tagged as JSON or
+    code are skipped, formatting lines and very short lines are dropped,
+    and tweets must be 20-280 weighted characters.
+    """
+
+    def __init__(self, max_tweets=3):
+        self.max_tweets = max_tweets
+        self.count = 0
+        self._buffer = ""
+        self._in_fence = False
+        self._skip_fence = False
+
+    @property
+    def done(self):
+        return self.count >= self.max_tweets
+
+    def feed(self, chunk):
+        """Consume a chunk of response text; returns the tweets it completed"""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        return [tweet for tweet in map(self._parse_line, lines) if tweet]
+
+    def close(self):
+        """Flush the final unterminated line"""
+        line, self._buffer = self._buffer, ""
+        tweet = self._parse_line(line)
+        return [tweet] if tweet else []
+
+    def _parse_line(self, line):
+        line = line.strip()
+        if self.done or not line:
+            return None
+        if line.startswith('```'):
+            self._in_fence = not self._in_fence
+            self._skip_fence = self._in_fence and line[3:].strip().startswith(('json', 'python', 'javascript', '{'))
+            return None
+        if self._skip_fence:
+            return None
+        if line.startswith(('{', '}', '"', '[', ']', 'TWEET', 'Tweet')) or len(line) <= 10:
+            return None
+        text = truncate(line)
+        if weighted_length(text) < 20:
+            return None
+        tweet = {"type": TWEET_TYPES[self.count % len(TWEET_TYPES)], "text": text}
+        self.count += 1
+        return tweet
+
+def iter_tweets(trend_patterns, previous_performance=None, max_tweets=3):
+    """Stream tweets from Gemini, yielding each one as soon as its line is complete and valid.
+
+    Unlike generate_tweets there are no fallbacks: the generator simply
+    yields fewer tweets if the response runs short or the call fails.
+    """
+    parser = StreamingTweetParser(max_tweets)
+    prompt = build_prompt(trend_patterns, previous_performance)
+    try:
+        # closing() releases the Gemini slot even if we stop reading early
+        with closing(stream_text(prompt)) as chunks:
+            for chunk in chunks:
+                yield from parser.feed(chunk)
+                if parser.done:
+                    return
+        yield from parser.close()
+    except Exception as e:
+        logger.error(f"Error streaming tweets: {e}")
+
+def generate_candidates(trend_patterns, previous_performance=None, per_type=CANDIDATES_PER_TYPE, account=None):
+    """Ask Gemini for a pool of candidates in one call and stock the account's pool. Returns the parsed candidates."""
+    prompt = build_candidates_prompt(trend_patterns, previous_performance, per_type)
+    try:
+        candidates = parse_candidates(generate_text(prompt))
+    except Exception as e:
+        logger.error(f"Error generating tweet candidates: {e}")
+        return []
+    logger.info(f"Generated {len(candidates)} tweet candidates with Gemini")
+    stock_candidates(candidates, account)
+    return candidates
+
+def _already_posted(tweets):
+    """True when any of the tweets repeats a posted one, as a cached completion does once it went out"""
+    return any(matched_id is not None for matched_id, _ in find_near_duplicates([t["text"] for t in tweets]))
+
+def _cache_tweets(key, tweets, latency):
+    """Cache a good response; a failed cache write never costs the tweets themselves"""
+    if is_fallback(tweets):
+        return
+    try:
+        put_cached(key, tweets, latency)
+    except OSError as e:
+        logger.warning(f"Could not cache Gemini tweets: {e}")
+
+def generate_tweets(trend_patterns, previous_performance=None, bypass_cache=False, use_pool=True, account=None):
+    """Generate tweets based on trending patterns and previous performance
+
+    Tweets come from the account's candidate pool when it has enough good
+    stock, otherwise the pool is refilled with one model call. If that
+    fails, a single 3-tweet prompt is used; its responses are cached by
+    prompt and bypass_cache=True forces a fresh call.
+    """
+    if use_pool:
+        tweets = select_tweets(account=account)
+        if tweets is None and generate_candidates(trend_patterns, previous_performance, account=account):
+            tweets = select_tweets(min_stock=1, account=account)
+        if tweets:
+            return tweets
+        logger.warning("Candidate pool unavailable, generating tweets directly")
+    
+    prompt = build_prompt(trend_patterns, previous_performance)
+    key = cache_key(prompt, MODEL_NAME)
+    cached = get_cached(key, bypass=bypass_cache)
+    if cached and not _already_posted(cached):
+        logger.info("Using cached Gemini tweets for this prompt")
+        return cached
+    if cached:
+        logger.info("Cached Gemini tweets for this prompt were already posted; generating new ones")
     
     try:
-        response = model.generate_content(prompt)
+        start = time.perf_counter()
+        response_text = generate_text(prompt)
+        latency = time.perf_counter() - start
         logger.info("Successfully generated tweets with Gemini")
-        
-        # Clean the response text
-        text = response.text.strip()
-        
-        # Remove code blocks if present
-        if "```" in text:
-            # Extract content between code blocks
-            parts = text.split("```")
-            for part in parts:
-                if not part.strip().startswith(('json', 'python', 'javascript', '{')):
-                    text = part.strip()
-                    break
-        
-        # Split into lines and clean
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        
-        # Remove any JSON-like content or formatting
-        clean_lines = []
-        for line in lines:
-            if not line.startswith(('{', '}', '"', '[', ']', 'TWEET', 'Tweet')):
-                if len(line) > 10 and not line.startswith('```'):  # Skip very short lines
-                    clean_lines.append(line)
-        
-        # Create tweet objects
-        tweets = []
-        tweet_types = ["hook", "list", "question"]
-        
-        for i in range(min(3, len(clean_lines))):
-            tweets.append({
-                "type": tweet_types[i],
-                "text": clean_lines[i][:280]  # Ensure character limit
-            })
-        
-        # Ensure we have exactly 3 tweets
-        while len(tweets) < 3:
-            fallback_tweets = [
-                {"type": "hook", "text": "The most underrated skill in 2025? Learning to say no to good opportunities so you can say yes to great ones. #Success"},
-                {"type": "list", "text": "3 things that changed my mindset:\n1. Progress > Perfection\n2. Consistency > Intensity\n3. Systems > Goals #Growth"},
-                {"type": "question", "text": "What's one belief you held 5 years ago that you've completely changed your mind about? #PersonalGrowth"}
-            ]
-            tweets.append(fallback_tweets[len(tweets)])
-        
-        # Validate tweet lengths and content
-        valid_tweets = []
-        for tweet in tweets[:3]:
-            if 20 <= len(tweet['text']) <= 280:  # Reasonable length
-                valid_tweets.append(tweet)
-        
-        if len(valid_tweets) < 3:
-            logger.warning("Generated tweets were invalid, using high-quality fallbacks")
-            return [
-                {"type": "hook", "text": "Everyone talks about work-life balance, but what you really need is work-life harmony. Here's the difference... #WorkLife"},
-                {"type": "list", "text": "5 micro-habits that compound:\n1. Read 10 pages daily\n2. Walk after meals\n3. Write 3 gratitudes\n4. Drink water first\n5. No phone for 1st hour #Habits"},
-                {"type": "question", "text": "If you could master one skill instantly, what would it be and why? Drop your answer below! 👇 #Skills"}
-            ]
-        
-        return valid_tweets
-            
+        tweets = parse_tweets(response_text)
     except Exception as e:
         logger.error(f"Error generating tweets: {e}")
-        return [
-            {"type": "hook", "text": "The biggest lie we tell ourselves: 'I'll start tomorrow.' Tomorrow never comes. Start today, even if it's imperfect. #Motivation"},
-            {"type": "list", "text": "4 rules for better decisions:\n1. Sleep on big choices\n2. Ask 'What would I regret not trying?'\n3. Consider the 10-10-10 rule\n4. Trust your gut #DecisionMaking"},
-            {"type": "question", "text": "What's one small change you made that had a surprisingly big impact on your life? #LifeHacks"}
-        ]
\ No newline at end of file
+        return [dict(tweet) for tweet in ERROR_FALLBACK_TWEETS]
+    _cache_tweets(key, tweets, latency)
+    return tweets
+
+async def generate_tweets_async(batches, client=None, bypass_cache=False):
+    """Generate several tweet batches concurrently.
+
+    `batches` is a list of (trend_patterns, previous_performance) pairs; the
+    result holds one list of tweets per batch, in order. Cached prompts are
+    not sent; batches whose request ultimately fails get the fallback tweets.
+    """
+    client = client or AsyncGeminiClient()
+    prompts = [build_prompt(patterns, performance) for patterns, performance in batches]
+    keys = [cache_key(prompt, MODEL_NAME) for prompt in prompts]
+    results = [get_cached(key, bypass=bypass_cache) for key in keys]
+    # As in generate_tweets, a cached batch that already went out is a miss
+    results = [None if tweets and _already_posted(tweets) else tweets for tweets in results]
+    
+    async def timed(prompt):
+        start = time.perf_counter()
+        return await client.generate(prompt), time.perf_counter() - start
+
+    missing = [i for i, tweets in enumerate(results) if not tweets]
+    # Each prompt's own latency (retries included) is what a later cache hit saves
+    responses = await asyncio.gather(*(timed(prompts[i]) for i in missing), return_exceptions=True)
+    
+    for i, response in zip(missing, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Error generating tweets: {response}")
+            results[i] = [dict(tweet) for tweet in ERROR_FALLBACK_TWEETS]
+            continue
+        text, latency = response
+        results[i] = parse_tweets(text)
+        _cache_tweets(keys[i], results[i], latency)
+    logger.info(f"Generated {len(results)} tweet batches; Gemini latency {client.latency_percentiles()}")
+    return results
+
+def generate_tweet_batches(batches, client=None):
+    """Blocking wrapper around generate_tweets_async"""
+    return asyncio.run(generate_tweets_async(batches, client))
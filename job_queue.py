@@ -0,0 +1,342 @@
+import argparse
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+from store import get_connection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Set to a job queue server (python job_queue.py --serve) to share one queue across hosts
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL")
+JOB_QUEUE_PORT = int(os.getenv("JOB_QUEUE_PORT", "8470"))
+# The server only listens locally unless told otherwise; other addresses also need JOB_QUEUE_TOKEN
+JOB_QUEUE_HOST = os.getenv("JOB_QUEUE_HOST", "127.0.0.1")
+MAX_ATTEMPTS = 3
+# A leased job that is neither completed nor extended within this window goes back to the queue
+VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "600"))
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 15 * 60
+# Finished jobs are kept this long so dedupe keys still reject replays
+RETENTION_SECONDS = 7 * 24 * 60 * 60
+REQUEST_TIMEOUT_SECONDS = 30
+
+# Serializes this process's writes; SQLite's own busy wait between connections sleeps in coarse steps
+_write_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"enqueued": 0, "duplicates": 0, "leased": 0, "completed": 0, "retried": 0,
+          "dead": 0, "lost_leases": 0}
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+def retry_delay(attempts):
+    """Seconds before a failed job is offered again: exponential with jitter"""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+class SQLiteJobQueue:
+    """Job queue in the bot's SQLite store, shared by every process on this host.
+
+    Leasing a job hides it for the visibility timeout; a worker that crashes
+    or stalls simply lets the lease run out and the job is offered again.
+    Jobs that keep failing are retried with backoff, then marked dead.
+    """
+
+    def enqueue(self, kind, payload, delay=0, max_attempts=MAX_ATTEMPTS, dedupe_key=None):
+        """Add a job and return its ID; a known dedupe_key returns the existing job's ID"""
+        now = time.time()
+        conn = get_connection()
+        with _write_lock, conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, payload, dedupe_key, status, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (kind, json.dumps(payload, default=str), dedupe_key, max_attempts, now + delay, now)
+            )
+        if cursor.rowcount:
+            _count("enqueued")
+            return cursor.lastrowid
+        _count("duplicates")
+        return conn.execute("SELECT job_id FROM jobs WHERE dedupe_key = ?", (dedupe_key,)).fetchone()["job_id"]
+
+    def lease(self, kinds=None, worker=None, visibility_timeout=VISIBILITY_TIMEOUT_SECONDS):
+        """Claim the oldest available job, or return None.
+
+        A leased job's available_at is its lease expiry, so queued jobs and
+        expired leases are found by the same index range.
+        """
+        conn = get_connection()
+        kind_filter = f" AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        while True:
+            now = time.time()
+            token = uuid.uuid4().hex
+            with _write_lock, conn:
+                row = conn.execute(
+                    "UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_token = ?, leased_by = ?, "
+                    "available_at = ? WHERE job_id = (SELECT job_id FROM jobs "
+                    "WHERE status IN ('queued', 'leased') AND available_at <= ?" + kind_filter +
+                    " ORDER BY available_at, job_id LIMIT 1) "
+                    "RETURNING job_id, kind, payload, attempts, max_attempts",
+                    [token, worker, now + visibility_timeout, now] + list(kinds or [])
+                ).fetchone()
+            if row is None:
+                return None
+            if row["attempts"] > row["max_attempts"]:
+                # Its last lease ran out without the worker reporting back
+                self._finish(row["job_id"], token, "dead", error="lease expired on the final attempt")
+                _count("dead")
+                logger.error(f"Job {row['job_id']} ({row['kind']}) is dead: lease expired on the final attempt")
+                continue
+            _count("leased")
+            return {"job_id": row["job_id"], "kind": row["kind"], "payload": json.loads(row["payload"]),
+                    "attempts": row["attempts"], "max_attempts": row["max_attempts"], "lease_token": token}
+
+    def _finish(self, job_id, lease_token, status, result=None, error=None):
+        conn = get_connection()
+        with _write_lock, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_token = NULL "
+                "WHERE job_id = ? AND lease_token = ?",
+                (status, json.dumps(result, default=str) if result is not None else None, error,
+                 time.time(), job_id, lease_token)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, lease_token, result=None):
+        """Mark a leased job done; False if the lease was lost to another worker"""
+        if self._finish(job_id, lease_token, "done", result=result):
+            _count("completed")
+            return True
+        _count("lost_leases")
+        logger.warning(f"Job {job_id} completed after its lease was lost")
+        return False
+
+    def fail(self, job_id, lease_token, error, delay=None):
+        """Give a leased job back for a retry after a backoff, or mark it dead after its last attempt"""
+        conn = get_connection()
+        with _write_lock, conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE job_id = ? AND lease_token = ?",
+                (job_id, lease_token)
+            ).fetchone()
+            if row is None:
+                _count("lost_leases")
+                return False
+            if row["attempts"] < row["max_attempts"]:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, available_at = ?, lease_token = NULL "
+                    "WHERE job_id = ? AND lease_token = ?",
+                    (str(error), time.time() + (delay if delay is not None else retry_delay(row["attempts"])),
+                     job_id, lease_token)
+                )
+                _count("retried")
+                return True
+        self._finish(job_id, lease_token, "dead", error=str(error))
+        _count("dead")
+        logger.error(f"Job {job_id} is dead after {row['attempts']} attempts: {error}")
+        return True
+
+    def extend(self, job_id, lease_token, seconds=VISIBILITY_TIMEOUT_SECONDS):
+        """Push a lease's expiry out while the job is still being worked on"""
+        conn = get_connection()
+        with _write_lock, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET available_at = ? WHERE job_id = ? AND lease_token = ? AND status = 'leased'",
+                (time.time() + seconds, job_id, lease_token)
+            )
+        return cursor.rowcount == 1
+
+    def purge(self, max_age_seconds=RETENTION_SECONDS):
+        """Delete done and dead jobs that finished long ago; returns how many were removed"""
+        conn = get_connection()
+        with _write_lock, conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'dead') AND finished_at < ?",
+                (time.time() - max_age_seconds,)
+            )
+        return cursor.rowcount
+
+    def stats(self):
+        """{status: count} over the jobs table"""
+        rows = get_connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+class HTTPJobQueue:
+    """The same interface against a job queue server, for workers spread over several hosts"""
+
+    def __init__(self, base_url, token=None):
+        self.base_url = base_url.rstrip("/")
+        self.token = token or config.JOB_QUEUE_TOKEN
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _call(self, method, path, body=None):
+        with self._lock:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+                # Resolve proxy settings once; re-reading the environment costs more than the call itself
+                self._session.proxies = requests.utils.get_environ_proxies(self.base_url)
+                self._session.trust_env = False
+                if self.token:
+                    self._session.headers["Authorization"] = f"Bearer {self.token}"
+        response = self._session.request(method, self.base_url + path, json=body, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+    def enqueue(self, kind, payload, delay=0, max_attempts=MAX_ATTEMPTS, dedupe_key=None):
+        return self._call("POST", "/jobs", {"kind": kind, "payload": payload, "delay": delay,
+                                            "max_attempts": max_attempts, "dedupe_key": dedupe_key})["job_id"]
+
+    def lease(self, kinds=None, worker=None, visibility_timeout=VISIBILITY_TIMEOUT_SECONDS):
+        return self._call("POST", "/lease", {"kinds": kinds, "worker": worker,
+                                             "visibility_timeout": visibility_timeout})
+
+    def complete(self, job_id, lease_token, result=None):
+        return self._call("POST", f"/jobs/{job_id}/complete", {"lease_token": lease_token, "result": result})["ok"]
+
+    def fail(self, job_id, lease_token, error, delay=None):
+        return self._call("POST", f"/jobs/{job_id}/fail",
+                          {"lease_token": lease_token, "error": str(error), "delay": delay})["ok"]
+
+    def extend(self, job_id, lease_token, seconds=VISIBILITY_TIMEOUT_SECONDS):
+        return self._call("POST", f"/jobs/{job_id}/extend", {"lease_token": lease_token, "seconds": seconds})["ok"]
+
+    def purge(self, max_age_seconds=RETENTION_SECONDS):
+        return self._call("POST", "/purge", {"max_age_seconds": max_age_seconds})["removed"]
+
+    def stats(self):
+        return self._call("GET", "/stats")
+
+class _JobQueueHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per call
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+            self._reply(401, {"error": "unauthorized"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/stats":
+            try:
+                self._reply(200, self.server.queue.stats())
+            except Exception as e:
+                logger.error(f"Job queue request {self.path} failed: {e}")
+                self._reply(500, {"error": str(e)})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        queue = self.server.queue
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self._authorized():
+            return
+        parts = self.path.strip("/").split("/")
+        try:
+            body = json.loads(body or b"{}")
+            if parts == ["jobs"]:
+                self._reply(200, {"job_id": queue.enqueue(body["kind"], body["payload"], body.get("delay", 0),
+                                                          body.get("max_attempts", MAX_ATTEMPTS),
+                                                          body.get("dedupe_key"))})
+            elif parts == ["lease"]:
+                job = queue.lease(body.get("kinds"), body.get("worker"),
+                                  body.get("visibility_timeout", VISIBILITY_TIMEOUT_SECONDS))
+                if job:
+                    self._reply(200, job)
+                else:
+                    self._reply(204)
+            elif parts == ["purge"]:
+                self._reply(200, {"removed": queue.purge(body.get("max_age_seconds", RETENTION_SECONDS))})
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "complete":
+                self._reply(200, {"ok": queue.complete(int(parts[1]), body["lease_token"], body.get("result"))})
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "fail":
+                self._reply(200, {"ok": queue.fail(int(parts[1]), body["lease_token"], body["error"],
+                                                   body.get("delay"))})
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "extend":
+                self._reply(200, {"ok": queue.extend(int(parts[1]), body["lease_token"],
+                                                     body.get("seconds", VISIBILITY_TIMEOUT_SECONDS))})
+            else:
+                self._reply(404, {"error": "not found"})
+        except (KeyError, ValueError) as e:
+            self._reply(400, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Job queue request {self.path} failed: {e}")
+            self._reply(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+def _is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+class JobQueueServer(ThreadingHTTPServer):
+    """Serves a SQLite job queue over HTTP so workers on other hosts can share it
+
+    Requests must carry the shared token as a bearer token when one is set;
+    binding to anything but a loopback address requires one.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, queue=None, token=None):
+        self.token = token or config.JOB_QUEUE_TOKEN
+        if not self.token and not _is_loopback(address[0]):
+            raise ValueError(f"Serving the job queue on {address[0]} needs JOB_QUEUE_TOKEN set for server and workers")
+        super().__init__(address, _JobQueueHandler)
+        self.queue = queue or SQLiteJobQueue()
+
+def start_job_queue_server(port=JOB_QUEUE_PORT, host=JOB_QUEUE_HOST, queue=None, token=None):
+    """Serve the job queue from a daemon thread and return the server"""
+    server = JobQueueServer((host, port), queue, token)
+    threading.Thread(target=server.serve_forever, daemon=True, name="job-queue-server").start()
+    logger.info(f"Serving job queue on http://{host}:{server.server_port}")
+    return server
+
+def get_queue():
+    """The configured job queue: the server at JOB_QUEUE_URL, else the local SQLite store"""
+    return HTTPJobQueue(JOB_QUEUE_URL) if JOB_QUEUE_URL else SQLiteJobQueue()
+
+def get_queue_stats():
+    """Queue operations made by this process so far"""
+    with _stats_lock:
+        return dict(_stats)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or serve the job queue")
+    parser.add_argument("--serve", action="store_true", help="serve the local queue to workers on other hosts")
+    parser.add_argument("--port", type=int, default=JOB_QUEUE_PORT)
+    parser.add_argument("--host", default=JOB_QUEUE_HOST,
+                        help="address to listen on; non-loopback addresses need JOB_QUEUE_TOKEN")
+    args = parser.parse_args()
+    if args.serve:
+        server = JobQueueServer((args.host, args.port))
+        logger.info(f"Serving job queue on http://{args.host}:{args.port}")
+        server.serve_forever()
+    else:
+        print(json.dumps(get_queue().stats(), indent=2))
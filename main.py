@@ -1,95 +1,188 @@
-from trend_discovery import get_trending_tweet_patterns, get_hashtag_trends
+from trend_provider import get_trends, get_cache_stats
 from generate_tweets import generate_tweets
 from post_tweet import post_multiple_tweets
-from track_metrics import track_multiple_tweets
-from optimize_strategy import optimize_strategy
+from metrics_poller import latest_snapshots
+from optimize_strategy import optimize_strategy, build_previous_performance
+from store import finish_run, get_top_hashtags
+from checkpoints import RunCheckpoints, STAGES, idempotency_key, get_checkpoint_stats
+from strategy_aggregates import load_aggregates
+from response_cache import get_cache_stats as get_response_cache_stats
+from tweet_text import append_hashtag
+from accounts import DEFAULT_ACCOUNT
+import config
+from utils.rate_budget import get_budget_stats
+from utils.telemetry import span, get_span_summary, write_metrics_file
 import logging
 import json
-import time
 from datetime import datetime
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def main():
-    """Main bot execution function"""
-    logger.info("Starting Twitter Bot execution...")
-    
-    try:
-        # 1. Discover current trends
-        logger.info("Step 1: Discovering trends...")
-        patterns = get_trending_tweet_patterns()
-        hashtags = get_hashtag_trends()
-        
-        # 2. Generate tweets based on trends
-        logger.info("Step 2: Generating tweets...")
-        tweets = generate_tweets(patterns)
-        
+# How much stored history the hashtag ranking looks at
+HISTORY_DAYS = 30
+
+def discover_stage(run, account=None, trends=None):
+    """Step 1: discover current trends"""
+    logger.info("Step 1: Discovering trends...")
+    if run.done("discover"):
+        trends = run.get("discover")
+    else:
+        trends = trends or get_trends()
+        trends = {"patterns": trends['patterns'], "hashtags": trends['hashtags']}
+        run.save("discover", trends)
+    logger.info(f"Trend cache stats: {get_cache_stats()}")
+    return trends
+
+def generate_stage(run, account=None, trends=None):
+    """Step 2: generate tweets based on the discovered trends"""
+    logger.info("Step 2: Generating tweets...")
+    if run.done("generate"):
+        tweets = run.get("generate")
+    else:
+        patterns = run.get("discover")['patterns']
+        hashtags = run.get("discover")['hashtags']
+        history_insights, _ = optimize_strategy(aggregates=load_aggregates(account))
+        previous_performance = build_previous_performance(
+            history_insights, get_top_hashtags(days=HISTORY_DAYS, account=account)
+        )
+        tweets = generate_tweets(patterns, previous_performance=previous_performance, account=account)
+        logger.info(f"Gemini response cache stats: {get_response_cache_stats()}")
+
         if not tweets:
             logger.error("No tweets generated. Exiting.")
-            return
-        
+            return None
+
         # Add trending hashtags to tweets
-        for tweet in tweets:
-            if len(tweet['text']) < 250:  # Only add hashtags if there's room
-                tweet['text'] += f" {hashtags[0]}"
-        
-        logger.info(f"Generated {len(tweets)} tweets")
-        for i, tweet in enumerate(tweets, 1):
-            logger.info(f"Tweet {i} ({tweet['type']}): {tweet['text'][:100]}...")
-        
-        # 3. Post tweets with delays
-        logger.info("Step 3: Posting tweets...")
-        posted_tweets = post_multiple_tweets(tweets, delay_minutes=30)
-        
-        if not posted_tweets:
-            logger.error("No tweets were posted successfully. Exiting.")
-            return
-        
-        logger.info(f"Successfully posted {len(posted_tweets)} tweets")
-        
-        # 4. Wait and track metrics
-        logger.info("Step 4: Waiting for engagement and tracking metrics...")
-        time.sleep(300)  # Wait 5 minutes for initial engagement
-        
-        tweet_ids = [tweet['id'] for tweet in posted_tweets]
-        metrics = track_multiple_tweets(tweet_ids)
-        
-        # Combine posted tweet data with metrics
-        for i, tweet in enumerate(posted_tweets):
-            if i < len(metrics):
-                tweet.update(metrics[i])
-        
-        # 5. Optimize strategy for next run
-        logger.info("Step 5: Optimizing strategy...")
-        insights, hypothesis = optimize_strategy(posted_tweets)
-        
-        # 6. Save results for future analysis
-        results = {
-            'timestamp': datetime.now().isoformat(),
-            'trends_used': patterns,
-            'hashtags_used': hashtags,
-            'tweets_posted': posted_tweets,
-            'insights': insights,
-            'hypothesis': hypothesis
-        }
-        
-        # Log summary
-        logger.info("=" * 50)
-        logger.info("EXECUTION SUMMARY")
-        logger.info("=" * 50)
-        logger.info(f"Tweets posted: {len(posted_tweets)}")
-        if insights:
-            logger.info(f"Best tweet got {insights['best_tweet'].get('likes', 0)} likes")
-            logger.info(f"Average engagement rate: {insights['avg_engagement_rate']}%")
-            logger.info(f"Best performing type: {insights['best_performing_type']}")
-        logger.info("=" * 50)
-        
-        return results
+        for position, tweet in enumerate(tweets):
+            # Only added if the tweet still fits Twitter's weighted limit
+            tweet['text'] = append_hashtag(tweet['text'], hashtags[0]) if hashtags else tweet['text']
+            tweet['idempotency_key'] = idempotency_key(run.run_id, position, tweet['text'])
+        run.save("generate", tweets)
+
+    logger.info(f"Generated {len(tweets)} tweets")
+    for i, tweet in enumerate(tweets, 1):
+        logger.info(f"Tweet {i} ({tweet['type']}): {tweet['text'][:100]}...")
+    return tweets
+
+def post_stage(run, account=None, trends=None):
+    """Step 3: queue tweets; the ones already due are posted right away"""
+    # Idempotency keys make a resumed run pick up its queued and posted tweets instead of reposting.
+    logger.info("Step 3: Posting tweets...")
+    if run.done("post"):
+        outcome = run.get("post")
+    else:
+        posted_tweets, queued_ids = post_multiple_tweets(run.get("generate"), delay_minutes=30, account=account,
+                                                         run_id=run.run_id)
+
+        # Tweets waiting out the cooldown in the publish queue count as success
+        if not posted_tweets and not queued_ids:
+            logger.error("No tweets were posted or queued. Exiting.")
+            return None
+        outcome = {"posted": posted_tweets, "queued": queued_ids}
+        run.save("post", outcome)
+
+    logger.info(f"Successfully posted {len(outcome['posted'])} tweets, {len(outcome['queued'])} queued for later")
+    logger.info(f"Rate budget: {get_budget_stats()}")
+    return outcome
+
+def metrics_stage(run, account=None, trends=None):
+    """Step 4: metrics are sampled later by the metrics poller; use what is already known"""
+    logger.info("Step 4: Collecting available metrics...")
+    if run.done("metrics"):
+        return run.get("metrics")
+    posted_tweets = run.get("post")["posted"]
+    snapshots = latest_snapshots(tweet['id'] for tweet in posted_tweets)
+    for tweet in posted_tweets:
+        tweet.update(snapshots.get(str(tweet['id']), {}))
+    run.save("metrics", posted_tweets)
+    return posted_tweets
+
+def optimize_stage(run, account=None, trends=None):
+    """Step 5: optimize strategy for next run from the running aggregates"""
+    logger.info("Step 5: Optimizing strategy...")
+    if run.done("optimize"):
+        return run.get("optimize")
+    insights, hypothesis = optimize_strategy(aggregates=load_aggregates(account))
+    run.save("optimize", [insights, hypothesis])
+    return [insights, hypothesis]
+
+STAGE_FUNCTIONS = {
+    "discover": discover_stage,
+    "generate": generate_stage,
+    "post": post_stage,
+    "metrics": metrics_stage,
+    "optimize": optimize_stage
+}
+
+def run_stage(run, stage, account=None, trends=None):
+    """Run one checkpointed stage of a run; returns its output, or None if the run should stop"""
+    with span("stage", stage=stage):
+        return STAGE_FUNCTIONS[stage](run, account=account, trends=trends)
+
+def finish(run, account=None):
+    """Step 6: save results for future analysis; a finished run is never resumed"""
+    trends = run.get("discover")
+    posted_tweets = run.get("metrics")
+    insights, hypothesis = run.get("optimize")
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'account': account,
+        'trends_used': trends['patterns'],
+        'hashtags_used': trends['hashtags'],
+        'tweets_posted': posted_tweets,
+        'tweets_queued': run.get("post")["queued"],
+        'insights': insights,
+        'hypothesis': hypothesis
+    }
+    finish_run(run.run_id, results)
+    logger.info(f"Checkpoint stats: {get_checkpoint_stats()}")
+
+    # Log summary
+    logger.info("=" * 50)
+    logger.info("EXECUTION SUMMARY")
+    logger.info("=" * 50)
+    logger.info(f"Tweets posted: {len(posted_tweets)}, queued: {len(results['tweets_queued'])}")
+    if insights:
+        logger.info(f"Best tweet got {insights['best_tweet'].get('likes', 0)} likes")
+        logger.info(f"Average engagement rate: {insights['avg_engagement_rate']}%")
+        logger.info(f"Best performing type: {insights['best_performing_type']}")
+    logger.info(f"Timings: {get_span_summary()}")
+    logger.info("=" * 50)
+
+    return results
+
+def main(account=None, trends=None, resume=True, raise_errors=False):
+    """Main bot execution function
+
+    `account` names a profile from accounts.json (None or DEFAULT_ACCOUNT for
+    the .env account); `trends` lets a multi-account run share one discovery
+    result. Each stage is checkpointed, so after a crash the next call resumes
+    the unfinished run (unless `resume` is False) instead of regenerating and
+    reposting. The stages can also run as separate jobs on any number of
+    workers (see workers.py). Failures return None, or raise with
+    `raise_errors`.
+    """
+    # One name for the .env account, so its runs are found again on resume
+    account = account or DEFAULT_ACCOUNT
+    logger.info(f"Starting Twitter Bot execution for {account} account...")
+    
+    try:
+        run = RunCheckpoints.start(account, resume=resume)
+        for stage in STAGES:
+            if run_stage(run, stage, account=account, trends=trends) is None:
+                if raise_errors:
+                    raise RuntimeError(f"run {run.run_id} stopped at the {stage} stage")
+                return
+        return finish(run, account)
         
     except Exception as e:
         logger.error(f"Error in main execution: {e}")
+        if raise_errors:
+            raise
         return None
+    finally:
+        write_metrics_file()
 
 def run_scheduled():
     """Function for scheduled runs"""
@@ -101,4 +194,6 @@ def run_scheduled():
         logger.error("Scheduled run failed")
 
 if __name__ == "__main__":
+    # Fail fast on missing credentials; importing the module never checks them
+    config.validate()
     main()
\ No newline at end of file
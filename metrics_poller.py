@@ -0,0 +1,145 @@
+import json
+import logging
+import math
+import threading
+import time
+from track_metrics import fetch_metrics_batch, MAX_IDS_PER_LOOKUP
+from utils.rate_budget import budget, LOOKUP_ENDPOINT
+from accounts import get_credentials
+from store import get_connection, save_snapshots, get_latest_snapshots
+from strategy_aggregates import record_snapshots, TRACK_SECONDS
+import posting_times
+import engagement_model
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Minutes after posting at which each tweet's metrics are sampled
+POLL_OFFSETS_MINUTES = [5, 60, 6 * 60, 24 * 60]
+# A claimed poll whose poller never reported back is offered again after this long
+CLAIM_TIMEOUT_SECONDS = 10 * 60
+
+# Serializes this process's writes; the store's write lock covers other processes
+_poller_lock = threading.Lock()
+
+def register_tweets(posted_tweets, offsets_minutes=POLL_OFFSETS_MINUTES):
+    """Schedule metrics polls for freshly posted tweets"""
+    rows = []
+    for tweet in posted_tweets:
+        posted_at = tweet.get("posted_at") or time.time()
+        poll_at = [posted_at + offset * 60 for offset in offsets_minutes]
+        rows.append((str(tweet["id"]), tweet.get("account"), tweet.get("type", "unknown"), tweet.get("text", ""),
+                     posted_at, json.dumps(poll_at), poll_at[0]))
+    conn = get_connection()
+    with _poller_lock, conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO metric_polls (tweet_id, account, type, text, posted_at, poll_at, next_poll_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+    logger.info(f"Registered {len(posted_tweets)} tweets for metrics polling")
+
+def next_poll_time():
+    """Timestamp of the next poll this process could claim, or None when nothing is registered
+
+    A poll claimed by another poller only comes back once its claim times out.
+    """
+    row = get_connection().execute(
+        "SELECT MIN(CASE WHEN claimed_at IS NULL THEN next_poll_at "
+        "ELSE MAX(next_poll_at, claimed_at + ?) END) AS due FROM metric_polls", (CLAIM_TIMEOUT_SECONDS,)
+    ).fetchone()
+    return row["due"]
+
+def _claim_due(now):
+    """Claim every due poll in one UPDATE, so concurrent pollers never look up the same tweet"""
+    conn = get_connection()
+    with _poller_lock, conn:
+        rows = conn.execute(
+            "UPDATE metric_polls SET claimed_at = ? WHERE next_poll_at <= ? "
+            "AND (claimed_at IS NULL OR claimed_at < ?) RETURNING *",
+            (now, now, now - CLAIM_TIMEOUT_SECONDS)
+        ).fetchall()
+    return {row["tweet_id"]: dict(row, poll_at=json.loads(row["poll_at"])) for row in rows}
+
+def _reschedule(due, deferred, now):
+    """Drop the polls just taken (or deferred) and release the claims; tweets with none left are removed"""
+    updates, finished = [], []
+    for tweet_id, entry in due.items():
+        # Skip every poll that is already due so a backlog costs one lookup
+        poll_at = [p for p in entry["poll_at"] if p > now]
+        if tweet_id in deferred:
+            poll_at = [deferred[tweet_id]] + [p for p in poll_at if p > deferred[tweet_id]]
+        if poll_at:
+            updates.append((json.dumps(poll_at), poll_at[0], tweet_id))
+        else:
+            finished.append((tweet_id,))
+    conn = get_connection()
+    with _poller_lock, conn:
+        conn.executemany(
+            "UPDATE metric_polls SET poll_at = ?, next_poll_at = ?, claimed_at = NULL WHERE tweet_id = ?", updates
+        )
+        conn.executemany("DELETE FROM metric_polls WHERE tweet_id = ?", finished)
+
+def _release(due):
+    conn = get_connection()
+    with _poller_lock, conn:
+        conn.executemany("UPDATE metric_polls SET claimed_at = NULL WHERE tweet_id = ?", [(t,) for t in due])
+
+def poll_due(now=None):
+    """Take a metrics snapshot of every tweet with a poll due, in batched lookups"""
+    now = now or time.time()
+    due = _claim_due(now)
+    if not due:
+        return []
+    try:
+        snapshots, deferred = _take_snapshots(due, now)
+    except Exception:
+        _release(due)
+        raise
+    _reschedule(due, deferred, now)
+    logger.info(f"Polled metrics for {len(due) - len(deferred)} tweets ({len(snapshots)} snapshots stored)")
+    return snapshots
+
+def _take_snapshots(due, now):
+    metrics = {}
+    deferred = {}
+    # Past TRACK_SECONDS the aggregates have forgotten a tweet and would count it again
+    expired = [tweet_id for tweet_id, entry in due.items() if now - entry["posted_at"] >= TRACK_SECONDS]
+    if expired:
+        logger.warning(f"Dropping overdue metric polls for {len(expired)} tweets posted over "
+                       f"{TRACK_SECONDS // 3600} h ago")
+        due = {tweet_id: entry for tweet_id, entry in due.items() if tweet_id not in expired}
+    accounts = {entry["account"] for entry in due.values()}
+    for account in accounts:
+        account_ids = [tweet_id for tweet_id, entry in due.items() if entry["account"] == account]
+        lookups = math.ceil(len(account_ids) / MAX_IDS_PER_LOOKUP)
+        wait = budget.time_until(account, LOOKUP_ENDPOINT, count=lookups)
+        if wait > 0:
+            # Out of lookup budget: poll these once the window resets instead of stalling
+            logger.info(f"Deferring {len(account_ids)} metric polls for {account} by {wait:.0f}s (rate budget)")
+            deferred.update({tweet_id: now + wait for tweet_id in account_ids})
+            continue
+        metrics.update(fetch_metrics_batch(account_ids, credentials=get_credentials(account), account=account))
+    snapshots = []
+    for tweet_id, entry in due.items():
+        if not metrics.get(tweet_id):
+            continue
+        snapshot = dict(metrics[tweet_id])
+        snapshot.update({
+            "type": entry["type"],
+            "text": entry["text"],
+            "account": entry["account"],
+            "posted_at": entry["posted_at"],
+            "polled_at": now,
+            "age_minutes": round((now - entry["posted_at"]) / 60, 1)
+        })
+        snapshots.append(snapshot)
+    if snapshots:
+        save_snapshots(snapshots)
+        record_snapshots(snapshots)
+        posting_times.record_snapshots(snapshots)
+        engagement_model.record_snapshots(snapshots)
+    return snapshots, deferred
+
+def latest_snapshots(tweet_ids):
+    """Return the most recent stored snapshot per tweet ID"""
+    return get_latest_snapshots(list(tweet_ids))
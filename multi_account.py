@@ -0,0 +1,54 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from accounts import load_accounts, register_accounts
+import config
+from trend_provider import get_trends
+import main as pipeline
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Accounts processed at once; Gemini/Twitter calls are further capped in utils.limits
+MAX_ACCOUNT_WORKERS = 4
+
+def run_account(account, trends):
+    """Run the pipeline for one account, never letting its failure escape"""
+    name = account["name"]
+    # Inline credentials must resolve by name wherever the pipeline looks the account up
+    register_accounts([account])
+    start = time.perf_counter()
+    try:
+        results = pipeline.main(account=name, trends=trends, raise_errors=True)
+        error = None
+    except Exception as e:
+        results, error = None, f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    if error:
+        logger.error(f"Account {name} failed after {elapsed:.1f}s: {error}")
+    else:
+        logger.info(f"Account {name} finished in {elapsed:.1f}s")
+    return {"account": name, "results": results, "error": error, "seconds": round(elapsed, 3)}
+
+def run_all_accounts(accounts=None, max_workers=MAX_ACCOUNT_WORKERS):
+    """Discover trends once, then run every account's pipeline on a bounded worker pool"""
+    accounts = accounts if accounts is not None else load_accounts()
+    start = time.perf_counter()
+    trends = get_trends()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="account") as executor:
+        futures = [executor.submit(run_account, account, trends) for account in accounts]
+        outcomes = [future.result() for future in futures]
+
+    failed = [outcome["account"] for outcome in outcomes if outcome["error"]]
+    logger.info(
+        f"Ran {len(outcomes)} accounts in {time.perf_counter() - start:.1f}s "
+        f"({len(outcomes) - len(failed)} succeeded, {len(failed)} failed)"
+    )
+    for outcome in outcomes:
+        logger.info(f"  {outcome['account']}: {outcome['seconds']}s{' FAILED' if outcome['error'] else ''}")
+    return outcomes
+
+if __name__ == "__main__":
+    config.validate()
+    run_all_accounts()
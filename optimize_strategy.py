@@ -1,40 +1,26 @@
 import logging
-from collections import Counter
+from strategy_aggregates import StrategyAggregates
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def optimize_strategy(tweet_feedback):
-    """Analyze tweet performance and generate optimization insights"""
-    if not tweet_feedback:
-        return None, "No data available for optimization"
-    
-    # Find best performing tweet
-    best_tweet = max(tweet_feedback, key=lambda x: x.get('likes', 0) + x.get('retweets', 0) * 2)
-    
-    # Analyze patterns
-    avg_likes = sum(t.get('likes', 0) for t in tweet_feedback) / len(tweet_feedback)
-    avg_engagement_rate = sum(t.get('engagement_rate', 0) for t in tweet_feedback) / len(tweet_feedback)
-    
-    # Identify successful tweet types
-    type_performance = {}
-    for tweet in tweet_feedback:
-        tweet_type = tweet.get('type', 'unknown')
-        if tweet_type not in type_performance:
-            type_performance[tweet_type] = []
-        type_performance[tweet_type].append(tweet.get('likes', 0))
+def optimize_strategy(tweet_feedback=None, aggregates=None):
+    """Analyze tweet performance and generate optimization insights
+
+    Reads running aggregates when given, otherwise aggregates the tweet list.
+    """
+    if aggregates is None:
+        if not tweet_feedback:
+            return None, "No data available for optimization"
+        aggregates = StrategyAggregates.from_tweets(tweet_feedback)
     
-    best_type = max(type_performance.keys(), 
-                   key=lambda t: sum(type_performance[t]) / len(type_performance[t]))
+    insights = aggregates.insights()
+    if not insights:
+        return None, "No data available for optimization"
     
-    # Generate insights
-    insights = {
-        'best_tweet': best_tweet,
-        'avg_likes': round(avg_likes, 2),
-        'avg_engagement_rate': round(avg_engagement_rate, 2),
-        'best_performing_type': best_type,
-        'total_tweets_analyzed': len(tweet_feedback)
-    }
+    best_tweet = insights['best_tweet']
+    best_type = insights['best_performing_type']
+    avg_engagement_rate = insights['avg_engagement_rate']
     
     # Create hypothesis for next batch
     hypothesis = f"""
@@ -55,4 +41,14 @@ def get_content_recommendations(best_tweet, best_type):
         'question': 'Engaging questions that encourage replies',
         'unknown': 'Authentic, conversational content'
     }
-    return recommendations.get(best_type, 'Engaging, authentic content')
\ No newline at end of file
+    return recommendations.get(best_type, 'Engaging, authentic content')
+
+def build_previous_performance(insights, top_hashtags=None):
+    """Turn optimizer insights into the previous_performance dict generate_tweets expects"""
+    if not insights:
+        return None
+    return {
+        'best_style': insights['best_performing_type'],
+        'avg_engagement': insights['avg_likes'],
+        'top_keywords': [row['hashtag'] for row in top_hashtags or []]
+    }
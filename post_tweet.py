@@ -1,54 +1,68 @@
-from utils.twitter_client import get_bearer_client
+from utils.limits import twitter_slots
+from utils.rate_budget import RateBudgetExceeded
+from accounts import get_credentials, DEFAULT_ACCOUNT
 import logging
 import time
 from config import TWEET_COOLDOWN_MINUTES
+from publish_queue import enqueue_tweets, dispatch_due, get_items, posted_tweet, CLAIM_TIMEOUT_SECONDS
+from engagement_model import rank_tweets
+from tweet_text import weighted_length, truncate, MAX_TWEET_LENGTH
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def post_tweet(text, media_ids=None):
+def post_tweet(text, media_ids=None, account=None):
     """Post a tweet using Twitter API v2"""
-    client = get_bearer_client()
+    # tweepy is only imported once something is actually posted
+    from utils.twitter_client import get_bearer_client
+    client = get_bearer_client(get_credentials(account), account)
     if not client:
         logger.error("Failed to get Twitter client")
         return None
     
     try:
-        # Ensure tweet is within character limit
-        if len(text) > 280:
-            text = text[:277] + "..."
+        # Ensure tweet is within the weighted character limit
+        if weighted_length(text) > MAX_TWEET_LENGTH:
+            text = truncate(text)
             logger.warning("Tweet truncated to fit character limit")
         
         # Use Twitter API v2 to create tweet
-        response = client.create_tweet(text=text, media_ids=media_ids)
+        with twitter_slots:
+            response = client.create_tweet(text=text, media_ids=media_ids)
         logger.info(f"Tweet posted successfully: {text[:50]}...")
         return response.data['id']
         
+    except RateBudgetExceeded:
+        # The publish queue holds the tweet until the budget allows it
+        raise
     except Exception as e:
+        # None leaves the tweet in the publish queue for a retry, then marks it failed
         logger.error(f"Error posting tweet: {e}")
-        # For testing purposes, simulate successful posting
-        logger.info("SIMULATION MODE: Tweet would have been posted")
-        return f"sim_{int(time.time())}"
+        return None
 
-def post_multiple_tweets(tweets, delay_minutes=TWEET_COOLDOWN_MINUTES):
-    """Post multiple tweets with delays between them"""
-    posted_tweets = []
-    
-    for i, tweet_data in enumerate(tweets):
-        tweet_text = tweet_data.get('text', tweet_data) if isinstance(tweet_data, dict) else tweet_data
-        tweet_id = post_tweet(tweet_text)
-        
-        if tweet_id:
-            posted_tweets.append({
-                'id': tweet_id,
-                'text': tweet_text,
-                'type': tweet_data.get('type', 'unknown') if isinstance(tweet_data, dict) else 'unknown',
-                'posted_at': time.time()
-            })
-            
-            # Wait between tweets (except for the last one)
-            if i < len(tweets) - 1:
-                logger.info(f"Waiting {delay_minutes} minutes before next tweet...")
-                time.sleep(delay_minutes * 60)
-    
-    return posted_tweets
+def post_multiple_tweets(tweets, delay_minutes=TWEET_COOLDOWN_MINUTES, account=None, run_id=None):
+    """Queue tweets spaced by the cooldown and post the ones already due.
+
+    Returns (posted tweets, queue IDs still waiting). Posted tweets include
+    any posted earlier under the same idempotency keys; the waiting ones are
+    posted later by publish_queue.dispatch_due instead of blocking here. The
+    tweet with the highest predicted engagement takes the earliest slot.
+    """
+    started = time.time()
+    account = account or DEFAULT_ACCOUNT
+    tweets = rank_tweets(tweets, account=account)
+    queued = enqueue_tweets(tweets, account=account, cooldown_minutes=delay_minutes, run_id=run_id)
+    queue_ids = {item["queue_id"] for item in queued}
+    posted_tweets = [posted_tweet(item) for item in queued if item["status"] == "posted"]
+    # Only this account's queue, and only this batch's posts count as this call's
+    posted_tweets += [tweet for tweet in dispatch_due(account=account) if tweet["queue_id"] in queue_ids]
+    current = get_items(queue_ids)
+    waiting = [item["queue_id"] for item in current if item["status"] in ("pending", "posting")]
+    # Claimed before this call: on a resumed run, by the attempt that stopped mid-post
+    in_flight = [item for item in current if item["status"] == "posting" and item["claimed_at"] < started]
+    if in_flight:
+        logger.warning(f"{len(in_flight)} tweets were claimed for posting but never confirmed; "
+                       f"they are retried {CLAIM_TIMEOUT_SECONDS // 60} min after their claim")
+    if waiting:
+        logger.info(f"{len(waiting)} tweets queued for later posting")
+    return posted_tweets, waiting
@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from config import MAX_TWEETS_PER_DAY, TWEET_COOLDOWN_MINUTES
+from accounts import DEFAULT_ACCOUNT
+from store import get_recent_tweets, load_state, save_state, write_transaction
+from strategy_aggregates import DECAY_HALF_LIFE_SECONDS, TRACK_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "posting_times"
+HOURS_PER_WEEK = 7 * 24
+# Used until an account has engagement history, and as a tie-breaker afterwards
+DEFAULT_POSTING_HOURS = (9, 14, 19)
+DEFAULT_HOUR_BONUS = 0.05
+# Each posting run queues this many tweets, one cooldown apart
+TWEETS_PER_RUN = 3
+# Pseudo-observations pulling sparse hours toward the account's overall mean
+PRIOR_WEIGHT = 2.0
+# Neighbouring hours share some of their evidence
+SMOOTHING_KERNEL = (0.25, 0.5, 0.25)
+BOOTSTRAP_DAYS = 30
+
+_state_lock = threading.Lock()
+
+def hour_of_week(timestamp):
+    """0 for Monday 00:00-00:59 local time, up to 167 for Sunday 23:00"""
+    moment = datetime.fromtimestamp(timestamp)
+    return moment.weekday() * 24 + moment.hour
+
+def _engagement_score(tweet):
+    return tweet.get('likes', 0) + tweet.get('retweets', 0) * 2
+
+class PostingTimeIndex:
+    """Time-decayed engagement per account and hour of week (168 buckets).
+
+    Like StrategyAggregates, a new snapshot only adds the difference from
+    the tweet's previous snapshot, so updates are O(1) per snapshot.
+    """
+
+    def __init__(self, half_life_seconds=DECAY_HALF_LIFE_SECONDS):
+        self.half_life_seconds = half_life_seconds
+        self.accounts = {}
+        self.tweets = {}
+
+    def _account(self, account, now):
+        data = self.accounts.get(account)
+        if data is None:
+            data = {"engagement": np.zeros(HOURS_PER_WEEK), "weight": np.zeros(HOURS_PER_WEEK), "updated_at": now}
+            self.accounts[account] = data
+        elif now > data["updated_at"]:
+            # Every bucket decays at the same rate, so decay the whole account at once
+            factor = 0.5 ** ((now - data["updated_at"]) / self.half_life_seconds)
+            data["engagement"] *= factor
+            data["weight"] *= factor
+            data["updated_at"] = now
+        return data
+
+    def update(self, snapshot, now=None):
+        """Fold one tweet snapshot into its account's hour-of-week bucket"""
+        now = now or time.time()
+        posted_at = snapshot.get("posted_at")
+        if not posted_at:
+            return
+        tweet_id = str(snapshot.get("tweet_id") or snapshot.get("id"))
+        account = snapshot.get("account") or DEFAULT_ACCOUNT
+        data = self._account(account, now)
+        score = _engagement_score(snapshot)
+
+        entry = self.tweets.get(tweet_id)
+        how = hour_of_week(posted_at)
+        if entry is None:
+            entry = {"account": account, "hour": how, "posted_at": posted_at, "first_seen": now, "score": 0}
+            self.tweets[tweet_id] = entry
+            data["weight"][how] += 1
+        weight = 0.5 ** ((now - entry["first_seen"]) / self.half_life_seconds)
+        data["engagement"][how] += (score - entry["score"]) * weight
+        entry["score"] = score
+
+    def hour_scores(self, account):
+        """Expected engagement per hour of week, smoothed and shrunk toward the account mean"""
+        scores = np.zeros(HOURS_PER_WEEK)
+        defaults = [day * 24 + hour for day in range(7) for hour in DEFAULT_POSTING_HOURS]
+        data = self.accounts.get(account)
+        if data is not None and data["weight"].sum() > 0:
+            kernel = np.array(SMOOTHING_KERNEL)
+            engagement = sum(k * np.roll(data["engagement"], shift) for k, shift in zip(kernel, (1, 0, -1)))
+            weight = sum(k * np.roll(data["weight"], shift) for k, shift in zip(kernel, (1, 0, -1)))
+            prior = data["engagement"].sum() / data["weight"].sum()
+            scores = (engagement + PRIOR_WEIGHT * prior) / (weight + PRIOR_WEIGHT)
+        # Favour the usual slots when the data doesn't say otherwise
+        scores[defaults] += DEFAULT_HOUR_BONUS * max(scores.max(), 1.0)
+        return scores
+
+    def to_dict(self, now=None):
+        now = now or time.time()
+        self.tweets = {tweet_id: entry for tweet_id, entry in self.tweets.items()
+                       if now - (entry.get("posted_at") or entry["first_seen"]) < TRACK_SECONDS}
+        return {
+            "half_life_seconds": self.half_life_seconds,
+            "accounts": {account: {"engagement": data["engagement"].tolist(),
+                                   "weight": data["weight"].tolist(),
+                                   "updated_at": data["updated_at"]}
+                         for account, data in self.accounts.items()},
+            "tweets": self.tweets,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls(data.get("half_life_seconds", DECAY_HALF_LIFE_SECONDS))
+        index.accounts = {account: {"engagement": np.array(values["engagement"]),
+                                    "weight": np.array(values["weight"]),
+                                    "updated_at": values["updated_at"]}
+                          for account, values in data["accounts"].items()}
+        index.tweets = data["tweets"]
+        return index
+
+def load_index():
+    """Restore the persisted index, building it from stored metrics the first time"""
+    data = load_state(STATE_KEY)
+    if data:
+        return PostingTimeIndex.from_dict(data)
+    index = PostingTimeIndex()
+    history = get_recent_tweets(days=BOOTSTRAP_DAYS, with_metrics=True)
+    for tweet in history:
+        index.update(tweet)
+    if history:
+        logger.info(f"Built posting-time index from {len(history)} stored tweets")
+    return index
+
+def save_index(index):
+    save_state(STATE_KEY, index.to_dict())
+
+def record_snapshots(snapshots):
+    """Fold new metric snapshots into the persisted index"""
+    if not snapshots:
+        return
+    with _state_lock, write_transaction():
+        index = load_index()
+        for snapshot in snapshots:
+            index.update(snapshot)
+        save_index(index)
+
+def _planned_posts(account):
+    """Posting times already used or booked for an account: posted tweets plus queued ones"""
+    from publish_queue import pending_tweets
+
+    posted = [tweet["posted_at"] for tweet in get_recent_tweets(days=2, account=account)]
+    return posted + [item["not_before"] for item in pending_tweets(account)]
+
+def next_slots(account=DEFAULT_ACCOUNT, count=3, now=None, index=None, planned=None,
+               max_per_day=MAX_TWEETS_PER_DAY, cooldown_minutes=TWEET_COOLDOWN_MINUTES):
+    """The next `count` posting-run start times for an account, best hours first within each day.
+
+    A run posts TWEETS_PER_RUN tweets a cooldown apart, so runs are spaced
+    at least that far from each other and from already booked posts, and
+    each local day gets no more runs than MAX_TWEETS_PER_DAY allows.
+    """
+    now = now or time.time()
+    index = index if index is not None else load_index()
+    planned = planned if planned is not None else _planned_posts(account)
+    scores = index.hour_scores(account)
+    run_span = TWEETS_PER_RUN * cooldown_minutes * 60
+    booked = list(planned)
+
+    slots = []
+    start_of_today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    for day in range(8):
+        day_start = start_of_today + timedelta(days=day)
+        day_end = (day_start + timedelta(days=1)).timestamp()
+        posts_that_day = sum(1 for t in booked if day_start.timestamp() <= t < day_end)
+        runs_left = (max_per_day - posts_that_day) // TWEETS_PER_RUN
+        hours = [(day_start + timedelta(hours=hour)).timestamp() for hour in range(24)]
+        # Without any history only the usual hours score above zero
+        hours = [t for t in hours if t > now and scores[hour_of_week(t)] > 0]
+        for start in sorted(hours, key=lambda t: scores[hour_of_week(t)], reverse=True):
+            if runs_left <= 0:
+                break
+            if all(abs(start - t) >= run_span for t in booked):
+                slots.append(start)
+                booked += [start + i * cooldown_minutes * 60 for i in range(TWEETS_PER_RUN)]
+                runs_left -= 1
+        if len(slots) >= count:
+            break
+    return sorted(slots)[:count]
+
+def next_slot(account=DEFAULT_ACCOUNT):
+    """next_run function for the scheduler: the account's next posting slot"""
+    def next_run(now):
+        slots = next_slots(account, count=1, now=now)
+        # Fall back to tomorrow's first usual hour if the week is fully booked
+        if not slots:
+            tomorrow = datetime.fromtimestamp(now) + timedelta(days=1)
+            return tomorrow.replace(hour=DEFAULT_POSTING_HOURS[0], minute=0, second=0, microsecond=0).timestamp()
+        return slots[0]
+    return next_run
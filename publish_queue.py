@@ -0,0 +1,262 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from config import TWEET_COOLDOWN_MINUTES
+from accounts import DEFAULT_ACCOUNT
+from metrics_poller import register_tweets
+from store import get_connection, write_transaction, save_tweets
+from utils.rate_budget import budget, POST_ENDPOINT, RateBudgetExceeded
+from dedup_index import find_near_duplicates, index_posted
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# A claimed post whose dispatcher never reported back (it crashed mid-post) is retried after this long
+CLAIM_TIMEOUT_SECONDS = int(os.getenv("PUBLISH_CLAIM_TIMEOUT", str(10 * 60)))
+# Posted items are kept this long so the cooldown survives restarts
+POSTED_RETENTION_SECONDS = 24 * 60 * 60
+
+# Serializes this process's writes; the store's write lock covers other processes
+_queue_lock = threading.Lock()
+
+def _next_slot(conn, account, cooldown_seconds, now):
+    """Earliest time the account may post again given what is already queued or posted"""
+    row = conn.execute(
+        "SELECT MAX(CASE WHEN status = 'posted' THEN posted_at ELSE not_before END) AS last "
+        "FROM publish_queue WHERE account = ? AND status IN ('pending', 'posting', 'posted')", (account,)
+    ).fetchone()
+    if row["last"] is None:
+        return now
+    return max(now, row["last"] + cooldown_seconds)
+
+def enqueue_tweets(tweets, account=None, cooldown_minutes=TWEET_COOLDOWN_MINUTES, now=None, run_id=None):
+    """Queue tweets for posting, spacing them by the cooldown. Returns the queued items.
+
+    A tweet dict may carry an idempotency_key; a key that is already in the
+    queue returns the existing item instead of queueing the tweet again.
+    """
+    account = account or DEFAULT_ACCOUNT
+    now = now or time.time()
+    cooldown_seconds = cooldown_minutes * 60
+    queued = []
+    added = []
+
+    with _queue_lock, write_transaction() as conn:
+        for tweet_data in tweets:
+            key = tweet_data.get("idempotency_key") if isinstance(tweet_data, dict) else None
+            if key:
+                known = conn.execute("SELECT * FROM publish_queue WHERE idempotency_key = ?", (key,)).fetchone()
+                if known:
+                    queued.append(dict(known))
+                    continue
+            item = {
+                "queue_id": uuid.uuid4().hex,
+                "idempotency_key": key,
+                "account": account,
+                "run_id": run_id,
+                "text": tweet_data.get("text", tweet_data) if isinstance(tweet_data, dict) else tweet_data,
+                "type": tweet_data.get("type", "unknown") if isinstance(tweet_data, dict) else "unknown",
+                "not_before": _next_slot(conn, account, cooldown_seconds, now),
+                "enqueued_at": now,
+                "status": "pending",
+                "attempts": 0
+            }
+            conn.execute(
+                f"INSERT INTO publish_queue ({', '.join(item)}) VALUES ({', '.join('?' * len(item))})",
+                list(item.values())
+            )
+            queued.append(item)
+            added.append(item)
+
+    for item in added:
+        logger.info(f"Queued {item['type']} tweet for {account} at {time.ctime(item['not_before'])}")
+    if len(added) < len(queued):
+        logger.info(f"{len(queued) - len(added)} tweets were already queued under the same idempotency key")
+    return queued
+
+def posted_tweet(item, tweet_id=None, posted_at=None):
+    """The posted-tweet dict the rest of the pipeline uses, built from a queue item"""
+    return {
+        "id": tweet_id or item["tweet_id"],
+        "queue_id": item["queue_id"],
+        "text": item["text"],
+        "type": item["type"],
+        "account": item["account"],
+        "run_id": item.get("run_id"),
+        "posted_at": posted_at or item["posted_at"]
+    }
+
+def _claim_due(now, account=None):
+    """Mark due items as in-flight so concurrent dispatchers don't double-post
+
+    The claim is a single UPDATE, so two processes can never claim the same
+    item. At most one post per account per dispatch, and none while another
+    of its posts is in flight, keeps the cooldown intact.
+    """
+    account_filter = " AND account = ?" if account is not None else ""
+    conn = get_connection()
+    with _queue_lock, conn:
+        rows = conn.execute(
+            "UPDATE publish_queue SET status = 'posting', attempts = attempts + 1, claimed_at = ? "
+            "WHERE queue_id IN (SELECT queue_id FROM ("
+            "  SELECT queue_id, MIN(not_before) FROM publish_queue p"
+            "  WHERE status = 'pending' AND not_before <= ?" + account_filter +
+            "  AND NOT EXISTS (SELECT 1 FROM publish_queue q WHERE q.account = p.account AND q.status = 'posting')"
+            "  GROUP BY account)) "
+            "RETURNING *",
+            [now, now] + ([account] if account is not None else [])
+        ).fetchall()
+    return sorted((dict(row) for row in rows), key=lambda item: item["not_before"])
+
+def _reclaim_stale(now):
+    """Give posts stuck in flight back to the queue, or fail them after their last attempt.
+
+    The tweet may have gone out before the crash, so a retry can repeat it;
+    waiting out the timeout first keeps that to posts whose outcome is
+    really unknown.
+    """
+    conn = get_connection()
+    with _queue_lock, conn:
+        rows = conn.execute(
+            "UPDATE publish_queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "claimed_at = NULL WHERE status = 'posting' AND claimed_at < ? RETURNING queue_id, account, status",
+            (MAX_ATTEMPTS, now - CLAIM_TIMEOUT_SECONDS)
+        ).fetchall()
+    for row in rows:
+        outcome = "retrying it" if row["status"] == "pending" else "marking it failed"
+        logger.warning(f"Queued tweet {row['queue_id']} for {row['account']} was claimed but never confirmed; {outcome}")
+    return len(rows)
+
+def _defer_over_budget(now, account=None):
+    """Push back due posts of accounts whose post budget or daily cap is spent"""
+    account_filter = " AND account = ?" if account is not None else ""
+    conn = get_connection()
+    due_accounts = [row["account"] for row in conn.execute(
+        "SELECT DISTINCT account FROM publish_queue WHERE status = 'pending' AND not_before <= ?" + account_filter,
+        [now] + ([account] if account is not None else [])
+    )]
+    waits = {}
+    for name in due_accounts:
+        wait = budget.time_until(name, POST_ENDPOINT, now=now)
+        if wait > 0:
+            waits[name] = wait
+    if not waits:
+        return
+    with _queue_lock, conn:
+        conn.executemany(
+            "UPDATE publish_queue SET not_before = ? WHERE status = 'pending' AND account = ? AND not_before <= ?",
+            [(now + wait, name, now) for name, wait in waits.items()]
+        )
+    for name, wait in waits.items():
+        logger.info(f"Post budget for {name} is spent; holding its queued tweets for {wait / 60:.0f} min")
+
+def _finish(queue_id, tweet_id, now, rejected=False):
+    conn = get_connection()
+    with _queue_lock, conn:
+        if rejected:
+            conn.execute("UPDATE publish_queue SET status = 'rejected', claimed_at = NULL WHERE queue_id = ?",
+                         (queue_id,))
+        elif tweet_id:
+            conn.execute(
+                "UPDATE publish_queue SET status = 'posted', tweet_id = ?, posted_at = ?, claimed_at = NULL "
+                "WHERE queue_id = ?", (str(tweet_id), now, queue_id)
+            )
+        else:
+            conn.execute(
+                "UPDATE publish_queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "claimed_at = NULL WHERE queue_id = ?", (MAX_ATTEMPTS, queue_id)
+            )
+        conn.execute(
+            "DELETE FROM publish_queue WHERE status NOT IN ('pending', 'posting') "
+            "AND COALESCE(posted_at, not_before) < ?", (now - POSTED_RETENTION_SECONDS,)
+        )
+
+def _hold(queue_id, not_before):
+    """Give a claimed item back without counting the attempt"""
+    conn = get_connection()
+    with _queue_lock, conn:
+        conn.execute(
+            "UPDATE publish_queue SET status = 'pending', attempts = attempts - 1, not_before = ?, claimed_at = NULL "
+            "WHERE queue_id = ?", (not_before, queue_id)
+        )
+
+def dispatch_due(now=None, account=None):
+    """Post every queued tweet whose not-before time has passed. Returns the posted tweets."""
+    from post_tweet import post_tweet
+
+    now = now or time.time()
+    posted_tweets = []
+    _reclaim_stale(now)
+    # Plan around rate limits and the daily cap rather than failing the posts
+    _defer_over_budget(now, account)
+    due = _claim_due(now, account)
+    remaining = {item["queue_id"]: item for item in due}
+    try:
+        matches = find_near_duplicates([item["text"] for item in due]) if due else []
+        for item, (matched_id, similarity) in zip(due, matches):
+            del remaining[item["queue_id"]]
+            if matched_id is not None:
+                logger.warning(f"Skipping queued tweet {item['queue_id']}: {similarity:.0%} similar to posted tweet {matched_id}")
+                _finish(item["queue_id"], None, time.time(), rejected=True)
+                continue
+            try:
+                tweet_id = post_tweet(item["text"], account=item["account"])
+            except RateBudgetExceeded as e:
+                # Not a failed attempt: the tweet waits in the queue until the budget allows it
+                logger.warning(f"Holding queued tweet {item['queue_id']}: {e}")
+                _hold(item["queue_id"], time.time() + e.retry_after)
+                continue
+            except Exception as e:
+                # One bad item (e.g. an account no longer configured) must not stop the others
+                logger.error(f"Error posting queued tweet {item['queue_id']} for {item['account']}: {e}")
+                tweet_id = None
+            posted_at = time.time()
+            _finish(item["queue_id"], tweet_id, posted_at)
+            if tweet_id:
+                posted_tweets.append(posted_tweet(item, tweet_id, posted_at))
+            else:
+                logger.error(f"Failed to post queued tweet {item['queue_id']} (attempt {item['attempts']})")
+    finally:
+        # Even if the loop broke off, record what went out and give back the claims it never reached
+        for item in remaining.values():
+            _hold(item["queue_id"], item["not_before"])
+        if posted_tweets:
+            save_tweets(posted_tweets)
+            index_posted(posted_tweets)
+            register_tweets(posted_tweets)
+    return posted_tweets
+
+def next_due_time():
+    """When dispatch_due next has work, or None when the queue is empty
+
+    An account with a post in flight has nothing claimable until that post
+    is confirmed or its claim times out, so its pending posts don't count.
+    """
+    row = get_connection().execute(
+        "SELECT MIN(due) AS due FROM ("
+        "  SELECT not_before AS due FROM publish_queue p WHERE status = 'pending'"
+        "  AND NOT EXISTS (SELECT 1 FROM publish_queue q WHERE q.account = p.account AND q.status = 'posting')"
+        "  UNION ALL"
+        "  SELECT claimed_at + ? FROM publish_queue WHERE status = 'posting')", (CLAIM_TIMEOUT_SECONDS,)
+    ).fetchone()
+    return row["due"]
+
+def get_items(queue_ids):
+    """Current state of queue items, by queue ID"""
+    queue_ids = list(queue_ids)
+    rows = get_connection().execute(
+        f"SELECT * FROM publish_queue WHERE queue_id IN ({', '.join('?' * len(queue_ids))})", queue_ids
+    ) if queue_ids else []
+    return [dict(row) for row in rows]
+
+def pending_tweets(account=None):
+    """Return queued tweets that have not been posted yet"""
+    query = "SELECT * FROM publish_queue WHERE status = 'pending'"
+    params = []
+    if account is not None:
+        query += " AND account = ?"
+        params.append(account)
+    return [dict(row) for row in get_connection().execute(query + " ORDER BY not_before", params)]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("GEMINI_CACHE_DIR", os.path.join(".cache", "gemini"))
+CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+CACHE_MAX_BYTES = int(os.getenv("GEMINI_CACHE_MAX_BYTES", str(20 * 1024 * 1024)))
+# Set GEMINI_CACHE_BYPASS=1 to always generate fresh tweets
+CACHE_BYPASS = os.getenv("GEMINI_CACHE_BYPASS") == "1"
+
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bypasses": 0, "evictions": 0, "saved_seconds": 0.0}
+
+def cache_key(prompt, model_name, params=None):
+    """Hash of the whitespace-normalized prompt, model and generation parameters"""
+    normalized = re.sub(r"\s+", " ", prompt).strip()
+    payload = json.dumps({"prompt": normalized, "model": model_name, "params": params or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def get_cached(key, bypass=False):
+    """Return the cached parsed tweets for a key, or None on miss/expiry/bypass"""
+    if bypass or CACHE_BYPASS:
+        with _cache_lock:
+            _stats["bypasses"] += 1
+        return None
+
+    path = _path(key)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = None
+
+    if entry is None or time.time() - entry["created_at"] > CACHE_TTL_SECONDS:
+        with _cache_lock:
+            _stats["misses"] += 1
+        return None
+
+    # Touch the file so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    with _cache_lock:
+        _stats["hits"] += 1
+        _stats["saved_seconds"] += entry.get("latency", 0)
+    return entry["tweets"]
+
+def put_cached(key, tweets, latency):
+    """Store parsed tweets with the latency it took to generate them"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Unique per writer: processes sharing the cache directory must not rename each other's file
+    tmp_path = f"{_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"created_at": time.time(), "latency": latency, "tweets": tweets}, f)
+    os.replace(tmp_path, _path(key))
+    _evict()
+
+def _remove(path):
+    """Delete a cache file; False if another process already evicted it"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+def _evict():
+    """Drop expired entries, then least recently used ones until under the size cap"""
+    with _cache_lock:
+        entries = []
+        now = time.time()
+        for name in os.listdir(CACHE_DIR):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > CACHE_TTL_SECONDS:
+                _stats["evictions"] += _remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= CACHE_MAX_BYTES:
+                break
+            total -= size
+            _stats["evictions"] += _remove(path)
+
+def get_cache_stats():
+    """Hit rate and generation time saved by the response cache"""
+    with _cache_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0
+    stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+    return stats
@@ -1,23 +1,192 @@
-import schedule
+import heapq
+import os
+import threading
 import time
-from main import run_scheduled
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from publish_queue import dispatch_due, next_due_time
+from metrics_poller import poll_due, next_poll_time
+from store import save_state, load_state
+from accounts import load_accounts, DEFAULT_ACCOUNT
+from posting_times import next_slot
+import config
+from utils.telemetry import span, start_metrics_server, write_metrics_file
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+STATE_KEY = "scheduler"
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+# A run missed by less than this (e.g. across a restart) is made up once; older ones are skipped
+MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "3600"))
+# Queue-driven jobs also wake this often to pick up work added by other processes
+RECHECK_SECONDS = 300
+MIN_INTERVAL_SECONDS = 1.0
+
+def when_due(next_time, recheck_seconds=RECHECK_SECONDS):
+    """next_run function for jobs driven by a persistent queue's next due time"""
+    def next_run(now):
+        due = next_time()
+        fallback = now + recheck_seconds
+        if due is None:
+            return fallback
+        return min(max(due, now + MIN_INTERVAL_SECONDS), fallback)
+    return next_run
+
+class Scheduler:
+    """Heap-based timer scheduler that sleeps until exactly the next due job.
+
+    Jobs run on a worker pool so a long pipeline run doesn't hold up the
+    dispatcher or the poller; a job never overlaps with itself. Next run
+    times are persisted in the store so missed runs can be handled by each
+    job's misfire policy after a restart:
+
+    - "run_once": make up a missed run once if within the grace period, else skip it
+    - "skip": always continue with the next regular run
+    """
+
+    def __init__(self, workers=SCHEDULER_WORKERS, grace_seconds=MISFIRE_GRACE_SECONDS):
+        self.grace_seconds = grace_seconds
+        self._jobs = {}
+        self._heap = []
+        self._running = set()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler")
+        self._stopped = False
+        # Run times persisted by the previous process
+        self._saved = load_state(STATE_KEY, {})
+
+    def add_job(self, name, func, next_run, misfire="run_once"):
+        """Register a job; next_run(now) returns the timestamp of its next run"""
+        now = time.time()
+        saved = self._saved.get(name)
+        if saved is None:
+            run_at = next_run(now)
+        elif saved >= now:
+            run_at = saved
+        elif misfire == "run_once" and now - saved <= self.grace_seconds:
+            logger.info(f"Job {name} missed its run at {datetime.fromtimestamp(saved):%Y-%m-%d %H:%M}; running it now")
+            run_at = now
+        else:
+            if misfire == "run_once":
+                logger.info(f"Skipping missed run of {name} at {datetime.fromtimestamp(saved):%Y-%m-%d %H:%M}")
+            run_at = next_run(now)
+
+        with self._cond:
+            self._jobs[name] = {"func": func, "next_run": next_run, "run_at": None}
+            self._push(name, run_at)
+
+    def reschedule(self, name):
+        """Recompute a job's next run, e.g. after new work was queued for it"""
+        with self._cond:
+            job = self._jobs.get(name)
+            if job and name not in self._running:
+                self._push(name, job["next_run"](time.time()))
+
+    def next_runs(self):
+        with self._cond:
+            return {name: job["run_at"] for name, job in self._jobs.items()}
+
+    def _push(self, name, run_at):
+        self._jobs[name]["run_at"] = run_at
+        heapq.heappush(self._heap, (run_at, name))
+        self._persist()
+        self._cond.notify()
+
+    def _persist(self):
+        try:
+            save_state(STATE_KEY, {name: job["run_at"] for name, job in self._jobs.items()})
+        except Exception as e:
+            logger.error(f"Could not persist the schedule: {e}")
+
+    def run_forever(self):
+        """Dispatch jobs to the workers as they come due, until stop() is called"""
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                run_at, name = self._heap[0]
+                job = self._jobs[name]
+                if run_at != job["run_at"] or name in self._running:
+                    # Superseded by a reschedule
+                    heapq.heappop(self._heap)
+                    continue
+                delay = run_at - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                self._running.add(name)
+                self._executor.submit(self._run, name)
+
+    def _run(self, name):
+        job = self._jobs[name]
+        try:
+            with span("job", job=name):
+                job["func"]()
+        except Exception as e:
+            logger.error(f"Scheduled job {name} failed: {e}")
+        finally:
+            write_metrics_file()
+            with self._cond:
+                self._running.discard(name)
+                self._push(name, job["next_run"](time.time()))
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=wait)
+
+def build_scheduler():
+    """Scheduler with the posting runs, the publish dispatcher and the metrics poller"""
+    scheduler = Scheduler()
+
+    def posting_run(account):
+        def run():
+            # The pipeline (Gemini client, asyncio) loads with the first run, not at startup
+            from main import main
+            logger.info(f"Running scheduled Twitter bot for {account}...")
+            if main(account=account):
+                logger.info(f"Scheduled run for {account} completed successfully")
+            else:
+                logger.error(f"Scheduled run for {account} failed")
+            # The run queued tweets and registered polls; wake their jobs
+            scheduler.reschedule("dispatch_due")
+            scheduler.reschedule("poll_due")
+        return run
+
+    def run_dispatch():
+        dispatch_due()
+        scheduler.reschedule("poll_due")
+
+    # Each account posts in the best hours of its engagement history
+    for account in load_accounts():
+        name = account["name"]
+        job_name = "run_scheduled" if name == DEFAULT_ACCOUNT else f"run_scheduled:{name}"
+        scheduler.add_job(job_name, posting_run(name), next_slot(name), misfire="run_once")
+    # Queued tweets are posted by the dispatcher once their cooldown has passed
+    scheduler.add_job("dispatch_due", run_dispatch, when_due(next_due_time), misfire="skip")
+    # Posted tweets are re-polled at 5 min, 1 h, 6 h and 24 h in batched lookups
+    scheduler.add_job("poll_due", poll_due, when_due(next_poll_time), misfire="skip")
+    return scheduler
+
 def setup_scheduler():
     """Setup automated posting schedule"""
-    # Post 3 times a day: morning, afternoon, evening
-    schedule.every().day.at("09:00").do(run_scheduled)
-    schedule.every().day.at("14:00").do(run_scheduled)
-    schedule.every().day.at("19:00").do(run_scheduled)
-    
-    logger.info("Scheduler setup complete. Bot will post 3 times daily.")
-    
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
+    scheduler = build_scheduler()
+    start_metrics_server()
+    for name, run_at in scheduler.next_runs().items():
+        logger.info(f"Next {name}: {datetime.fromtimestamp(run_at):%Y-%m-%d %H:%M:%S}")
+    logger.info("Scheduler setup complete. Bot will post at the best-performing hours.")
+
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping scheduler...")
+        scheduler.stop()
 
 if __name__ == "__main__":
-    setup_scheduler()
\ No newline at end of file
+    config.validate()
+    setup_scheduler()
@@ -0,0 +1,437 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DB_FILE = os.getenv("BOT_DB_FILE", "bot_store.db")
+
+HASHTAG_PATTERN = re.compile(r"#\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    insights TEXT,
+    hypothesis TEXT
+);
+CREATE TABLE IF NOT EXISTS tweets (
+    tweet_id TEXT PRIMARY KEY,
+    run_id INTEGER,
+    account TEXT,
+    type TEXT,
+    text TEXT NOT NULL,
+    posted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tweets_posted_at ON tweets (posted_at);
+CREATE INDEX IF NOT EXISTS idx_tweets_type_posted_at ON tweets (type, posted_at);
+CREATE INDEX IF NOT EXISTS idx_tweets_account_posted_at ON tweets (account, posted_at);
+CREATE TABLE IF NOT EXISTS tweet_hashtags (
+    tweet_id TEXT NOT NULL,
+    hashtag TEXT NOT NULL,
+    PRIMARY KEY (tweet_id, hashtag)
+);
+CREATE INDEX IF NOT EXISTS idx_tweet_hashtags_hashtag ON tweet_hashtags (hashtag);
+CREATE TABLE IF NOT EXISTS metric_snapshots (
+    snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tweet_id TEXT NOT NULL,
+    polled_at REAL NOT NULL,
+    age_minutes REAL,
+    likes INTEGER DEFAULT 0,
+    retweets INTEGER DEFAULT 0,
+    replies INTEGER DEFAULT 0,
+    quotes INTEGER DEFAULT 0,
+    bookmarks INTEGER DEFAULT 0,
+    impressions INTEGER DEFAULT 0,
+    engagement_rate REAL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_tweet_polled ON metric_snapshots (tweet_id, polled_at);
+CREATE TABLE IF NOT EXISTS trends (
+    run_id INTEGER,
+    captured_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trends_captured_at ON trends (captured_at);
+CREATE TABLE IF NOT EXISTS candidates (
+    candidate_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT,
+    type TEXT NOT NULL,
+    text TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    used_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_candidates_type_used ON candidates (type, used_at, created_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    data TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    dedupe_key TEXT UNIQUE,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_token TEXT,
+    leased_by TEXT,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at);
+CREATE TABLE IF NOT EXISTS publish_queue (
+    queue_id TEXT PRIMARY KEY,
+    idempotency_key TEXT UNIQUE,
+    account TEXT NOT NULL,
+    run_id INTEGER,
+    type TEXT,
+    text TEXT NOT NULL,
+    not_before REAL NOT NULL,
+    enqueued_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    tweet_id TEXT,
+    posted_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_publish_queue_status ON publish_queue (status, account, not_before);
+CREATE TABLE IF NOT EXISTS metric_polls (
+    tweet_id TEXT PRIMARY KEY,
+    account TEXT,
+    type TEXT,
+    text TEXT,
+    posted_at REAL NOT NULL,
+    poll_at TEXT NOT NULL,
+    next_poll_at REAL NOT NULL,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_metric_polls_next ON metric_polls (next_poll_at);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Columns added to tables that older stores already have: (table, column, definition)
+ADDED_COLUMNS = [("candidates", "account", "TEXT")]
+# Run after ADDED_COLUMNS, as they may refer to the added columns
+MIGRATIONS = """
+CREATE INDEX IF NOT EXISTS idx_candidates_account_used ON candidates (account, used_at, created_at);
+"""
+
+METRIC_COLUMNS = ["likes", "retweets", "replies", "quotes", "bookmarks", "impressions", "engagement_rate"]
+
+_local = threading.local()
+
+def _migrate(conn):
+    for table, column, definition in ADDED_COLUMNS:
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column in columns:
+            continue
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        except sqlite3.OperationalError as e:
+            # Another process added it first
+            if "duplicate column" not in str(e):
+                raise
+    conn.executescript(MIGRATIONS)
+
+def get_connection():
+    """Return this thread's connection to the store, creating the schema on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "db_file", None) != DB_FILE:
+        conn = sqlite3.connect(DB_FILE, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _migrate(conn)
+        _local.conn = conn
+        _local.db_file = DB_FILE
+    return conn
+
+@contextmanager
+def write_transaction():
+    """Hold the store's write lock from the first statement, for read-modify-write updates.
+
+    Processes sharing the store serialize on it, so a value read inside the
+    block cannot be changed by another process before the block commits.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        # Already inside a transaction on this thread; it decides when to commit
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def extract_hashtags(text):
+    """Return the distinct hashtags in a tweet, lowercased"""
+    return sorted({tag.lower() for tag in HASHTAG_PATTERN.findall(text or "")})
+
+def start_run(account=None):
+    """Create a run record and return its ID"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO runs (account, started_at) VALUES (?, ?)", (account, time.time())
+        )
+    return cursor.lastrowid
+
+def finish_run(run_id, results):
+    """Store the outcome of a run along with the trends it used
+
+    A run whose stages ran as jobs (see workers.py) has a namespaced text ID
+    and no row in this store yet, so one is added.
+    """
+    conn = get_connection()
+    now = time.time()
+    insights = json.dumps(results.get("insights"), default=str)
+    trend_rows = [(run_id, now, "pattern", value) for value in results.get("trends_used") or []]
+    trend_rows += [(run_id, now, "hashtag", value) for value in results.get("hashtags_used") or []]
+    with conn:
+        cursor = conn.execute(
+            "UPDATE runs SET finished_at = ?, insights = ?, hypothesis = ? WHERE run_id = ?",
+            (now, insights, results.get("hypothesis"), run_id)
+        )
+        if cursor.rowcount == 0:
+            conn.execute(
+                "INSERT INTO runs (account, started_at, finished_at, insights, hypothesis) VALUES (?, ?, ?, ?, ?)",
+                (results.get("account"), results.get("started_at") or now, now, insights, results.get("hypothesis"))
+            )
+        conn.executemany(
+            "INSERT INTO trends (run_id, captured_at, kind, value) VALUES (?, ?, ?, ?)", trend_rows
+        )
+
+def save_tweets(posted_tweets, run_id=None):
+    """Insert or update posted tweets and their hashtags"""
+    tweet_rows = []
+    hashtag_rows = []
+    for tweet in posted_tweets:
+        tweet_id = str(tweet["id"])
+        tweet_rows.append((
+            tweet_id, tweet.get("run_id", run_id), tweet.get("account"), tweet.get("type", "unknown"),
+            tweet.get("text", ""), tweet.get("posted_at") or time.time()
+        ))
+        hashtag_rows += [(tweet_id, tag) for tag in extract_hashtags(tweet.get("text"))]
+
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO tweets (tweet_id, run_id, account, type, text, posted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", tweet_rows
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO tweet_hashtags (tweet_id, hashtag) VALUES (?, ?)", hashtag_rows
+        )
+
+def save_snapshots(snapshots):
+    """Append metric snapshots as returned by the metrics poller"""
+    rows = [
+        (str(s["tweet_id"]), s.get("polled_at") or time.time(), s.get("age_minutes"))
+        + tuple(s.get(column, 0) for column in METRIC_COLUMNS)
+        for s in snapshots
+    ]
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            f"INSERT INTO metric_snapshots (tweet_id, polled_at, age_minutes, {', '.join(METRIC_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (len(METRIC_COLUMNS) + 3))})", rows
+        )
+
+_LATEST_SNAPSHOT_JOIN = """
+LEFT JOIN metric_snapshots s ON s.snapshot_id = (
+    SELECT snapshot_id FROM metric_snapshots
+    WHERE tweet_id = t.tweet_id
+    ORDER BY polled_at DESC LIMIT 1
+)
+"""
+
+def _tweet_rows_to_dicts(rows):
+    tweets = []
+    for row in rows:
+        tweet = {
+            "id": row["tweet_id"],
+            "run_id": row["run_id"],
+            "account": row["account"],
+            "type": row["type"],
+            "text": row["text"],
+            "posted_at": row["posted_at"],
+        }
+        if row["polled_at"] is not None:
+            tweet.update({column: row[column] for column in METRIC_COLUMNS})
+            tweet["polled_at"] = row["polled_at"]
+        tweets.append(tweet)
+    return tweets
+
+def get_recent_tweets(days=30, tweet_type=None, account=None, with_metrics=False):
+    """Return tweets posted in the last N days, each merged with its latest metric snapshot"""
+    query = (
+        f"SELECT t.*, s.polled_at, {', '.join('s.' + c for c in METRIC_COLUMNS)} "
+        f"FROM tweets t {_LATEST_SNAPSHOT_JOIN} WHERE t.posted_at >= ?"
+    )
+    params = [time.time() - days * 24 * 60 * 60]
+    if tweet_type is not None:
+        query += " AND t.type = ?"
+        params.append(tweet_type)
+    if account is not None:
+        query += " AND t.account = ?"
+        params.append(account)
+    if with_metrics:
+        query += " AND s.polled_at IS NOT NULL"
+    query += " ORDER BY t.posted_at"
+    return _tweet_rows_to_dicts(get_connection().execute(query, params))
+
+def get_latest_snapshots(tweet_ids):
+    """Return the most recent snapshot per tweet ID"""
+    tweet_ids = [str(tweet_id) for tweet_id in tweet_ids]
+    latest = {}
+    conn = get_connection()
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(tweet_ids), 500):
+        chunk = tweet_ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT s.* FROM metric_snapshots s JOIN ("
+            f"  SELECT tweet_id, MAX(polled_at) AS polled_at FROM metric_snapshots"
+            f"  WHERE tweet_id IN ({', '.join('?' * len(chunk))}) GROUP BY tweet_id"
+            f") latest USING (tweet_id, polled_at)", chunk
+        )
+        for row in rows:
+            latest[row["tweet_id"]] = dict(row)
+    return latest
+
+def get_snapshots(tweet_id):
+    """Return every snapshot for one tweet, oldest first"""
+    rows = get_connection().execute(
+        "SELECT * FROM metric_snapshots WHERE tweet_id = ? ORDER BY polled_at", (str(tweet_id),)
+    )
+    return [dict(row) for row in rows]
+
+def get_top_hashtags(days=30, limit=5, min_tweets=1, account=None):
+    """Hashtags ranked by average likes on their latest snapshot, over one account's tweets if given"""
+    account_filter = " AND t.account = ?" if account is not None else ""
+    rows = get_connection().execute(
+        f"SELECT h.hashtag, COUNT(*) AS tweets, AVG(COALESCE(s.likes, 0)) AS avg_likes "
+        f"FROM tweet_hashtags h JOIN tweets t USING (tweet_id) {_LATEST_SNAPSHOT_JOIN} "
+        f"WHERE t.posted_at >= ?{account_filter} GROUP BY h.hashtag HAVING COUNT(*) >= ? "
+        f"ORDER BY avg_likes DESC LIMIT ?",
+        [time.time() - days * 24 * 60 * 60] + ([account] if account is not None else []) + [min_tweets, limit]
+    )
+    return [dict(row) for row in rows]
+
+def add_candidates(candidates, account=None):
+    """Add generated tweet candidates to an account's pool, ignoring exact duplicates. Returns how many were new."""
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO candidates (account, type, text, created_at) VALUES (?, ?, ?, ?)",
+            [(account, c["type"], c["text"], now) for c in candidates]
+        )
+        return conn.total_changes - before
+
+def get_unused_candidates(tweet_type=None, max_age_seconds=None, account=None):
+    """Return pool candidates that have not been posted yet, newest first"""
+    query = "SELECT candidate_id, account, type, text, created_at FROM candidates WHERE used_at IS NULL"
+    params = []
+    if account is not None:
+        query += " AND account = ?"
+        params.append(account)
+    if tweet_type is not None:
+        query += " AND type = ?"
+        params.append(tweet_type)
+    if max_age_seconds is not None:
+        query += " AND created_at >= ?"
+        params.append(time.time() - max_age_seconds)
+    query += " ORDER BY created_at DESC"
+    return [dict(row) for row in get_connection().execute(query, params)]
+
+def mark_candidates_used(candidate_ids):
+    """Take candidates out of the pool once they have been selected"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "UPDATE candidates SET used_at = ? WHERE candidate_id = ?",
+            [(time.time(), candidate_id) for candidate_id in candidate_ids]
+        )
+
+def claim_candidates(candidate_ids):
+    """Take candidates out of the pool unless another caller already has; returns the IDs this call got"""
+    candidate_ids = list(candidate_ids)
+    now = time.time()
+    claimed = set()
+    conn = get_connection()
+    with conn:
+        for start in range(0, len(candidate_ids), 500):
+            chunk = candidate_ids[start:start + 500]
+            rows = conn.execute(
+                f"UPDATE candidates SET used_at = ? WHERE used_at IS NULL "
+                f"AND candidate_id IN ({', '.join('?' * len(chunk))}) RETURNING candidate_id", [now] + chunk
+            ).fetchall()
+            claimed.update(row["candidate_id"] for row in rows)
+    return claimed
+
+def save_checkpoint(run_id, stage, data):
+    """Durably record a completed pipeline stage and its output"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (run_id, stage, data, completed_at) VALUES (?, ?, ?, ?)",
+            (run_id, stage, json.dumps(data, default=str), time.time())
+        )
+
+def load_checkpoints(run_id):
+    """Return {stage: data} for every completed stage of a run"""
+    rows = get_connection().execute(
+        "SELECT stage, data FROM checkpoints WHERE run_id = ?", (run_id,)
+    ).fetchall()
+    return {row["stage"]: json.loads(row["data"]) for row in rows}
+
+def find_unfinished_run(account=None, max_age_seconds=None):
+    """Most recent run of an account that checkpointed some stages but never finished, or None"""
+    query = (
+        "SELECT run_id FROM runs r WHERE finished_at IS NULL AND account IS ? "
+        "AND EXISTS (SELECT 1 FROM checkpoints c WHERE c.run_id = r.run_id)"
+    )
+    params = [account]
+    if max_age_seconds is not None:
+        query += " AND started_at >= ?"
+        params.append(time.time() - max_age_seconds)
+    row = get_connection().execute(query + " ORDER BY started_at DESC LIMIT 1", params).fetchone()
+    return row["run_id"] if row else None
+
+def save_state(key, value):
+    """Persist a JSON-serializable value under a key"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO state (key, value, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time())
+        )
+
+def load_state(key, default=None):
+    """Return the value stored under a key, or the default"""
+    row = get_connection().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return json.loads(row["value"]) if row else default
@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from accounts import DEFAULT_ACCOUNT
+from store import extract_hashtags, load_state, save_state, write_transaction
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Each account's aggregates are stored under STATE_KEY:<account>
+STATE_KEY = "strategy_aggregates"
+# Older tweets count half as much after this long
+DECAY_HALF_LIFE_SECONDS = 7 * 24 * 60 * 60
+# Per-tweet state is kept this long after posting: the last metrics poll comes at 24 h, and
+# the poller drops polls later than this, so no snapshot arrives once a tweet's state is gone
+TRACK_SECONDS = 3 * 24 * 60 * 60
+
+_state_lock = threading.Lock()
+
+def _engagement_score(tweet):
+    return tweet.get('likes', 0) + tweet.get('retweets', 0) * 2
+
+def _posting_hour(posted_at):
+    return datetime.fromtimestamp(posted_at).hour if posted_at else None
+
+class StrategyAggregates:
+    """Running counts, sums and time-decayed means per tweet type, hashtag and posting hour.
+
+    Each metric snapshot updates the aggregates in O(1): a tweet seen for the
+    first time adds to the counts, later snapshots of the same tweet only add
+    the difference from its previous snapshot.
+    """
+
+    def __init__(self, half_life_seconds=DECAY_HALF_LIFE_SECONDS):
+        self.half_life_seconds = half_life_seconds
+        self.totals = self._empty_bucket()
+        self.buckets = {"type": {}, "hashtag": {}, "hour": {}}
+        self.tweets = {}
+        self.best_tweet = None
+        self.updated_at = None
+
+    @staticmethod
+    def _empty_bucket():
+        return {"count": 0, "likes": 0, "engagement_rate": 0.0,
+                "decayed_likes": 0.0, "decayed_weight": 0.0, "updated_at": None}
+
+    def _decay(self, bucket, now):
+        if bucket["updated_at"] is not None and now > bucket["updated_at"]:
+            factor = 0.5 ** ((now - bucket["updated_at"]) / self.half_life_seconds)
+            bucket["decayed_likes"] *= factor
+            bucket["decayed_weight"] *= factor
+        bucket["updated_at"] = now
+
+    def _buckets_for(self, entry):
+        yield self.totals
+        dimensions = [("type", entry["type"]), ("hour", entry["hour"])]
+        dimensions += [("hashtag", tag) for tag in entry["hashtags"]]
+        for dimension, key in dimensions:
+            if key is None:
+                continue
+            yield self.buckets[dimension].setdefault(str(key), self._empty_bucket())
+
+    def update(self, tweet, now=None):
+        """Fold one tweet's latest metrics (a snapshot or a posted tweet dict) into the aggregates"""
+        now = now or time.time()
+        tweet_id = tweet.get("tweet_id") or tweet.get("id") or f"anonymous_{len(self.tweets)}"
+        tweet_id = str(tweet_id)
+        likes = tweet.get("likes", 0)
+        engagement_rate = tweet.get("engagement_rate", 0)
+
+        entry = self.tweets.get(tweet_id)
+        if entry is None:
+            entry = {
+                "type": tweet.get("type", "unknown"),
+                "hashtags": extract_hashtags(tweet.get("text")),
+                "hour": _posting_hour(tweet.get("posted_at")),
+                "posted_at": tweet.get("posted_at"),
+                "first_seen": now,
+                "likes": 0,
+                "engagement_rate": 0,
+            }
+            self.tweets[tweet_id] = entry
+            new_tweet = True
+        else:
+            new_tweet = False
+
+        delta_likes = likes - entry["likes"]
+        delta_rate = engagement_rate - entry["engagement_rate"]
+        # A correction to an older tweet counts with the weight it has decayed to
+        weight = 0.5 ** ((now - entry["first_seen"]) / self.half_life_seconds)
+        for bucket in self._buckets_for(entry):
+            self._decay(bucket, now)
+            if new_tweet:
+                bucket["count"] += 1
+                bucket["decayed_weight"] += 1
+            bucket["likes"] += delta_likes
+            bucket["engagement_rate"] += delta_rate
+            bucket["decayed_likes"] += delta_likes * weight
+
+        entry["likes"] = likes
+        entry["engagement_rate"] = engagement_rate
+        if self.best_tweet is None or _engagement_score(tweet) > _engagement_score(self.best_tweet):
+            self.best_tweet = dict(tweet)
+        self.updated_at = now
+
+    @staticmethod
+    def mean(bucket, field="likes"):
+        return bucket[field] / bucket["count"] if bucket["count"] else 0
+
+    @staticmethod
+    def decayed_mean(bucket):
+        return bucket["decayed_likes"] / bucket["decayed_weight"] if bucket["decayed_weight"] else 0
+
+    def ranking(self, dimension, decayed=False):
+        """Keys of a dimension ordered by mean likes, best first"""
+        score = self.decayed_mean if decayed else self.mean
+        buckets = self.buckets[dimension]
+        return sorted(buckets, key=lambda key: score(buckets[key]), reverse=True)
+
+    def insights(self):
+        """Build the optimize_strategy insights dict from the aggregates"""
+        if not self.totals["count"]:
+            return None
+        types = self.buckets["type"]
+        best_type = max(types, key=lambda t: self.mean(types[t]))
+        return {
+            'best_tweet': self.best_tweet,
+            'avg_likes': round(self.mean(self.totals), 2),
+            'avg_engagement_rate': round(self.mean(self.totals, "engagement_rate"), 2),
+            'best_performing_type': best_type,
+            'total_tweets_analyzed': self.totals["count"]
+        }
+
+    def to_dict(self, now=None):
+        """Snapshot the aggregates, dropping per-tweet state that no longer receives updates"""
+        now = now or time.time()
+        self.tweets = {tweet_id: entry for tweet_id, entry in self.tweets.items()
+                       if now - (entry.get("posted_at") or entry["first_seen"]) < TRACK_SECONDS}
+        return {
+            "half_life_seconds": self.half_life_seconds,
+            "totals": self.totals,
+            "buckets": self.buckets,
+            "tweets": self.tweets,
+            "best_tweet": self.best_tweet,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregates = cls(data.get("half_life_seconds", DECAY_HALF_LIFE_SECONDS))
+        aggregates.totals = data["totals"]
+        aggregates.buckets = data["buckets"]
+        aggregates.tweets = data["tweets"]
+        aggregates.best_tweet = data.get("best_tweet")
+        aggregates.updated_at = data.get("updated_at")
+        return aggregates
+
+    @classmethod
+    def from_tweets(cls, tweets):
+        aggregates = cls()
+        for tweet in tweets:
+            aggregates.update(tweet)
+        return aggregates
+
+def _state_key(account):
+    return f"{STATE_KEY}:{account or DEFAULT_ACCOUNT}"
+
+def load_aggregates(account=None):
+    """Restore an account's persisted aggregates, or start empty"""
+    data = load_state(_state_key(account))
+    return StrategyAggregates.from_dict(data) if data else StrategyAggregates()
+
+def save_aggregates(aggregates, account=None):
+    save_state(_state_key(account), aggregates.to_dict())
+
+def record_snapshots(snapshots):
+    """Fold new metric snapshots into their accounts' persisted aggregates"""
+    if not snapshots:
+        return
+    by_account = {}
+    for snapshot in snapshots:
+        by_account.setdefault(snapshot.get("account") or DEFAULT_ACCOUNT, []).append(snapshot)
+    with _state_lock, write_transaction():
+        for account, account_snapshots in by_account.items():
+            aggregates = load_aggregates(account)
+            for snapshot in account_snapshots:
+                aggregates.update(snapshot)
+            save_aggregates(aggregates, account)
@@ -1,10 +1,16 @@
 # test_bot.py - Test your bot without posting to Twitter
 
+import hashlib
 import logging
 import json
+import os
 import time
 from datetime import datetime
-from trend_discovery import get_trending_tweet_patterns, get_hashtag_trends
+
+# Run against a store of its own so a test never uses up the real candidate pool
+os.environ["BOT_DB_FILE"] = os.getenv("TEST_BOT_DB_FILE", "test_bot_store.db")
+
+from trend_provider import get_trends
 from generate_tweets import generate_tweets
 from optimize_strategy import optimize_strategy
 
@@ -18,6 +24,10 @@ def simulate_posting(tweets):
     for i, tweet_data in enumerate(tweets):
         tweet_text = tweet_data.get('text', tweet_data) if isinstance(tweet_data, dict) else tweet_data
         tweet_id = f"sim_{int(time.time())}_{i}"
+        # Stable per text, unlike hash() which is salted per interpreter run
+        digest = hashlib.sha256(tweet_text.encode()).digest()
+        likes = 1 + digest[0] % 50
+        impressions = 100 + int.from_bytes(digest[1:3], "big") % 1000
         
         posted_tweets.append({
             'id': tweet_id,
@@ -25,17 +35,16 @@ def simulate_posting(tweets):
             'type': tweet_data.get('type', 'unknown') if isinstance(tweet_data, dict) else 'unknown',
             'posted_at': time.time(),
             # Simulate realistic engagement metrics
-            'likes': max(1, hash(tweet_text) % 50),  # 1-50 likes
-            'retweets': max(0, hash(tweet_text) % 15),  # 0-15 retweets
-            'replies': max(0, hash(tweet_text) % 8),   # 0-8 replies
-            'quotes': max(0, hash(tweet_text) % 5),    # 0-5 quotes
-            'bookmarks': max(0, hash(tweet_text) % 12), # 0-12 bookmarks
-            'impressions': max(100, hash(tweet_text) % 1000 + 100), # 100-1100 impressions
-            'engagement_rate': round(((hash(tweet_text) % 50) / max(100, hash(tweet_text) % 1000 + 100)) * 100, 2)
+            'likes': likes,  # 1-50 likes
+            'retweets': digest[3] % 15,  # 0-14 retweets
+            'replies': digest[4] % 8,   # 0-7 replies
+            'quotes': digest[5] % 5,    # 0-4 quotes
+            'bookmarks': digest[6] % 12, # 0-11 bookmarks
+            'impressions': impressions, # 100-1099 impressions
+            'engagement_rate': round(likes / impressions * 100, 2)
         })
         
         logger.info(f"✅ SIMULATED: Posted tweet {i+1}: {tweet_text[:60]}...")
-        time.sleep(1)  # Simulate delay
     
     return posted_tweets
 
@@ -47,8 +56,9 @@ def test_bot_pipeline():
     try:
         # 1. Test trend discovery
         logger.info("📊 Step 1: Discovering trends...")
-        patterns = get_trending_tweet_patterns()
-        hashtags = get_hashtag_trends()
+        trends = get_trends()
+        patterns = trends['patterns']
+        hashtags = trends['hashtags']
         
         print(f"\n🔥 Trending Patterns Found:")
         for i, pattern in enumerate(patterns, 1):
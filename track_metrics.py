@@ -1,12 +1,17 @@
-from utils.twitter_client import get_bearer_client
+from utils.limits import twitter_slots
 import logging
 import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def track_metrics(tweet_id, wait_minutes=5):
+# Twitter API v2 accepts up to 100 IDs per tweet lookup
+MAX_IDS_PER_LOOKUP = 100
+TWEET_FIELDS = ["public_metrics", "created_at", "context_annotations"]
+
+def track_metrics(tweet_id, wait_minutes=0):
     """Track metrics for a specific tweet"""
+    from utils.twitter_client import get_bearer_client
     client = get_bearer_client()
     if not client:
         logger.error("Failed to get Twitter client")
@@ -18,27 +23,68 @@ def track_metrics(tweet_id, wait_minutes=5):
         time.sleep(wait_minutes * 60)
     
     try:
-        response = client.get_tweet(
-            tweet_id, 
-            tweet_fields=["public_metrics", "created_at", "context_annotations"]
-        )
+        response = client.get_tweet(tweet_id, tweet_fields=TWEET_FIELDS)
         
         if response.data:
-            metrics = response.data.public_metrics
-            return {
-                "tweet_id": tweet_id,
-                "likes": metrics.get("like_count", 0),
-                "retweets": metrics.get("retweet_count", 0),
-                "replies": metrics.get("reply_count", 0),
-                "quotes": metrics.get("quote_count", 0),
-                "bookmarks": metrics.get("bookmark_count", 0),
-                "impressions": metrics.get("impression_count", 0),
-                "created_at": str(response.data.created_at),
-                "engagement_rate": calculate_engagement_rate(metrics)
-            }
+            return _metrics_from_tweet(tweet_id, response.data)
     except Exception as e:
         logger.error(f"Error tracking metrics for tweet {tweet_id}: {e}")
-        return {}
+    return {}
+
+def _metrics_from_tweet(tweet_id, tweet):
+    """Build the metrics dict for a tweet object returned by the API"""
+    metrics = tweet.public_metrics or {}
+    return {
+        "tweet_id": tweet_id,
+        "likes": metrics.get("like_count", 0),
+        "retweets": metrics.get("retweet_count", 0),
+        "replies": metrics.get("reply_count", 0),
+        "quotes": metrics.get("quote_count", 0),
+        "bookmarks": metrics.get("bookmark_count", 0),
+        "impressions": metrics.get("impression_count", 0),
+        "created_at": str(tweet.created_at),
+        "engagement_rate": calculate_engagement_rate(metrics)
+    }
+
+def fetch_metrics_batch(tweet_ids, credentials=None, account=None):
+    """Fetch metrics for many tweets using multi-ID lookups.
+
+    Returns a dict mapping every requested ID to the same metrics dict
+    track_metrics produces, or to {} when the tweet is missing, deleted or
+    its chunk failed.
+    """
+    tweet_ids = [str(tweet_id) for tweet_id in dict.fromkeys(tweet_ids)]
+    results = {tweet_id: {} for tweet_id in tweet_ids}
+    # Simulated IDs (sim_...) would make the whole chunk fail validation
+    tweet_ids = [tweet_id for tweet_id in tweet_ids if tweet_id.isdigit()]
+    if not tweet_ids:
+        return results
+    
+    from utils.twitter_client import get_bearer_client
+    client = get_bearer_client(credentials, account)
+    if not client:
+        logger.error("Failed to get Twitter client")
+        return results
+    
+    for start in range(0, len(tweet_ids), MAX_IDS_PER_LOOKUP):
+        chunk = tweet_ids[start:start + MAX_IDS_PER_LOOKUP]
+        try:
+            with twitter_slots:
+                response = client.get_tweets(ids=chunk, tweet_fields=TWEET_FIELDS)
+        except Exception as e:
+            logger.error(f"Error tracking metrics for {len(chunk)} tweets: {e}")
+            continue
+        
+        for tweet in response.data or []:
+            tweet_id = str(tweet.id)
+            if tweet_id in results:
+                results[tweet_id] = _metrics_from_tweet(tweet_id, tweet)
+        
+        for error in response.errors or []:
+            missing_id = error.get("resource_id") or error.get("value")
+            logger.warning(f"No metrics for tweet {missing_id}: {error.get('detail', error.get('title'))}")
+    
+    return results
 
 def calculate_engagement_rate(metrics):
     """Calculate engagement rate from public metrics"""
@@ -54,13 +100,7 @@ def calculate_engagement_rate(metrics):
         return round((total_engagements / impressions) * 100, 2)
     return 0
 
-def track_multiple_tweets(tweet_ids, wait_minutes=60):
+def track_multiple_tweets(tweet_ids, wait_minutes=0):
     """Track metrics for multiple tweets"""
-    all_metrics = []
-    
-    for tweet_id in tweet_ids:
-        metrics = track_metrics(tweet_id, wait_minutes=0)  # No wait for batch processing
-        if metrics:
-            all_metrics.append(metrics)
-    
-    return all_metrics
+    batch = fetch_metrics_batch(tweet_ids)
+    return [batch[str(tweet_id)] for tweet_id in tweet_ids if batch.get(str(tweet_id))]
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+from trend_discovery import get_trending_tweet_patterns, get_hashtag_trends
+from trend_sources import fetch_trends
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = os.getenv("TREND_CACHE_FILE", os.path.join(".cache", "trends.json"))
+# Trends younger than this are served as-is
+TREND_TTL_SECONDS = 60 * 60
+# Older trends are still served instantly while a background refresh runs
+TREND_MAX_STALE_SECONDS = 24 * 60 * 60
+# A cold miss waits this long for the fetch before serving older trends or the curated lists
+COLD_WAIT_SECONDS = float(os.getenv("TREND_COLD_WAIT_SECONDS", "5"))
+
+# How many ingested topics lead the pattern list; curated patterns fill the rest
+TOPIC_PATTERNS = 2
+
+def _default_source():
+    """Ingested topics and hashtags from trend_sources, topped up with the curated lists"""
+    ingested = fetch_trends()
+    patterns = get_trending_tweet_patterns()
+    hashtags = get_hashtag_trends()
+    topics = [f"Timely take on: {topic}" for topic in ingested["topics"][:TOPIC_PATTERNS]]
+    return {
+        "patterns": topics + patterns[:len(patterns) - len(topics)],
+        "hashtags": list(dict.fromkeys(ingested["hashtags"] + hashtags))[:len(hashtags)],
+    }
+
+def _curated_trends():
+    """The curated lists alone, served when nothing fetched is at hand"""
+    return {"patterns": get_trending_tweet_patterns(), "hashtags": get_hashtag_trends(), "fetched_at": None}
+
+def _name(source):
+    return f"{source.__module__}.{source.__qualname__}"
+
+_source = _default_source
+_source_name = _name(_default_source)
+_cache = {}
+_cache_lock = threading.Lock()
+# Set when the running refresh finishes; None while no refresh runs
+_refresh_done = None
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "cold_fallbacks": 0, "refreshes": 0, "refresh_errors": 0}
+
+def set_trend_source(source, name=None):
+    """Replace the trend source: a callable returning {'patterns': [...], 'hashtags': [...]}
+
+    Cached trends are keyed by `name` (the callable's qualified name by
+    default), so trends cached from another source are not served.
+    """
+    global _source, _source_name
+    with _cache_lock:
+        _source = source
+        _source_name = name or _name(source)
+        _cache.clear()
+
+def _load_disk_cache(source_name):
+    try:
+        with open(CACHE_FILE) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return entry if entry.get("source") == source_name else {}
+
+def _save_disk_cache(entry):
+    os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+    tmp_file = f"{CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_file, CACHE_FILE)
+
+def _fetch():
+    with _cache_lock:
+        source, source_name = _source, _source_name
+    trends = source()
+    entry = {"patterns": trends["patterns"], "hashtags": trends["hashtags"], "fetched_at": time.time(),
+             "source": source_name}
+    with _cache_lock:
+        if source_name != _source_name:
+            # The source was replaced while this fetch ran; its trends are not the current ones
+            return entry
+        _cache.clear()
+        _cache.update(entry)
+        _stats["refreshes"] += 1
+    _save_disk_cache(entry)
+    return entry
+
+def _refresh_in_background():
+    """Start a refresh unless one is running; returns an event set once the running refresh ends"""
+    global _refresh_done
+    with _cache_lock:
+        if _refresh_done is not None:
+            return _refresh_done
+        done = _refresh_done = threading.Event()
+
+    def refresh():
+        global _refresh_done
+        try:
+            _fetch()
+        except Exception as e:
+            logger.error(f"Background trend refresh failed: {e}")
+            with _cache_lock:
+                _stats["refresh_errors"] += 1
+        finally:
+            with _cache_lock:
+                _refresh_done = None
+            done.set()
+
+    threading.Thread(target=refresh, name="trend-refresh", daemon=True).start()
+    return done
+
+def get_trends(force_refresh=False):
+    """Return current trends as {'patterns', 'hashtags', 'fetched_at'}, from cache when possible
+
+    A cold miss waits up to COLD_WAIT_SECONDS for the fetch, then serves
+    trends older than TREND_MAX_STALE_SECONDS if there are any, or else the
+    curated lists (with `fetched_at` None), while the fetch carries on.
+    """
+    with _cache_lock:
+        entry, source_name = dict(_cache), _source_name
+    if not entry:
+        entry = _load_disk_cache(source_name)
+        if entry:
+            with _cache_lock:
+                if source_name == _source_name and not _cache:
+                    _cache.update(entry)
+
+    age = time.time() - entry["fetched_at"] if entry else None
+    if not force_refresh and age is not None:
+        if age < TREND_TTL_SECONDS:
+            with _cache_lock:
+                _stats["hits"] += 1
+            return entry
+        if age < TREND_MAX_STALE_SECONDS:
+            with _cache_lock:
+                _stats["stale_hits"] += 1
+            _refresh_in_background()
+            return entry
+
+    with _cache_lock:
+        _stats["misses"] += 1
+    if force_refresh:
+        return _fetch()
+    if _refresh_in_background().wait(COLD_WAIT_SECONDS):
+        with _cache_lock:
+            fetched = dict(_cache)
+        if fetched.get("fetched_at", 0) > entry.get("fetched_at", 0):
+            return fetched
+    with _cache_lock:
+        _stats["cold_fallbacks"] += 1
+    if entry:
+        logger.warning("Trend fetch is slow or failing; serving trends past their stale limit")
+        return entry
+    logger.warning("Trend fetch is slow or failing; serving the curated trends")
+    return _curated_trends()
+
+def get_cache_stats():
+    """Return trend cache hit/miss counters"""
+    with _cache_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 3) if lookups else 0
+    return stats
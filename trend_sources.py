@@ -0,0 +1,333 @@
+import codecs
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+from store import HASHTAG_PATTERN, load_state, save_state
+from utils.telemetry import span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A JSON list of sources, e.g.
+# [{"name": "hn", "url": "https://hnrss.org/frontpage", "format": "rss", "weight": 1.0},
+#  {"name": "reddit", "url": "https://www.reddit.com/r/technology/top.json", "format": "json",
+#   "items_path": "data.children", "title_field": "data.title"},
+#  {"name": "blog", "url": "fixtures/blog.html", "format": "html", "tags": ["h2"]}]
+# A URL without a scheme (or file://) is read from disk, which is how fixtures replace live feeds.
+SOURCES_FILE = os.getenv("TREND_SOURCES_FILE", "trend_sources.json")
+STATE_KEY = "trend_sources"
+FETCH_WORKERS = int(os.getenv("TREND_FETCH_WORKERS", "8"))
+REQUEST_TIMEOUT_SECONDS = 10
+CHUNK_BYTES = 16 * 1024
+# Parsing (and downloading) a source stops once this many items are read
+MAX_ITEMS_PER_SOURCE = 50
+# Titles sharing at least this fraction of their words are merged into one trend
+MERGE_SIMILARITY = 0.6
+USER_AGENT = "Mozilla/5.0 (compatible; TweetGenerator trend ingestion)"
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its new of on or the this to was what "
+    "when why will with you your".split()
+)
+
+_session = None
+_session_lock = threading.Lock()
+_state_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"fetched": 0, "not_modified": 0, "unchanged_files": 0, "errors": 0, "bytes": 0, "items": 0}
+
+def _count(**deltas):
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+def load_sources(path=None):
+    """Configured sources, or [] when there is no sources file"""
+    path = path or SOURCES_FILE
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        sources = json.load(f)
+    names = [source["name"] for source in sources]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate source names in {path}")
+    return sources
+
+def _get_session():
+    """One pooled session for every source, sized so concurrent fetches don't queue for connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.headers["User-Agent"] = USER_AGENT
+            adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+def _local_tag(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def parse_feed(chunks, max_items=MAX_ITEMS_PER_SOURCE):
+    """Yield {"title", "tags"} per RSS <item> or Atom <entry> as soon as it is complete"""
+    parser = ET.XMLPullParser(events=("end",))
+    count = 0
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            if _local_tag(element.tag) not in ("item", "entry"):
+                continue
+            title, tags = None, []
+            for child in element:
+                name = _local_tag(child.tag)
+                if name == "title":
+                    title = (child.text or "").strip()
+                elif name == "category":
+                    tags.append(child.get("term") or (child.text or "").strip())
+            # Drop the finished item so memory stays flat on long feeds
+            element.clear()
+            if title:
+                yield {"title": title, "tags": [tag for tag in tags if tag]}
+                count += 1
+                if count >= max_items:
+                    return
+
+class _HeadlineParser(HTMLParser):
+    """Collects the text inside the given tags, e.g. h2 headlines"""
+
+    def __init__(self, tags):
+        super().__init__()
+        self.tags = set(tags)
+        self.items = []
+        self._depth = 0
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.tags:
+            self._depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.tags and self._depth:
+            self._depth -= 1
+            if not self._depth:
+                title = " ".join("".join(self._text).split())
+                self._text = []
+                if title:
+                    self.items.append({"title": title, "tags": []})
+
+    def handle_data(self, data):
+        if self._depth:
+            self._text.append(data)
+
+def parse_html(chunks, tags=("h1", "h2", "h3"), max_items=MAX_ITEMS_PER_SOURCE):
+    """Yield headlines from an HTML page as the chunks arrive"""
+    parser = _HeadlineParser(tags)
+    # Incremental, so a character split across two chunks still decodes
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    count = 0
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            parser.feed(decoder.decode(b"", final=True))
+            parser.close()
+        else:
+            parser.feed(decoder.decode(chunk))
+        items, parser.items = parser.items, []
+        for item in items:
+            yield item
+            count += 1
+            if count >= max_items:
+                return
+
+def _lookup(value, path):
+    for key in path.split(".") if path else []:
+        if isinstance(value, list):
+            value = value[int(key)] if key.isdigit() and int(key) < len(value) else None
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+def parse_json(chunks, items_path="", title_field="title", tags_field=None, max_items=MAX_ITEMS_PER_SOURCE):
+    """Yield items from a JSON document; the document is decoded once it has fully arrived"""
+    document = json.loads(b"".join(chunks) or b"null")
+    for entry in (_lookup(document, items_path) or [])[:max_items]:
+        title = _lookup(entry, title_field) if isinstance(entry, (dict, list)) else entry
+        if not isinstance(title, str) or not title.strip():
+            continue
+        tags = _lookup(entry, tags_field) if tags_field else []
+        yield {"title": title.strip(), "tags": [tags] if isinstance(tags, str) else list(tags or [])}
+
+def _parse(source, chunks):
+    kind = source.get("format", "rss")
+    max_items = source.get("max_items", MAX_ITEMS_PER_SOURCE)
+    if kind == "rss":
+        return list(parse_feed(chunks, max_items))
+    if kind == "html":
+        return list(parse_html(chunks, source.get("tags", ("h1", "h2", "h3")), max_items))
+    if kind == "json":
+        return list(parse_json(chunks, source.get("items_path", ""), source.get("title_field", "title"),
+                               source.get("tags_field"), max_items))
+    raise ValueError(f"Unknown source format: {kind}")
+
+def _counted(chunks):
+    for chunk in chunks:
+        _count(bytes=len(chunk))
+        yield chunk
+
+def _local_path(url):
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return parsed.path
+    return url if not parsed.scheme else None
+
+def fetch_source(source, cached=None):
+    """Fetch and parse one source, reusing `cached` ({"etag", "last_modified", "items"}) when unchanged.
+
+    Returns the new cache entry; on errors the previous items are kept.
+    """
+    cached = cached or {}
+    url = source["url"]
+    path = _local_path(url)
+    try:
+        with span("trend_source", source=source["name"]):
+            if path is not None:
+                stat = os.stat(path)
+                version = f"{stat.st_mtime_ns}:{stat.st_size}"
+                if cached.get("etag") == version and "items" in cached:
+                    _count(unchanged_files=1)
+                    return cached
+                with open(path, "rb") as f:
+                    items = _parse(source, _counted(iter(lambda: f.read(CHUNK_BYTES), b"")))
+                _count(fetched=1, items=len(items))
+                return {"etag": version, "items": items, "fetched_at": time.time()}
+
+            headers = {}
+            if "items" in cached:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+            with _get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS, stream=True) as response:
+                if response.status_code == 304:
+                    _count(not_modified=1)
+                    return dict(cached, fetched_at=time.time())
+                response.raise_for_status()
+                # Parsing stops at max_items, and leaving the block drops the rest of the body
+                items = _parse(source, _counted(response.iter_content(CHUNK_BYTES)))
+                _count(fetched=1, items=len(items))
+                return {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "items": items,
+                    "fetched_at": time.time(),
+                }
+    except Exception as e:
+        logger.error(f"Error fetching trend source {source['name']}: {e}")
+        _count(errors=1)
+        return cached
+
+def _words(title):
+    return frozenset(word for word in _WORD_PATTERN.findall(title.lower()) if word not in _STOPWORDS)
+
+def _hashtag(tag):
+    """Turn a feed category such as "machine learning" into #MachineLearning"""
+    if tag.startswith("#"):
+        return tag
+    words = re.findall(r"[A-Za-z0-9]+", tag)
+    return "#" + "".join(word[:1].upper() + word[1:] for word in words) if words else None
+
+def rank_trends(items_by_source, weights=None, max_topics=10, max_hashtags=5):
+    """Merge items from every source into ranked, deduplicated topics and hashtags.
+
+    An item scores its source's weight discounted by its position in the
+    source; titles that share most of their words count as one trend, so a
+    story carried by several sources ranks above one carried by a single source.
+    """
+    weights = weights or {}
+    trends = []
+    # Exact repeats are found by their word set; otherwise a title is only
+    # compared with the trends sharing one of its words
+    by_words = {}
+    by_word = {}
+    hashtag_scores = {}
+    hashtag_names = {}
+    for name, items in items_by_source.items():
+        weight = weights.get(name, 1.0)
+        for position, item in enumerate(items):
+            score = weight / math.log2(position + 2)
+            words = _words(item["title"])
+            if not words:
+                continue
+            match = by_words.get(words)
+            if match is None:
+                shared = Counter(index for word in words for index in by_word.get(word, ()))
+                # Jaccard >= MERGE_SIMILARITY needs at least that fraction of this title's words in common
+                needed = MERGE_SIMILARITY * len(words)
+                for index in sorted(index for index, count in shared.items() if count >= needed):
+                    if len(words & trends[index]["words"]) / len(words | trends[index]["words"]) >= MERGE_SIMILARITY:
+                        match = index
+                        break
+            if match is not None:
+                trends[match]["score"] += score
+                trends[match]["sources"].add(name)
+            else:
+                by_words[words] = len(trends)
+                for word in words:
+                    by_word.setdefault(word, []).append(len(trends))
+                trends.append({"title": item["title"], "words": words, "score": score, "sources": {name}})
+            for tag in HASHTAG_PATTERN.findall(item["title"]) + [_hashtag(t) for t in item.get("tags", [])]:
+                if tag:
+                    key = tag.lower()
+                    hashtag_scores[key] = hashtag_scores.get(key, 0.0) + score
+                    hashtag_names.setdefault(key, tag)
+
+    trends.sort(key=lambda trend: (-len(trend["sources"]), -trend["score"]))
+    hashtags = sorted(hashtag_scores, key=lambda key: -hashtag_scores[key])
+    return {
+        "topics": [trend["title"] for trend in trends[:max_topics]],
+        "hashtags": [hashtag_names[key] for key in hashtags[:max_hashtags]],
+    }
+
+def fetch_trends(sources=None, max_topics=10, max_hashtags=5, workers=FETCH_WORKERS):
+    """Fetch every source concurrently (conditionally where possible) and rank what they carry.
+
+    Returns {"topics": [...], "hashtags": [...]}, both empty when no sources are configured.
+    """
+    sources = sources if sources is not None else load_sources()
+    if not sources:
+        return {"topics": [], "hashtags": []}
+
+    with _state_lock:
+        state = load_state(STATE_KEY, {})
+    with ThreadPoolExecutor(max_workers=min(workers, len(sources)), thread_name_prefix="trend-source") as executor:
+        entries = list(executor.map(lambda source: fetch_source(source, state.get(source["name"])), sources))
+    with _state_lock:
+        state = load_state(STATE_KEY, {})
+        state.update({source["name"]: entry for source, entry in zip(sources, entries) if entry})
+        save_state(STATE_KEY, state)
+
+    items_by_source = {source["name"]: entry.get("items", []) for source, entry in zip(sources, entries) if entry}
+    weights = {source["name"]: source.get("weight", 1.0) for source in sources}
+    trends = rank_trends(items_by_source, weights, max_topics, max_hashtags)
+    logger.info(f"Ingested {sum(map(len, items_by_source.values()))} items from {len(sources)} trend sources; "
+                f"top topics: {trends['topics'][:3]}")
+    return trends
+
+def get_source_stats():
+    """Fetch counters: downloads, 304s, unchanged local files, errors, bytes and items parsed"""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,168 @@
+import re
+import unicodedata
+
+# Twitter's weighted length rules (twitter-text v3 config)
+MAX_TWEET_LENGTH = 280
+URL_LENGTH = 23
+# Code point ranges that count as one character; everything else counts as two
+_LIGHT_RANGES = ((0, 4351), (8192, 8205), (8208, 8223), (8242, 8247))
+
+# Generic TLDs a bare domain may end in; any two-letter TLD is taken as a country code
+GENERIC_TLDS = frozenset((
+    "com net org edu gov mil int info biz name pro aero asia cat coop jobs museum tel travel mobi "
+    "app dev blog shop store online site tech xyz club news page cloud live world link"
+).split())
+# A URL as twitter-text finds one: an optional protocol, a host ending in a TLD, a port and a path
+URL_PATTERN = re.compile(
+    r"(?<![a-z0-9@$#\uff20\uff03])(?P<protocol>https?://)?"
+    r"(?P<host>(?:[a-z0-9](?:[a-z0-9_-]*[a-z0-9])?\.)+(?P<tld>[a-z]{2,}))(?![a-z0-9_-])"
+    r"(?::\d+)?(?P<path>[/?#][^\s]*)?",
+    re.IGNORECASE,
+)
+# A URL's path must end in one of these (or a balanced closing parenthesis); anything after is punctuation
+_PATH_END = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789=_#/-+&")
+
+_ZWJ = 0x200D
+_KEYCAP = 0x20E3
+
+def _is_light(cp):
+    for low, high in _LIGHT_RANGES:
+        if low <= cp <= high:
+            return True
+    return False
+
+def _is_extender(cp):
+    """Code points that attach to the previous character"""
+    return (
+        0xFE00 <= cp <= 0xFE0F            # variation selectors
+        or 0x1F3FB <= cp <= 0x1F3FF       # skin tone modifiers
+        or 0xE0020 <= cp <= 0xE007F       # emoji tag sequences
+        or cp == _KEYCAP
+        or unicodedata.category(chr(cp)) in ("Mn", "Me", "Mc")
+    )
+
+def _is_regional_indicator(cp):
+    return 0x1F1E6 <= cp <= 0x1F1FF
+
+def _is_emoji(cp):
+    return (
+        0x1F000 <= cp <= 0x1FAFF
+        or 0x2600 <= cp <= 0x27BF
+        or 0x2300 <= cp <= 0x23FF
+        or 0x2B00 <= cp <= 0x2BFF
+    )
+
+def graphemes(text):
+    """Split text into user-perceived characters (combining marks, emoji ZWJ sequences, flags)"""
+    clusters = []
+    i = 0
+    n = len(text)
+    while i < n:
+        start = i
+        cp = ord(text[i])
+        i += 1
+        if _is_regional_indicator(cp) and i < n and _is_regional_indicator(ord(text[i])):
+            i += 1
+        while i < n:
+            nxt = ord(text[i])
+            if _is_extender(nxt):
+                i += 1
+            elif nxt == _ZWJ:
+                i += 2 if i + 1 < n else 1
+            else:
+                break
+        clusters.append(text[start:i])
+    return clusters
+
+def _cluster_weight(cluster):
+    if len(cluster) > 1 and any(_is_emoji(ord(c)) or _is_regional_indicator(ord(c)) for c in cluster):
+        # An emoji sequence counts as a single emoji, whatever it is built from
+        return 2
+    if _is_emoji(ord(cluster[0])) or _is_regional_indicator(ord(cluster[0])):
+        return 2
+    return sum(1 if _is_light(ord(c)) else 2 for c in cluster)
+
+def _plain_weight(text):
+    if text.isascii():
+        return len(text)
+    return sum(_cluster_weight(cluster) for cluster in graphemes(text))
+
+def _trim_path(path):
+    while path and path[-1] not in _PATH_END:
+        if path[-1] == ")" and path.count("(") >= path.count(")"):
+            break
+        path = path[:-1]
+    return path
+
+def url_spans(text):
+    """(start, end) of each URL Twitter would shorten, trailing punctuation excluded"""
+    spans = []
+    for match in URL_PATTERN.finditer(text):
+        raw_path = match.group("path") or ""
+        path = _trim_path(raw_path)
+        if not match.group("protocol"):
+            tld = match.group("tld").lower()
+            if tld not in GENERIC_TLDS and len(tld) != 2:
+                continue
+            if match.start() and text[match.start() - 1] in "-_./":
+                continue
+            # A bare country-code domain like bit.ly only counts with a path
+            if len(tld) == 2 and match.group("host").count(".") == 1 and not path.strip("/?#"):
+                continue
+        spans.append((match.start(), match.end() - len(raw_path) + len(path)))
+    return spans
+
+def weighted_length(text):
+    """Length as Twitter counts it: URLs are 23, emoji and CJK count double"""
+    text = unicodedata.normalize("NFC", text)
+    if text.isascii() and "." not in text:
+        return len(text)
+    length = 0
+    position = 0
+    for start, end in url_spans(text):
+        length += _plain_weight(text[position:start]) + URL_LENGTH
+        position = end
+    return length + _plain_weight(text[position:])
+
+def is_valid_length(text, limit=MAX_TWEET_LENGTH):
+    return 0 < weighted_length(text) <= limit
+
+def validate_batch(texts, min_length=1, limit=MAX_TWEET_LENGTH):
+    """Weighted lengths and validity for many texts at once; returns (lengths, valid)"""
+    lengths = [weighted_length(text) for text in texts]
+    valid = [min_length <= length <= limit for length in lengths]
+    return lengths, valid
+
+def truncate(text, limit=MAX_TWEET_LENGTH, ellipsis="..."):
+    """Shorten text to fit the weighted limit without splitting a character, word, hashtag or URL"""
+    text = unicodedata.normalize("NFC", text)
+    if weighted_length(text) <= limit:
+        return text
+
+    budget = limit - weighted_length(ellipsis)
+    # Tokens are URLs, whitespace runs and words, so cuts only fall between them
+    tokens = re.findall(r"(?:https?://|www\.)[^\s]+|\s+|[^\s]+", text, re.IGNORECASE)
+    kept = []
+    used = 0
+    for token in tokens:
+        weight = weighted_length(token)
+        if used + weight > budget:
+            if not kept:
+                # A single overlong word: fall back to a grapheme boundary
+                for cluster in graphemes(token):
+                    cluster_weight = _cluster_weight(cluster)
+                    if used + cluster_weight > budget:
+                        break
+                    kept.append(cluster)
+                    used += cluster_weight
+            break
+        kept.append(token)
+        used += weight
+    return "".join(kept).rstrip() + ellipsis
+
+def append_hashtag(text, hashtag, limit=MAX_TWEET_LENGTH):
+    """Append a hashtag only if the tweet stays within the weighted limit and doesn't already have it"""
+    if not hashtag or hashtag.lower() in text.lower().split():
+        return text
+    candidate = f"{text} {hashtag}"
+    return candidate if weighted_length(candidate) <= limit else text
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+import config
+from utils.limits import gemini_slots, GEMINI_CONCURRENCY
+from utils.rate_budget import budget, GEMINI_SCOPE, GEMINI_ENDPOINT
+from utils.telemetry import span, observe
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-1.5-flash"
+# Point at a local stand-in (see benchmarks/fake_gemini.py) instead of the real API
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+REQUEST_TIMEOUT_SECONDS = 60
+
+TRANSIENT_ERROR_NAMES = {
+    "ServiceUnavailable", "ResourceExhausted", "DeadlineExceeded",
+    "InternalServerError", "TooManyRequests", "GatewayTimeout",
+}
+
+class TransientGeminiError(Exception):
+    """A Gemini failure worth retrying (rate limit, 5xx, timeout)"""
+
+def is_transient(error):
+    import requests
+    return isinstance(error, (TransientGeminiError, requests.ConnectionError, requests.Timeout,
+                              asyncio.TimeoutError)) or type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+# The SDK and HTTP session are only built when a call needs them, keeping imports cheap
+_model = None
+_session = None
+_model_lock = threading.Lock()
+
+def _get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            import google.generativeai as genai
+            api_key, = config.require("GEMINI_KEY")
+            genai.configure(api_key=api_key)
+            _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+def _get_session():
+    global _session
+    with _model_lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+    return _session
+
+def _rest_generate(prompt, base_url):
+    """Call the generateContent REST endpoint directly (used for local stand-ins)"""
+    response = _get_session().post(
+        f"{base_url.rstrip('/')}/v1beta/models/{MODEL_NAME}:generateContent",
+        params={"key": config.GEMINI_KEY or ""},
+        json={"contents": [{"parts": [{"text": prompt}]}]},
+        timeout=REQUEST_TIMEOUT_SECONDS
+    )
+    if response.status_code == 429 or response.status_code >= 500:
+        raise TransientGeminiError(f"Gemini returned HTTP {response.status_code}")
+    response.raise_for_status()
+    candidates = response.json().get("candidates") or []
+    if not candidates:
+        raise ValueError("Gemini returned no candidates")
+    return "".join(part.get("text", "") for part in candidates[0]["content"]["parts"])
+
+def _rest_stream(prompt, base_url):
+    """Stream generateContent chunks over server-sent events"""
+    with _get_session().post(
+        f"{base_url.rstrip('/')}/v1beta/models/{MODEL_NAME}:streamGenerateContent",
+        params={"key": config.GEMINI_KEY or "", "alt": "sse"},
+        json={"contents": [{"parts": [{"text": prompt}]}]},
+        timeout=REQUEST_TIMEOUT_SECONDS,
+        stream=True
+    ) as response:
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientGeminiError(f"Gemini returned HTTP {response.status_code}")
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            chunk = json.loads(line[len("data:"):])
+            for candidate in chunk.get("candidates") or []:
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+def _pace():
+    wait = budget.reserve(GEMINI_SCOPE, GEMINI_ENDPOINT)
+    observe("rate_wait_seconds", wait, scope=GEMINI_SCOPE)
+    time.sleep(wait)
+
+def stream_text(prompt):
+    """Yield the response text in chunks as Gemini produces it"""
+    # Pace to the requests-per-minute budget before taking a concurrency slot
+    _pace()
+    with gemini_slots, span("gemini", mode="stream"):
+        if GEMINI_BASE_URL:
+            yield from _rest_stream(prompt, GEMINI_BASE_URL)
+            return
+        for chunk in _get_model().generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+def generate_text(prompt):
+    """Blocking single generation, capped by the process-wide Gemini limit"""
+    _pace()
+    with gemini_slots, span("gemini", mode="sync"):
+        if GEMINI_BASE_URL:
+            return _rest_generate(prompt, GEMINI_BASE_URL)
+        return _get_model().generate_content(prompt).text
+
+def _generate_in_slot(prompt, base_url):
+    """Blocking generation inside a process-wide slot; returns (text, seconds spent generating)
+
+    Async calls run this in a worker thread, so the slot is held for exactly
+    as long as the request, even when the awaiting task is cancelled.
+    """
+    with gemini_slots:
+        start = time.perf_counter()
+        if base_url:
+            text = _rest_generate(prompt, base_url)
+        else:
+            text = _get_model().generate_content(prompt).text
+        return text, time.perf_counter() - start
+
+class AsyncGeminiClient:
+    """Issue many Gemini prompts concurrently with retries and optional hedged requests.
+
+    A hedge is a duplicate request sent when the first one has been running
+    longer than the observed p95 latency; whichever finishes first wins.
+    """
+
+    def __init__(self, concurrency=GEMINI_CONCURRENCY, max_retries=3, backoff_seconds=0.5,
+                 hedge=False, hedge_min_samples=20, base_url=GEMINI_BASE_URL):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.base_url = base_url
+        self.latencies = deque(maxlen=1000)
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+        self._semaphore = None
+
+    async def _call(self, prompt):
+        wait = budget.reserve(GEMINI_SCOPE, GEMINI_ENDPOINT)
+        observe("rate_wait_seconds", wait, scope=GEMINI_SCOPE)
+        if wait:
+            await asyncio.sleep(wait)
+        with span("gemini", mode="async"):
+            text, latency = await asyncio.to_thread(_generate_in_slot, prompt, self.base_url)
+        self.latencies.append(latency)
+        self.stats["requests"] += 1
+        return text
+
+    def _hedge_delay(self):
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self.latency_percentiles()["p95"]
+
+    async def _call_hedged(self, prompt):
+        delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self._call(prompt))
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.stats["hedges"] += 1
+        hedge = asyncio.ensure_future(self._call(prompt))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is hedge:
+                        self.stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def generate(self, prompt):
+        """Generate text for one prompt, retrying transient errors with jittered backoff"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await self._call_hedged(prompt)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_transient(e):
+                        self.stats["failures"] += 1
+                        raise
+                    self.stats["retries"] += 1
+                    # Full jitter keeps concurrent retries from arriving together
+                    delay = random.uniform(0, self.backoff_seconds * 2 ** attempt)
+                    logger.warning(f"Transient Gemini error ({e}); retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+    async def generate_many(self, prompts):
+        """Generate all prompts concurrently; failed prompts come back as exceptions"""
+        return await asyncio.gather(*(self.generate(prompt) for prompt in prompts), return_exceptions=True)
+
+    def latency_percentiles(self):
+        """p50/p95/p99 latency in seconds over the most recent requests"""
+        if not self.latencies:
+            return {"p50": 0, "p95": 0, "p99": 0}
+        ordered = sorted(self.latencies)
+
+        def pick(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        return {"p50": round(pick(0.50), 4), "p95": round(pick(0.95), 4), "p99": round(pick(0.99), 4)}
@@ -0,0 +1,9 @@
+import os
+import threading
+
+# Process-wide caps on concurrent external calls, shared by every account worker
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+TWITTER_CONCURRENCY = int(os.getenv("TWITTER_CONCURRENCY", "8"))
+
+gemini_slots = threading.BoundedSemaphore(GEMINI_CONCURRENCY)
+twitter_slots = threading.BoundedSemaphore(TWITTER_CONCURRENCY)
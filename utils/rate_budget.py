@@ -0,0 +1,245 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 15 * 60
+DAY_SECONDS = 24 * 60 * 60
+# Starting limits per endpoint until the API reports its own in x-rate-limit-* headers
+ENDPOINT_LIMITS = {
+    "POST /2/tweets": (int(os.getenv("TWITTER_POST_LIMIT", "100")), WINDOW_SECONDS),
+    "GET /2/tweets": (int(os.getenv("TWITTER_LOOKUP_LIMIT", "300")), WINDOW_SECONDS),
+    "GET /2/tweets/:id": (int(os.getenv("TWITTER_LOOKUP_LIMIT", "300")), WINDOW_SECONDS),
+    "GET /2/users/me": (75, WINDOW_SECONDS),
+    "gemini": (int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15")), 60),
+}
+POST_ENDPOINT = "POST /2/tweets"
+LOOKUP_ENDPOINT = "GET /2/tweets"
+GEMINI_ENDPOINT = "gemini"
+GEMINI_SCOPE = "gemini"
+
+_ID_SEGMENT = re.compile(r"(?<!^)/\d+(?=/|$)")
+
+class RateBudgetExceeded(Exception):
+    """A call was refused locally because its budget is spent; retry_after says for how long"""
+
+    def __init__(self, scope, endpoint, retry_after):
+        super().__init__(f"{endpoint} budget for {scope} exhausted; retry in {retry_after:.0f}s")
+        self.scope = scope
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+def endpoint_key(method, route):
+    """Normalize a request to its rate-limit bucket, e.g. GET /2/tweets/123 -> GET /2/tweets/:id"""
+    return f"{method.upper()} {_ID_SEGMENT.sub('/:id', route.split('?')[0])}"
+
+class TokenBucket:
+    """Token bucket that refills continuously until the API reports the real window.
+
+    Once x-rate-limit headers are seen, `remaining` is taken as-is and the
+    bucket refills completely at the reported reset time, matching Twitter's
+    fixed 15-minute windows.
+    """
+
+    def __init__(self, limit, window_seconds):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.tokens = float(limit)
+        self.reset_at = None
+        self.updated_at = time.time()
+        self.taken = 0
+        self.denied = 0
+
+    def _refill(self, now):
+        if self.reset_at is not None:
+            if now >= self.reset_at:
+                self.tokens = float(self.limit)
+                self.reset_at = None
+        else:
+            rate = self.limit / self.window_seconds
+            # A check planned for a later time must not drain the bucket for calls made now
+            self.tokens = min(self.limit, self.tokens + max(0.0, now - self.updated_at) * rate)
+        self.updated_at = max(self.updated_at, now)
+
+    def time_until(self, count=1, now=None):
+        now = now or time.time()
+        self._refill(now)
+        if self.tokens >= count:
+            return 0.0
+        if self.reset_at is not None:
+            return self.reset_at - now
+        return (count - self.tokens) * self.window_seconds / self.limit
+
+    def take(self, count=1, now=None):
+        """Take tokens if available; returns False without taking any otherwise"""
+        if self.time_until(count, now) > 0:
+            self.denied += 1
+            return False
+        self.tokens -= count
+        self.taken += count
+        return True
+
+    def reserve(self, count=1, now=None):
+        """Take tokens now, going into debt if needed; returns how long to wait before using them"""
+        wait = self.time_until(count, now)
+        self.tokens -= count
+        self.taken += count
+        return wait
+
+    def observe(self, limit, remaining, reset_at, now=None):
+        """Adopt the limits the API reported for the current window"""
+        now = now or time.time()
+        self.limit = limit
+        self.tokens = float(remaining)
+        self.reset_at = reset_at if reset_at and reset_at > now else None
+        self.updated_at = now
+
+    def stats(self, now=None):
+        now = now or time.time()
+        self._refill(now)
+        return {
+            "limit": self.limit,
+            "remaining": max(0, int(self.tokens)),
+            "reset_in": round(self.reset_at - now, 1) if self.reset_at else None,
+            "taken": self.taken,
+            "denied": self.denied,
+        }
+
+class RateBudget:
+    """Token buckets per (scope, endpoint) plus a rolling daily post cap per account.
+
+    A scope is an account name for Twitter calls and GEMINI_SCOPE for Gemini.
+    Nothing here blocks: callers ask time_until() and plan around it. The
+    buckets and the daily post log live in this process only; the log is
+    seeded from stored posts the first time an account is checked, so posts
+    made later by other processes are not counted against this one's cap.
+    """
+
+    def __init__(self, limits=None, max_posts_per_day=None, post_history=None):
+        self.limits = dict(limits or ENDPOINT_LIMITS)
+        self.max_posts_per_day = max_posts_per_day
+        # post_history(scope) -> posting timestamps, seeds an account's daily log on first use
+        self.post_history = post_history
+        self._buckets = {}
+        self._posts = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, scope, endpoint):
+        key = (scope, endpoint)
+        bucket = self._buckets.get(key)
+        if bucket is None and endpoint in self.limits:
+            bucket = TokenBucket(*self.limits[endpoint])
+            self._buckets[key] = bucket
+        return bucket
+
+    def _daily_cap(self):
+        if self.max_posts_per_day is None:
+            from config import MAX_TWEETS_PER_DAY
+            self.max_posts_per_day = MAX_TWEETS_PER_DAY
+        return self.max_posts_per_day
+
+    def _post_log(self, scope, now, history=None):
+        log = self._posts.get(scope)
+        if log is None:
+            if history is None and self.post_history:
+                history = lambda: self.post_history(scope)
+            log = deque(sorted(t for t in (history() if history else []) if now - t < DAY_SECONDS))
+            self._posts[scope] = log
+        while log and now - log[0] >= DAY_SECONDS:
+            log.popleft()
+        return log
+
+    def _wait(self, scope, endpoint, count, now, post_history=None):
+        bucket = self._bucket(scope, endpoint)
+        wait = bucket.time_until(count, now) if bucket else 0.0
+        if endpoint == POST_ENDPOINT:
+            log = self._post_log(scope, now, post_history)
+            cap = self._daily_cap()
+            if len(log) + count > cap:
+                # Wait until enough of the oldest posts leave the 24-hour window
+                wait = max(wait, log[len(log) + count - cap - 1] + DAY_SECONDS - now)
+        return max(0.0, wait)
+
+    def time_until(self, scope, endpoint, count=1, now=None, post_history=None):
+        """Seconds until `count` calls to the endpoint fit the budget; 0 means go ahead.
+
+        `post_history` is called once per account to seed the daily cap with
+        posts made before this process started, in place of the budget's own.
+        """
+        now = now or time.time()
+        with self._lock:
+            return self._wait(scope, endpoint, count, now, post_history)
+
+    def take(self, scope, endpoint, count=1, now=None):
+        """Spend budget for a call; raises RateBudgetExceeded if it isn't there"""
+        now = now or time.time()
+        with self._lock:
+            wait = self._wait(scope, endpoint, count, now)
+            bucket = self._bucket(scope, endpoint)
+            if wait > 0:
+                if bucket:
+                    bucket.denied += 1
+                raise RateBudgetExceeded(scope, endpoint, wait)
+            if bucket:
+                bucket.take(count, now)
+
+    def record_post(self, scope, now=None):
+        """Count a successful post against the account's daily cap"""
+        now = now or time.time()
+        with self._lock:
+            self._post_log(scope, now).append(now)
+
+    def reserve(self, scope, endpoint, count=1, now=None):
+        """Spend budget even if that means waiting; returns the seconds to wait first"""
+        with self._lock:
+            bucket = self._bucket(scope, endpoint)
+            return max(0.0, bucket.reserve(count, now)) if bucket else 0.0
+
+    def observe(self, scope, endpoint, headers, now=None):
+        """Update a bucket from x-rate-limit-limit / -remaining / -reset response headers"""
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset_at = float(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            bucket = self._buckets.get((scope, endpoint))
+            if bucket is None:
+                bucket = TokenBucket(limit, WINDOW_SECONDS)
+                self._buckets[(scope, endpoint)] = bucket
+            bucket.observe(limit, remaining, reset_at, now)
+
+    def posts_remaining(self, scope, now=None):
+        now = now or time.time()
+        with self._lock:
+            return max(0, self._daily_cap() - len(self._post_log(scope, now)))
+
+    def stats(self):
+        """Remaining budget and counters per scope and endpoint"""
+        now = time.time()
+        with self._lock:
+            stats = {f"{scope} {endpoint}": bucket.stats(now)
+                     for (scope, endpoint), bucket in self._buckets.items()}
+            for scope in list(self._posts):
+                stats[f"{scope} daily posts"] = {
+                    "limit": self._daily_cap(),
+                    "remaining": max(0, self._daily_cap() - len(self._post_log(scope, now))),
+                }
+        return stats
+
+def stored_post_times(scope):
+    """Timestamps of an account's posts in the last day, from the store"""
+    from store import get_recent_tweets
+    return [tweet["posted_at"] for tweet in get_recent_tweets(days=1, account=scope)]
+
+# Shared by every client and worker in the process
+budget = RateBudget(post_history=stored_post_times)
+
+def get_budget_stats():
+    return budget.stats()
@@ -0,0 +1,191 @@
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") != "0"
+# Serve /metrics on this port, and/or rewrite this file after each run
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_FILE = os.getenv("METRICS_FILE")
+PREFIX = "tweetbot"
+# Latency buckets in seconds, from a fast cache hit to a slow Gemini call
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def observe(name, value, **labels):
+    """Record a value (seconds) in the named histogram"""
+    if not TELEMETRY_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+def inc(name, value=1, **labels):
+    """Add to the named counter"""
+    if not TELEMETRY_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+class Span:
+    """Times a block (or a function, as a decorator) into span_seconds{span=...}.
+
+    Also counts calls and, when the block raises, errors by exception type.
+    """
+
+    __slots__ = ("name", "labels", "_start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not TELEMETRY_ENABLED:
+            return False
+        elapsed = time.perf_counter() - self._start
+        labels = dict(self.labels, span=self.name)
+        label_key = tuple(sorted(labels.items()))
+        # One lock round-trip for the histogram and the call counter
+        with _lock:
+            histogram = _histograms.get(("span_seconds", label_key))
+            if histogram is None:
+                histogram = _histograms[("span_seconds", label_key)] = Histogram()
+            histogram.observe(elapsed)
+            _counters[("span_calls_total", label_key)] = _counters.get(("span_calls_total", label_key), 0) + 1
+        # A generator closed early by its consumer is not a failure
+        if exc_type is not None and exc_type is not GeneratorExit:
+            inc("span_errors_total", error=exc_type.__name__, **labels)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(self.name, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+def span(name, **labels):
+    """with span("stage", stage="generate"): ... or @span("gemini") on a function"""
+    return Span(name, labels)
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {PREFIX}_{name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{PREFIX}_{name}{_format_labels(labels)} {value}")
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {PREFIX}_{name} histogram")
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{PREFIX}_{name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{PREFIX}_{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{PREFIX}_{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+def get_span_summary():
+    """{span label string: {"calls", "total_seconds", "mean_seconds"}} for logging"""
+    with _lock:
+        items = [(labels, h.count, h.sum) for (name, labels), h in _histograms.items() if name == "span_seconds"]
+    return {
+        ",".join(f"{k}={v}" for k, v in labels): {
+            "calls": count, "total_seconds": round(total, 3), "mean_seconds": round(total / count, 4)
+        }
+        for labels, count, total in sorted(items)
+    }
+
+def write_metrics_file(path=None):
+    """Atomically rewrite the metrics file (for node_exporter's textfile collector)"""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    try:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(render_prometheus())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Could not write metrics file {path}: {e}")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=None):
+    """Serve /metrics from a daemon thread; returns the server, or None if no port is configured"""
+    port = port if port is not None else METRICS_PORT
+    if port is None:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    logger.info(f"Serving metrics on http://0.0.0.0:{server.server_port}/metrics")
+    return server
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
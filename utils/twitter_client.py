@@ -1,48 +1,183 @@
 import tweepy
 import os
 import logging
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
+import time
+from requests.adapters import HTTPAdapter
+import config
+from accounts import DEFAULT_ACCOUNT, CREDENTIAL_ENV_VARS
+from utils.limits import twitter_slots
+from utils.rate_budget import budget, endpoint_key, POST_ENDPOINT, RateBudgetExceeded
+from utils.telemetry import span, inc
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_twitter_client():
+# How long a successful credential check stays valid before we re-verify
+VERIFY_TTL_SECONDS = 60 * 60
+TWITTER_API_URL = "https://api.twitter.com"
+# Point v2 clients at a local stand-in (see benchmarks/fake_twitter.py) instead of the real API
+TWITTER_BASE_URL = os.getenv("TWITTER_BASE_URL")
+
+# One client per (kind, credential set), reused for the life of the process so
+# the underlying requests.Session keeps its connection pool warm.
+_clients = {}
+_clients_lock = threading.Lock()
+_stats = {
+    "clients_built": 0,
+    "client_reuses": 0,
+    "verifications": 0,
+    "calls_saved": 0,
+}
+
+def _default_credentials():
+    """Credentials for the account configured through environment variables"""
+    return dict(zip(CREDENTIAL_ENV_VARS, config.require(*CREDENTIAL_ENV_VARS.values())))
+
+class _RedirectAdapter(HTTPAdapter):
+    """Sends requests for the Twitter API host to another base URL"""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, request, **kwargs):
+        request.url = self.base_url + request.url[len(TWITTER_API_URL):]
+        return super().send(request, **kwargs)
+
+class BudgetedClient(tweepy.Client):
+    """tweepy v2 client that spends the shared rate budget instead of sleeping on 429s.
+
+    Calls over budget raise RateBudgetExceeded before reaching the API, and
+    every response's x-rate-limit headers update the account's buckets.
+    """
+
+    def __init__(self, *args, account=DEFAULT_ACCOUNT, **kwargs):
+        super().__init__(*args, wait_on_rate_limit=False, **kwargs)
+        self.account = account
+        if TWITTER_BASE_URL:
+            self.session.mount(TWITTER_API_URL, _RedirectAdapter(TWITTER_BASE_URL))
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        endpoint = endpoint_key(method, route)
+        try:
+            budget.take(self.account, endpoint)
+        except RateBudgetExceeded:
+            inc("rate_budget_denied_total", endpoint=endpoint)
+            raise
+        try:
+            with span("twitter", endpoint=endpoint):
+                response = super().request(method, route, params=params, json=json, user_auth=user_auth)
+        except tweepy.HTTPException as e:
+            budget.observe(self.account, endpoint, e.response.headers)
+            raise
+        budget.observe(self.account, endpoint, response.headers)
+        if endpoint == POST_ENDPOINT:
+            budget.record_post(self.account)
+        return response
+
+def _credential_key(kind, credentials):
+    return (kind,) + tuple(sorted((k, v or "") for k, v in credentials.items()))
+
+def _build_v1_client(credentials, account=DEFAULT_ACCOUNT):
+    auth = tweepy.OAuth1UserHandler(
+        consumer_key=credentials.get("consumer_key"),
+        consumer_secret=credentials.get("consumer_secret"),
+        access_token=credentials.get("access_token"),
+        access_token_secret=credentials.get("access_token_secret")
+    )
+    return tweepy.API(auth, wait_on_rate_limit=False)
+
+def _build_v2_client(credentials, account=DEFAULT_ACCOUNT):
+    return BudgetedClient(
+        bearer_token=credentials.get("bearer_token"),
+        consumer_key=credentials.get("consumer_key"),
+        consumer_secret=credentials.get("consumer_secret"),
+        access_token=credentials.get("access_token"),
+        access_token_secret=credentials.get("access_token_secret"),
+        account=account
+    )
+
+def _verify_v1_client(api):
+    with twitter_slots:
+        api.verify_credentials()
+    logger.info("Twitter API v1.1 authentication successful")
+
+def _verify_v2_client(client):
+    with twitter_slots:
+        me = client.get_me()
+    logger.info(f"Twitter API v2 authentication successful for user: {me.data.username}")
+
+_CLIENT_KINDS = {
+    "v1": (_build_v1_client, _verify_v1_client),
+    "v2": (_build_v2_client, _verify_v2_client),
+}
+
+def _get_client(kind, credentials=None, account=None):
+    """Return the pooled client for a credential set, verifying it at most once per TTL"""
+    credentials = credentials or _default_credentials()
+    account = account or DEFAULT_ACCOUNT
+    key = _credential_key(kind, credentials)
+    build, verify = _CLIENT_KINDS[kind]
+
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is None:
+            entry = {"client": build(credentials, account), "verified_at": None, "lock": threading.Lock()}
+            _clients[key] = entry
+            _stats["clients_built"] += 1
+        else:
+            _stats["client_reuses"] += 1
+
+    # Verify under the entry's own lock so accounts don't wait on each other
+    with entry["lock"]:
+        verified_at = entry["verified_at"]
+        if verified_at is not None and time.time() - verified_at < VERIFY_TTL_SECONDS:
+            with _clients_lock:
+                _stats["calls_saved"] += 1
+            return entry["client"]
+
+        try:
+            verify(entry["client"])
+        except Exception:
+            # Drop the entry so the next call starts from a fresh client
+            with _clients_lock:
+                if _clients.get(key) is entry:
+                    del _clients[key]
+            raise
+        entry["verified_at"] = time.time()
+        with _clients_lock:
+            _stats["verifications"] += 1
+        return entry["client"]
+
+def get_twitter_client(credentials=None, account=None):
     """Get Twitter API v1.1 client for posting tweets"""
     try:
-        auth = tweepy.OAuth1UserHandler(
-            consumer_key=os.getenv("TWITTER_API_KEY"),
-            consumer_secret=os.getenv("TWITTER_API_SECRET"),
-            access_token=os.getenv("TWITTER_ACCESS_TOKEN"),
-            access_token_secret=os.getenv("TWITTER_ACCESS_SECRET")
-        )
-        api = tweepy.API(auth, wait_on_rate_limit=True)
-        
-        # Verify credentials
-        api.verify_credentials()
-        logger.info("Twitter API v1.1 authentication successful")
-        return api
+        return _get_client("v1", credentials, account)
     except Exception as e:
         logger.error(f"Twitter API v1.1 authentication failed: {e}")
         return None
 
-def get_bearer_client():
-    """Get Twitter API v2 client for advanced features"""
+def get_bearer_client(credentials=None, account=None):
+    """Get Twitter API v2 client for advanced features; `account` names its rate budget"""
     try:
-        client = tweepy.Client(
-            bearer_token=os.getenv("BEARER_TOKEN"),
-            consumer_key=os.getenv("TWITTER_API_KEY"),
-            consumer_secret=os.getenv("TWITTER_API_SECRET"),
-            access_token=os.getenv("TWITTER_ACCESS_TOKEN"),
-            access_token_secret=os.getenv("TWITTER_ACCESS_SECRET"),
-            wait_on_rate_limit=True
-        )
-        
-        # Test the connection
-        me = client.get_me()
-        logger.info(f"Twitter API v2 authentication successful for user: {me.data.username}")
-        return client
+        return _get_client("v2", credentials, account)
     except Exception as e:
         logger.error(f"Twitter API v2 authentication failed: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def get_client_stats():
+    """Return counters for the client registry, including auth round-trips saved"""
+    with _clients_lock:
+        stats = dict(_stats)
+        stats["active_clients"] = len(_clients)
+    return stats
+
+def reset_clients():
+    """Forget all pooled clients, e.g. after rotating credentials"""
+    with _clients_lock:
+        for entry in _clients.values():
+            session = getattr(entry["client"], "session", None)
+            if session is not None:
+                session.close()
+        _clients.clear()
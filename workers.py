@@ -0,0 +1,180 @@
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from accounts import DEFAULT_ACCOUNT
+from checkpoints import RunCheckpoints, STAGES
+from job_queue import get_queue, get_queue_stats, VISIBILITY_TIMEOUT_SECONDS
+import config
+from utils.telemetry import span, write_metrics_file
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGE_JOB = "stage"
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "4"))
+# How long an idle worker waits before asking the queue again
+POLL_SECONDS = 1.0
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+# {job kind: handler(payload, queue)}; a handler's return value is stored as the job result
+HANDLERS = {}
+
+_stats_lock = threading.Lock()
+_stats = {"jobs": 0, "failed": 0, "seconds": 0.0}
+
+def handler(kind):
+    """Register a function as the handler for a job kind"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+def _stage_job(run_id, account, stage, trends=None, completed=None):
+    payload = {"run_id": run_id, "account": account, "stage": stage, "completed": completed or {}}
+    if trends:
+        payload["trends"] = {"patterns": trends["patterns"], "hashtags": trends["hashtags"]}
+    return payload
+
+def new_run_id():
+    """Run ID for a run spread over workers; the host prefix keeps IDs from different hosts apart"""
+    return f"{socket.gethostname()}:{uuid.uuid4().hex[:12]}"
+
+def enqueue_run(account=None, trends=None, queue=None):
+    """Start a pipeline run whose stages are picked up by workers; returns the run ID
+
+    Each stage's job carries the outputs of the stages before it, so any
+    worker on any host can run it without this host's store. The publish
+    queue, metrics schedule, dedup index and rate budgets still live in the
+    store (and process) of the worker that posts, so point every worker that
+    posts for an account at the same store.
+    """
+    queue = queue or get_queue()
+    account = account or DEFAULT_ACCOUNT
+    run_id = new_run_id()
+    queue.enqueue(STAGE_JOB, _stage_job(run_id, account, STAGES[0], trends), dedupe_key=f"run:{run_id}:{STAGES[0]}")
+    logger.info(f"Queued run {run_id} for {account} account")
+    return run_id
+
+@handler(STAGE_JOB)
+def run_stage_job(payload, queue):
+    """Run one stage of a pipeline run, then queue the next one (or finish the run)
+
+    Stages are checkpointed and the next stage's job is deduplicated, so a job
+    that is retried after a crash or an expired lease never repeats work.
+    """
+    import main as pipeline
+    run_id, account, stage = payload["run_id"], payload.get("account"), payload["stage"]
+    run = RunCheckpoints.load(run_id, payload.get("completed"))
+    if pipeline.run_stage(run, stage, account=account, trends=payload.get("trends")) is None:
+        # The stage already logged why the run cannot go on; retrying would not help
+        return {"run_id": run_id, "stopped_at": stage}
+
+    position = STAGES.index(stage)
+    if position + 1 < len(STAGES):
+        next_stage = STAGES[position + 1]
+        queue.enqueue(STAGE_JOB, _stage_job(run_id, account, next_stage, completed=run.completed),
+                      dedupe_key=f"run:{run_id}:{next_stage}")
+        return {"run_id": run_id, "next_stage": next_stage}
+    pipeline.finish(run, account)
+    return {"run_id": run_id, "finished": True}
+
+def _keep_leased(queue, job, visibility_timeout, done):
+    """Extend the job's lease until it is done, so long stages are not handed to another worker"""
+    while not done.wait(visibility_timeout / 3):
+        try:
+            if not queue.extend(job["job_id"], job["lease_token"], visibility_timeout):
+                logger.warning(f"Lost the lease on job {job['job_id']}")
+                return
+        except Exception as e:
+            logger.error(f"Could not extend the lease on job {job['job_id']}: {e}")
+
+def work_one(queue, kinds=None, worker=None, visibility_timeout=VISIBILITY_TIMEOUT_SECONDS):
+    """Lease and run one job; returns False if none was available"""
+    job = queue.lease(kinds, worker, visibility_timeout)
+    if job is None:
+        return False
+
+    done = threading.Event()
+    threading.Thread(target=_keep_leased, args=(queue, job, visibility_timeout, done), daemon=True).start()
+    start = time.perf_counter()
+    failed = False
+    try:
+        with span("job", kind=job["kind"]):
+            func = HANDLERS.get(job["kind"])
+            if func is None:
+                raise ValueError(f"no handler for job kind '{job['kind']}'")
+            result = func(job["payload"], queue)
+    except Exception as e:
+        failed = True
+        logger.error(f"Job {job['job_id']} ({job['kind']}) failed on attempt {job['attempts']}: {e}")
+        queue.fail(job["job_id"], job["lease_token"], e)
+    else:
+        queue.complete(job["job_id"], job["lease_token"], result)
+    finally:
+        done.set()
+
+    with _stats_lock:
+        _stats["jobs"] += 1
+        _stats["failed"] += failed
+        _stats["seconds"] += time.perf_counter() - start
+    return True
+
+def run_worker(queue=None, kinds=None, stop=None, exit_when_idle=False, poll_seconds=POLL_SECONDS):
+    """Work through jobs until stopped (or, with exit_when_idle, until the queue is empty)"""
+    queue = queue or get_queue()
+    stop = stop or threading.Event()
+    worker = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+    last_purge = time.time()
+    while not stop.is_set():
+        try:
+            if work_one(queue, kinds, worker):
+                continue
+            if time.time() - last_purge >= PURGE_INTERVAL_SECONDS:
+                queue.purge()
+                last_purge = time.time()
+        except Exception as e:
+            logger.error(f"Worker {worker} could not reach the job queue: {e}")
+        if exit_when_idle:
+            return
+        stop.wait(poll_seconds)
+
+def run_workers(threads=WORKER_THREADS, queue=None, kinds=None, stop=None, exit_when_idle=False):
+    """Run a pool of worker threads in this process; start more processes or hosts to scale out"""
+    queue = queue or get_queue()
+    pool = [threading.Thread(target=run_worker, args=(queue, kinds, stop, exit_when_idle),
+                             name=f"worker-{i}", daemon=True) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    logger.info(f"Worker stats: {get_worker_stats()}, queue operations: {get_queue_stats()}")
+
+def get_worker_stats():
+    """Jobs run by this process so far and the time spent on them"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["seconds"] = round(stats["seconds"], 4)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run pipeline jobs from the job queue")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="worker threads in this process")
+    parser.add_argument("--kinds", help="comma-separated job kinds to take (default: all)")
+    parser.add_argument("--enqueue", action="store_true", help="queue a pipeline run for every account first")
+    parser.add_argument("--exit-when-idle", action="store_true", help="stop once the queue has no due jobs")
+    args = parser.parse_args()
+
+    config.validate()
+    if args.enqueue:
+        from accounts import load_accounts
+        for account in load_accounts():
+            enqueue_run(account["name"])
+    try:
+        run_workers(args.threads, kinds=args.kinds.split(",") if args.kinds else None,
+                    exit_when_idle=args.exit_when_idle)
+    finally:
+        write_metrics_file()